@@ -1,31 +1,67 @@
-"""Constants and initialization"""
+"""Constants and initialization
+
+Importing this package only creates the default commands, nothing is loaded
+until initialize() is called at startup.
+"""
 from src.user.commands import Command, get_keyword_string_of, \
     CommandKeywords, CommandType, add_multiple_commands
 from src.user.permissions import PermissionLevel
 import src.command_functions as command_functions
 import src.file_functions as file_functions
 import src.file.files as files
+import src.plugin_loader as plugin_loader
 
 C_PREFIX = '$'  # The prefix for all commands
+# Seconds the replies of cached commands are kept, see response_cache.py
+RESPONSE_CACHE_TTL = 60
 
 ################# Default Command Creation #################
 # Initializes all default commands and puts them into the commands_list
 HELP = Command('help', 'lists the available commands for the user',
                CommandType.STANDARD,
                PermissionLevel.DEFAULT,
-               command_functions.help)
+               command_functions.help,
+               aliases=('h',),
+               cache_ttl=RESPONSE_CACHE_TTL)
 
 PERMISSION_CHECK = Command('permission',
                            'gets the permission level of the user',
                            CommandType.MODERATION,
                            PermissionLevel.DEFAULT,
-                           command_functions.permission_check)
+                           command_functions.permission_check,
+                           cache_ttl=RESPONSE_CACHE_TTL)
 
 LOGOUT_BOT = Command('logout', 'shuts down the bot',
                      CommandType.MODERATION,
                      PermissionLevel.SUPERUSER,
                      command_functions.logout_bot)
 
+LOOP_LAG = Command('lag', 'shows how far behind the bot is running '
+                   'and any commands that held it up',
+                   CommandType.MODERATION,
+                   PermissionLevel.SUPERUSER,
+                   command_functions.loop_lag)
+
+PROFILE = Command('profile {}'.format(
+    get_keyword_string_of(CommandKeywords.NUMBER)),
+    'profiles the bot for \'seconds\', writing the profile to the data folder',
+    CommandType.MODERATION,
+    PermissionLevel.SUPERUSER,
+    command_functions.profile,
+    'profile <seconds>')
+
+MEMORY = Command('memory',
+                'reports what the bot\'s memory is used by, and what grew since the last report',
+                CommandType.MODERATION,
+                PermissionLevel.SUPERUSER,
+                command_functions.memory)
+
+MEMORY_STOP = Command('memory stop',
+                      'stops the allocation tracing started by memory',
+                      CommandType.MODERATION,
+                      PermissionLevel.SUPERUSER,
+                      command_functions.memory_stop)
+
 SET_PERM_TO_SUPERUSER = Command('superuser {}'.format(
     get_keyword_string_of(CommandKeywords.USER_REFERENCE)),
     'sets the permission level of \'user\' to superuser',
@@ -47,23 +83,70 @@ SET_PERM_TO_DEFAULT = Command('default {}'.format(
     PermissionLevel.SUPERUSER,
     command_functions.set_perm_to_default)
 
+ROLE_SERVER = Command('role server {} {}'.format(
+    get_keyword_string_of(CommandKeywords.WORD),
+    get_keyword_string_of(CommandKeywords.WORD)),
+    'gives members with \'role\' at least \'permission\' in the whole server',
+    CommandType.MODERATION,
+    PermissionLevel.SUPERUSER,
+    command_functions.role_server,
+    'role server <role> <permission>')
+
+ROLE_CHANNEL = Command('role channel {} {}'.format(
+    get_keyword_string_of(CommandKeywords.WORD),
+    get_keyword_string_of(CommandKeywords.WORD)),
+    'gives members with \'role\' at least \'permission\' in this channel',
+    CommandType.MODERATION,
+    PermissionLevel.SUPERUSER,
+    command_functions.role_channel,
+    'role channel <role> <permission>')
+
+ROLE_LIST = Command('role list', 'lists the permissions given to roles',
+                    CommandType.MODERATION,
+                    PermissionLevel.SUPERUSER,
+                    command_functions.role_list)
+
 PURGE = Command('purge {}'.format(
     get_keyword_string_of(CommandKeywords.NUMBER)),
-    'Removes \'number\' amount of messages from this channel (max 100)',
+    'Removes \'number\' amount of messages from this channel (max {})'.format(
+        command_functions.PURGE_MAX_AMT),
     CommandType.MODERATION, PermissionLevel.SUPERUSER,
     command_functions.purge)
 
+PURGE_FROM_USER = Command('purge user {} {}'.format(
+    get_keyword_string_of(CommandKeywords.USER_REFERENCE),
+    get_keyword_string_of(CommandKeywords.NUMBER)),
+    'Removes \'number\' amount of messages sent by \'user\' from this channel',
+    CommandType.MODERATION, PermissionLevel.SUPERUSER,
+    command_functions.purge_from_user)
+
+PURGE_MATCHING = Command('purge matching {} {}'.format(
+    get_keyword_string_of(CommandKeywords.NUMBER),
+    get_keyword_string_of(CommandKeywords.STRING)),
+    'Removes \'number\' amount of messages matching the regular expression '
+    '\'pattern\' from this channel',
+    CommandType.MODERATION, PermissionLevel.SUPERUSER,
+    command_functions.purge_matching,
+    'purge matching <number> <pattern>')
+
+PURGE_RECENT = Command('purge minutes {}'.format(
+    get_keyword_string_of(CommandKeywords.NUMBER)),
+    'Removes the messages sent in the last \'number\' minutes from this channel',
+    CommandType.MODERATION, PermissionLevel.SUPERUSER,
+    command_functions.purge_recent)
+
+PURGE_CANCEL = Command('purge cancel',
+                       'Stops the purge running in this channel',
+                       CommandType.MODERATION, PermissionLevel.SUPERUSER,
+                       command_functions.purge_cancel)
+
 RANDOM_NUMBER = Command('random {}'.format(
     get_keyword_string_of(CommandKeywords.NUMBER)),
     'Gets a random number between 0 and \'number\'',
     CommandType.STANDARD,
     PermissionLevel.DEFAULT,
-    command_functions.random_number)
-
-RANDOM_NUMBER_FACT = Command('fact', 'Gets random number facts',
-                             CommandType.STANDARD,
-                             PermissionLevel.DEFAULT,
-                             command_functions.random_fact)
+    command_functions.random_number,
+    aliases=('rng',))
 
 CHOOSE = Command('choose {}'.format(
     get_keyword_string_of(CommandKeywords.OPTIONS)),
@@ -79,6 +162,38 @@ EIGHT_BALL = Command('8ball',
                      PermissionLevel.DEFAULT,
                      command_functions.eight_ball)
 
+REMIND = Command('remind {} {}'.format(
+    get_keyword_string_of(CommandKeywords.NUMBER),
+    get_keyword_string_of(CommandKeywords.OPTIONS)),
+    'Reminds you of \'message\' in \'minutes\'',
+    CommandType.STANDARD,
+    PermissionLevel.DEFAULT,
+    command_functions.remind,
+    'remind <minutes> <message>')
+
+EVERY = Command('every {} {}'.format(
+    get_keyword_string_of(CommandKeywords.NUMBER),
+    get_keyword_string_of(CommandKeywords.OPTIONS)),
+    'Runs \'command\' in this channel every \'minutes\'',
+    CommandType.MODERATION,
+    PermissionLevel.SUPERUSER,
+    command_functions.every,
+    'every <minutes> <command>')
+
+SCHEDULE_LIST = Command('schedule list',
+                        'Lists the scheduled commands and reminders of this channel',
+                        CommandType.STANDARD,
+                        PermissionLevel.DEFAULT,
+                        command_functions.schedule_list)
+
+SCHEDULE_CANCEL = Command('schedule cancel {}'.format(
+    get_keyword_string_of(CommandKeywords.WORD)),
+    'Cancels a scheduled command or reminder',
+    CommandType.STANDARD,
+    PermissionLevel.DEFAULT,
+    command_functions.schedule_cancel,
+    'schedule cancel <id>')
+
 COMMAND_ADD = Command('command add {} {}'.format(
     get_keyword_string_of(CommandKeywords.WORD),
     get_keyword_string_of(CommandKeywords.STRING)),
@@ -96,20 +211,105 @@ COMMAND_REMOVE = Command('command remove {}'.format(
     command_functions.command_remove,
     'command remove <command name>')
 
+COMMAND_ALIAS = Command('command alias {} {}'.format(
+    get_keyword_string_of(CommandKeywords.WORD),
+    get_keyword_string_of(CommandKeywords.WORD)),
+    'Adds an alias to a custom command',
+    CommandType.STANDARD,
+    PermissionLevel.USER,
+    command_functions.command_alias,
+    'command alias <command name> <alias>')
+
+COMMAND_STATS = Command('command stats',
+                        'Lists the most used commands of this server',
+                        CommandType.MODERATION,
+                        PermissionLevel.SUPERUSER,
+                        command_functions.command_stats)
+
+COMMAND_UNUSED = Command('command unused',
+                         'Lists the custom commands that weren\'t used recently',
+                         CommandType.MODERATION,
+                         PermissionLevel.SUPERUSER,
+                         command_functions.command_unused)
+
+DATA_EXPORT = Command('data export {}'.format(
+    get_keyword_string_of(CommandKeywords.STRING)),
+    'Exports the custom commands and user permissions to a JSON Lines file '
+    '(console only)',
+    CommandType.MODERATION,
+    PermissionLevel.SUPERUSER,
+    command_functions.data_export,
+    'data export <file>')
+
+DATA_IMPORT = Command('data import {}'.format(
+    get_keyword_string_of(CommandKeywords.STRING)),
+    'Imports custom commands and user permissions from a JSON Lines file '
+    '(console only)',
+    CommandType.MODERATION,
+    PermissionLevel.SUPERUSER,
+    command_functions.data_import,
+    'data import <file>')
+
+PLUGIN_LOAD = Command('plugin load {}'.format(
+    get_keyword_string_of(CommandKeywords.WORD)),
+    'Loads a plugin, adding its commands',
+    CommandType.MODERATION,
+    PermissionLevel.SUPERUSER,
+    command_functions.plugin_load,
+    'plugin load <plugin>')
+
+PLUGIN_UNLOAD = Command('plugin unload {}'.format(
+    get_keyword_string_of(CommandKeywords.WORD)),
+    'Unloads a plugin, removing its commands',
+    CommandType.MODERATION,
+    PermissionLevel.SUPERUSER,
+    command_functions.plugin_unload,
+    'plugin unload <plugin>')
+
+PLUGIN_LIST = Command('plugin list',
+                      'Lists the plugins and which are loaded',
+                      CommandType.MODERATION,
+                      PermissionLevel.SUPERUSER,
+                      command_functions.plugin_list)
+
 # Default commands
 commands_to_add = [
     HELP, PERMISSION_CHECK,
-    LOGOUT_BOT, SET_PERM_TO_SUPERUSER,
+    # 'memory stop' must come before 'memory', which would also match it
+    LOGOUT_BOT, LOOP_LAG, PROFILE, MEMORY_STOP, MEMORY, SET_PERM_TO_SUPERUSER,
     SET_PERM_TO_USER, SET_PERM_TO_DEFAULT,
-    PURGE, RANDOM_NUMBER, RANDOM_NUMBER_FACT,
-    CHOOSE, EIGHT_BALL, COMMAND_ADD,
-    COMMAND_REMOVE
+    ROLE_SERVER, ROLE_CHANNEL, ROLE_LIST,
+    PURGE, PURGE_FROM_USER, PURGE_MATCHING,
+    PURGE_RECENT, PURGE_CANCEL, RANDOM_NUMBER,
+    CHOOSE, EIGHT_BALL, REMIND, EVERY, SCHEDULE_LIST, SCHEDULE_CANCEL, COMMAND_ADD,
+    COMMAND_REMOVE, COMMAND_ALIAS, COMMAND_STATS, COMMAND_UNUSED,
+    DATA_EXPORT, DATA_IMPORT, PLUGIN_LOAD, PLUGIN_UNLOAD, PLUGIN_LIST
 ]
 
-# Custom commands
-CUSTOM_COMMANDS = file_functions.load_custom_commands()
-for c in CUSTOM_COMMANDS:
-    commands_to_add.append(c)
 
-# Add all of these commands to the command list
-add_multiple_commands(commands_to_add)
+def initialize(use_command_table=False):
+    """Opens the data files and fills the command list with the default
+    and custom commands, this must be run once at startup
+
+    Args:
+        use_command_table (bool) -- if True, custom commands are looked up in a
+                                    memory-mapped command table instead of being
+                                    loaded (see file_functions.open_command_table())
+    """
+    files.open_files(lazy_commands=use_command_table)
+    # Add all of these commands to the command list
+    add_multiple_commands(commands_to_add)
+    plugin_loader.load_saved_plugins()
+    if use_command_table:
+        file_functions.open_command_table()
+    else:
+        add_multiple_commands(file_functions.load_custom_commands())
+
+    # Keep the custom commands and user permissions in sync with changes made
+    # by other processes (or other shards when running as a shard)
+    files.commands_file.add_change_listener(file_functions.call_on_event_loop(
+        file_functions.apply_custom_command_changes))
+    files.users_file.add_change_listener(file_functions.call_on_event_loop(
+        file_functions.apply_user_permission_changes))
+    files.roles_file.add_change_listener(file_functions.call_on_event_loop(
+        file_functions.apply_role_rule_changes))
@@ -0,0 +1,128 @@
+""" The admin console, which lets the host of the bot run any command as a superuser
+
+Commands can be typed into the terminal the bot runs in, or for deployments
+without a terminal, sent through a unix socket one command per line:
+    python3 scripty.py --admin-socket
+    echo 'superuser 229628971736654096' | nc -U ../data/admin.sock
+
+Both run on the event loop without blocking it, replies to each command are
+written back to the terminal or socket connection that sent it. Typing
+'source <file>' runs a batch file of commands, see batch.py
+"""
+import asyncio
+import logging
+import os
+import sys
+import src.command_functions as command_functions
+import src.file_functions as file_functions
+from src.file import files
+from src.user.commands import keyword_function_user_reference
+
+# Where the admin socket is created, relative to the src directory
+ADMIN_SOCKET_PATH = '../data/admin.sock'
+
+
+class AdminConsole:
+    """Runs console commands from the terminal and the admin socket
+
+    Args:
+        run_command (function) -- the coroutine function that runs a command,
+                                  called as run_command(text, FROM_CONSOLE=True)
+    """
+
+    def __init__(self, run_command):
+        self.__run_command = run_command
+        self.__server = None
+
+    async def run_line(self, text):
+        """Runs a line typed into the console as a command, or runs a batch
+        file if the line is 'source <file>'
+        """
+        command = '$' + text.strip()
+        if command == '$':
+            return
+        if command.startswith('$source '):
+            await self.source(command[len('$source '):].strip())
+            return
+        try:
+            await self.__run_command(command, FROM_CONSOLE=True)
+        except Exception as ex:  # pylint: disable=broad-except
+            # Keep the console running when a command fails
+            logging.getLogger(__name__).exception("Error running %r", command)
+            command_functions.console_print("Error: {}".format(ex))
+
+    async def source(self, path):
+        """Runs the console commands in the batch file (path), see batch.py"""
+        import src.batch as batch
+
+        try:
+            report = await batch.run_batch(path, self.__run_command)
+        except OSError as ex:
+            command_functions.console_print(
+                "Couldn't read the batch file: {}".format(ex))
+            return
+        command_functions.console_print(report.get_summary())
+
+    async def run_terminal(self):
+        """Runs commands typed into the terminal until it is closed"""
+        import aioconsole
+
+        try:
+            await self.bootstrap_superuser()
+            while True:
+                await self.run_line(await aioconsole.ainput('$ '))
+        except EOFError:
+            print("Console closed")
+
+    async def bootstrap_superuser(self):
+        """Asks the host to add themselves as a superuser, if there are none"""
+        import aioconsole
+
+        while len(files.users_file.get_data()['superusers']) == 0:
+            user_id = keyword_function_user_reference((await aioconsole.ainput(
+                "Add yourself as a superuser (input user id): ")).strip())
+            if user_id is None:
+                print("Invalid user id, it must be a number ex. 229628971736654096")
+                continue
+            file_functions.add_superuser(user_id)
+
+    async def serve(self, path=ADMIN_SOCKET_PATH):
+        """Starts accepting commands through the unix socket (path)"""
+        if os.path.exists(path):
+            os.remove(path)
+        # Only the host of the bot may connect. The socket is created with these
+        # permissions, chmod after binding would leave a window to connect in
+        old_umask = os.umask(0o177)
+        try:
+            self.__server = await asyncio.start_unix_server(self.__handle_connection, path)
+        finally:
+            os.umask(old_umask)
+        print("Admin console listening on {}".format(os.path.abspath(path)))
+
+    async def close(self):
+        """Stops accepting commands through the unix socket"""
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+
+    async def __handle_connection(self, reader, writer):
+        # Each connection runs in its own task, so this only
+        # sends the replies of this connection's commands back to it
+        command_functions.console_output.set(
+            lambda message: writer.write((message + '\n').encode()))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                await self.run_line(line.decode(errors='replace'))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def has_terminal():
+    """Returns True if the bot was started from a terminal that commands can be typed into"""
+    return sys.stdin is not None and sys.stdin.isatty()
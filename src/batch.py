@@ -0,0 +1,94 @@
+""" Runs a file of console commands in one pass, ex. to provision a server
+
+The file holds one console command per line, with or without the '$' prefix.
+Blank lines and lines starting with '#' are skipped:
+    # Provision the moderators
+    superuser 229628971736654096
+    $command add rules | Be nice!
+
+All commands are run as a single batch (see file_functions.batch_changes()), so
+the data files are written once at the end rather than after every change.
+Run a batch with the console's 'source <file>' command, or 'start.sh --batch <file>'
+"""
+import time
+import src.command_functions as command_functions
+import src.file_functions as file_functions
+
+
+class BatchReport:
+    """The results of running a batch file
+
+    Variables:
+        replies (list) -- (line number, reply) of every reply to a command
+        unknown (list) -- (line number, line) of lines that didn't match any command
+        errors (list) -- (line number, line, error) of commands that raised an error
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.commands_run = 0
+        self.replies = []
+        self.unknown = []
+        self.errors = []
+        self.seconds = 0.0
+
+    def get_summary(self):
+        """Returns the replies to each command followed by the
+        summary of the batch as a printable string
+        """
+        lines = []
+        for line_number, reply in self.replies:
+            lines.append('line {}: {}'.format(line_number, reply))
+        lines.append('Ran {} commands from {} in {:.2f}s: {} unknown, {} errors'.format(
+            self.commands_run, self.path, self.seconds,
+            len(self.unknown), len(self.errors)))
+        for line_number, line in self.unknown:
+            lines.append('  line {}: unknown command \'{}\''.format(line_number, line))
+        for line_number, line, error in self.errors:
+            lines.append('  line {}: \'{}\' failed: {}'.format(line_number, line, error))
+        return '\n'.join(lines)
+
+
+def read_batch_file(path):
+    """Yields (line number, command) for each command in the batch file"""
+    with open(path) as batch_file:
+        for line_number, line in enumerate(batch_file, 1):
+            line = line.strip()
+            if line == '' or line.startswith('#'):
+                continue
+            if not line.startswith('$'):
+                line = '$' + line
+            yield line_number, line
+
+
+async def run_batch(path, run_command):
+    """Runs every command in the batch file (path) as a single batch
+
+    Args:
+        path (str) -- the path of the batch file
+        run_command (function) -- the coroutine function that runs a command,
+                                  called as run_command(text, FROM_CONSOLE=True)
+    Returns a BatchReport
+    Raises OSError if the file can't be read
+    """
+    report = BatchReport(path)
+    start = time.perf_counter()
+    line_number = 0
+
+    def collect_reply(message):
+        report.replies.append((line_number, message))
+    output_token = command_functions.console_output.set(collect_reply)
+    try:
+        with file_functions.batch_changes():
+            for line_number, line in read_batch_file(path):
+                try:
+                    if await run_command(line, FROM_CONSOLE=True):
+                        report.commands_run += 1
+                    else:
+                        report.unknown.append((line_number, line))
+                except Exception as ex:  # pylint: disable=broad-except
+                    report.errors.append((line_number, line, ex))
+    finally:
+        command_functions.console_output.reset(output_token)
+    report.seconds = time.perf_counter() - start
+    return report
@@ -11,7 +11,29 @@ Each function must be asynchronous and have the following Args:
 """
 import src.user.permissions as permissions
 import src.file_functions as file_functions
-import random
+import src.random_pool as random_pool
+import contextvars
+
+# Where replies to commands run through the console are written, print by default.
+# The admin console sets this for each connection so replies go back to it
+console_output = contextvars.ContextVar('console_output', default=print)
+
+
+# While a cached command is run, every reply it sends is also added to this
+# list so that it can be saved (see run_command_function()), None otherwise
+reply_capture = contextvars.ContextVar('reply_capture', default=None)
+
+
+def console_print(message):
+    """Writes the message to the console that ran the current command"""
+    __capture_reply(message)
+    console_output.get()(str(message))
+
+
+def __capture_reply(message):
+    captured = reply_capture.get()
+    if captured is not None:
+        captured.append(str(message))
 
 
 class CommandArgs:
@@ -46,7 +68,7 @@ async def help(cmd_args: CommandArgs):
                 command_type.value)
             for i in commands_list[command_type]:
                 commands_str_tidy += i.get_help() + '\n'
-        print(commands_str_tidy)
+        console_print(commands_str_tidy)
     else:
         for command_type in commands_list.keys():
             commands_str_tidy += '\n**{}**\n'.format(command_type.value)
@@ -61,7 +83,7 @@ async def help(cmd_args: CommandArgs):
 async def permission_check(cmd_args: CommandArgs):
     """Tells the user their permission level"""
     if cmd_args.is_from_console:
-        print(permissions.PermissionLevel.SUPERUSER)
+        console_print(permissions.PermissionLevel.SUPERUSER)
     else:
         await reply_simple_cmd_args(cmd_args, "{}'s permission level is {}"
                                   .format(cmd_args.message.author.name,
@@ -70,18 +92,89 @@ async def permission_check(cmd_args: CommandArgs):
 
 
 async def logout_bot(cmd_args: CommandArgs):
-    """Logs the bot out, and saves any other data"""
-    import os
-    from src.file import files
+    """Logs the bot out once the running commands finish, and saves any other data"""
+    import src.shutdown as shutdown
 
     if not cmd_args.is_from_console:
         await reply_simple_cmd_args(cmd_args, 'This command can only be run via console.')
         return
-    print("Logging out.")
-    await cmd_args.client.logout()
-    # Saves all json files and any other data to file and makes bot logout
-    files.close()
-    os._exit(0)
+    console_print("Logging out.")
+    # Shut down in its own task, as it waits for the running commands (this one
+    # included) to finish, see shutdown.py
+    shutdown.coordinator.request(cmd_args.client)
+
+
+async def loop_lag(cmd_args: CommandArgs):
+    """Shows the rolling histogram of the event loop's lag"""
+    import src.loop_monitor as loop_monitor
+
+    report = loop_monitor.get_report()
+    if not cmd_args.is_from_console:
+        report = '```\n{}\n```'.format(report)
+    await reply_simple_cmd_args(cmd_args, report)
+
+
+async def profile(cmd_args: CommandArgs):
+    """Profiles the bot for 'seconds', then replies with where the profile was written"""
+    import asyncio
+    import src.command_profiler as command_profiler
+
+    seconds = cmd_args.match_result[0]
+    if not 0 < seconds <= command_profiler.MAX_SECONDS:
+        await reply_simple_cmd_args(cmd_args, 'Invalid time, must be between 0 and {} seconds'
+                                    .format(command_profiler.MAX_SECONDS))
+        return
+    try:
+        command_profiler.profiler.start()
+    except (command_profiler.ProfileRunningError, ValueError) as ex:
+        await reply_simple_cmd_args(cmd_args, 'Failed to profile: {}'.format(ex))
+        return
+    # Finish the profile in its own task, so the command (and the console running
+    # it) isn't held up, and so the profile doesn't include this command waiting
+    asyncio.get_event_loop().create_task(__finish_profile(cmd_args, seconds))
+    await reply_simple_cmd_args(cmd_args, 'Profiling for {:g} seconds'.format(seconds))
+
+
+async def __finish_profile(cmd_args: CommandArgs, seconds):
+    import src.command_profiler as command_profiler
+
+    try:
+        paths = await command_profiler.profiler.finish(seconds)
+    except OSError as ex:
+        await reply_simple_cmd_args(cmd_args, 'Failed to write the profile: {}'.format(ex))
+        return
+    await reply_simple_cmd_args(cmd_args, 'Profile written to {}'.format(', '.join(paths)))
+
+
+MAX_CHAT_LENGTH = 1900  # The longest reply sent in discord, longer ones are written to a file
+
+
+async def memory(cmd_args: CommandArgs):
+    """Reports what the bot's memory is used by, and what grew since the last report"""
+    import time
+    import src.memory_report as memory_report
+
+    report = memory_report.get_report()
+    if cmd_args.is_from_console:
+        console_print(report)
+    elif len(report) <= MAX_CHAT_LENGTH:
+        await reply_simple_cmd_args(cmd_args, '```\n{}\n```'.format(report))
+    else:
+        path = '../data/memory-{}.txt'.format(time.strftime('%Y%m%d-%H%M%S'))
+        with open(path, 'w') as report_file:
+            report_file.write(report)
+        await reply_simple_cmd_args(cmd_args, 'The memory report was written to {}'.format(path))
+
+
+async def memory_stop(cmd_args: CommandArgs):
+    """Stops the allocation tracing started by the memory command"""
+    import src.memory_report as memory_report
+
+    if not memory_report.tracer.is_tracing():
+        await reply_simple_cmd_args(cmd_args, 'Allocations aren\'t being traced')
+        return
+    memory_report.tracer.stop()
+    await reply_simple_cmd_args(cmd_args, 'Stopped tracing allocations')
 
 
 async def set_perm_to_superuser(cmd_args: CommandArgs):
@@ -115,106 +208,384 @@ async def __set_perm_to(permission, cmd_args: CommandArgs):
     await reply_simple_cmd_args(cmd_args, reply_message)
 
 
+async def role_server(cmd_args: CommandArgs):
+    """Sets the permission level members with 'role' get in the whole server"""
+    await __set_role_perm(cmd_args, None)
+
+
+async def role_channel(cmd_args: CommandArgs):
+    """Sets the permission level members with 'role' get in this channel"""
+    if cmd_args.is_from_console:
+        await reply_simple_cmd_args(cmd_args, 'Channel rules must be set from the channel')
+        return
+    await __set_role_perm(cmd_args, cmd_args.message.channel.id)
+
+
+async def __set_role_perm(cmd_args: CommandArgs, channel_id):
+    """Sets the permission of the role in the channel (id), or in the whole server
+         Examples via Discord:
+            role server @moderators user
+         Through the console, you must put the role id in instead of @role
+            role server 229628971736654096 superuser
+    """
+    import src.user.roles as roles
+
+    role_id = roles.parse_role_reference(cmd_args.match_result[0])
+    permission = permissions.PERMISSION_LABELS.get(cmd_args.match_result[1])
+    if role_id is None or permission is None:
+        await reply_simple_cmd_args(
+            cmd_args, 'Invalid role or permission. ex. role server @role user')
+        return
+    file_functions.set_role_permission(role_id, permission, channel_id)
+    await reply_simple_cmd_args(cmd_args, 'Members with <@&{}> are now at least {} {}'.format(
+        role_id, permissions.get_label_of_permission(permission),
+        'in this channel' if channel_id is not None else 'in the server'))
+
+
+async def role_list(cmd_args: CommandArgs):
+    """Lists the permission rules of the roles"""
+    from src.file import files
+
+    rules = files.roles_file.get_data()
+    lines = ['<@&{}>: {}'.format(role_id, label)
+             for role_id, label in rules.get('roles', {}).items()]
+    for channel_id, channel_rules in rules.get('channels', {}).items():
+        lines.extend('<@&{}> in <#{}>: {}'.format(role_id, channel_id, label)
+                     for role_id, label in channel_rules.items())
+    await reply_simple_cmd_args(cmd_args, '\n'.join(lines) or 'There are no role rules')
+
+
+PURGE_MAX_AMT = 10000  # The most messages a single purge is allowed to remove
+
+
 async def purge(cmd_args: CommandArgs):
     """ removes n amount of messages from the messages channel
         Note that this doesn't actually do anything from the console
     """
+    await __purge_with(cmd_args, cmd_args.match_result[0])
+
+
+async def purge_from_user(cmd_args: CommandArgs):
+    """ removes n amount of messages sent by 'user' from the messages channel """
+    import src.purge_functions as purge_functions
+
+    await __purge_with(cmd_args, cmd_args.match_result[1],
+                       purge_functions.PurgeFilter(author_id=cmd_args.match_result[0]))
+
+
+async def purge_matching(cmd_args: CommandArgs):
+    """ removes n amount of messages matching the regular expression
+    'pattern' from the messages channel
+    """
+    import re
+    import src.purge_functions as purge_functions
+
+    try:
+        message_filter = purge_functions.PurgeFilter(pattern=cmd_args.match_result[1])
+    except re.error:
+        await reply_simple_cmd_args(cmd_args, 'Invalid pattern, must be a regular expression')
+        return
+    await __purge_with(cmd_args, cmd_args.match_result[0], message_filter)
+
+
+async def purge_recent(cmd_args: CommandArgs):
+    """ removes every message sent in the last n minutes from the messages channel """
+    import datetime
+    import src.purge_functions as purge_functions
+
+    minutes = cmd_args.match_result[0]
+    try:
+        # Also rejects nan, which isn't greater than anything
+        if not minutes > 0:
+            raise ValueError('The amount of minutes must be positive')
+        newer_than = datetime.timedelta(minutes=minutes)
+    except (OverflowError, ValueError):
+        await reply_simple_cmd_args(cmd_args, 'Invalid amount of minutes')
+        return
+    await __purge_with(cmd_args, PURGE_MAX_AMT,
+                       purge_functions.PurgeFilter(newer_than=newer_than))
+
+
+async def purge_cancel(cmd_args: CommandArgs):
+    """ cancels the purge running in the messages channel """
+    import src.purge_functions as purge_functions
+
+    if cmd_args.is_from_console:
+        console_print("This command cannot be used from the console.")
+        return
+    if purge_functions.cancel_purge(cmd_args.message.channel.id):
+        reply = 'Cancelling the purge ...'
+    else:
+        reply = 'There is no purge running in this channel'
+    await reply_simple_cmd_args(cmd_args, reply)
+
+
+async def __purge_with(cmd_args: CommandArgs, amt, message_filter=None):
+    """ removes up to (amt) messages matching (message_filter) from the
+    messages channel, amt is limited to PURGE_MAX_AMT for safety reasons
+    """
     import discord.errors
+    import src.purge_functions as purge_functions
 
     if cmd_args.is_from_console:
-        print("This command cannot be used from the console.")
+        console_print("This command cannot be used from the console.")
+        return
+    try:
+        amt = int(amt)
+    except (ValueError, OverflowError):
+        await reply_simple_cmd_args(cmd_args, 'Invalid amount of messages')
         return
-    # Limit amount to 100 for safety reasons
-    amt = int(cmd_args.match_result[0])
-    MAX_AMT = 100
-    amt = MAX_AMT if amt > MAX_AMT else amt
+    amt = PURGE_MAX_AMT if amt > PURGE_MAX_AMT else amt
     amt = 0 if amt < 0 else amt
 
+    # A scheduled purge has no command message to delete
+    command_message = None if getattr(cmd_args.message, 'is_scheduled', False) \
+        else cmd_args.message
+    job = purge_functions.PurgeJob(cmd_args.client, cmd_args.message.channel, amt,
+                                   message_filter, command_message)
     try:
-        # we add one to remove this message that was typed
-        await cmd_args.client.purge_from(cmd_args.message.channel, limit=amt + 1)
-        await reply_simple_cmd_args(cmd_args, "Removed {} messages".format(amt))
+        # The status message of the job reports how many messages were removed
+        if await purge_functions.run_purge(job) is None:
+            await reply_simple_cmd_args(cmd_args,
+                                        'A purge is already running in this channel, '
+                                        'stop it with $purge cancel')
     except discord.errors.Forbidden:
         await reply_simple_cmd_args(cmd_args,
                                            "I do not have the privileges to do that on this server or channel")
 
 
 async def random_number(cmd_args: CommandArgs):
-    """Generates a random number between 1 and 'number'"""
-    NUM_MIN = 0
+    """Generates a random number between 0 and 'number'"""
     NUM_MAX = int(cmd_args.match_result[0])
 
     try:
-        rand_number = random.randint(NUM_MIN, NUM_MAX)
-        reply = "The random number is {}".format(rand_number)
+        reply = "The random number is {}".format(random_pool.pool.below(NUM_MAX + 1))
     except ValueError:
         reply = "Invalid range, must be at least 0"
 
     await reply_simple_cmd_args(cmd_args, reply)
 
 
-async def random_fact(cmd_args: CommandArgs):
-    """Gets a random fact about a number
+STATS_DAYS = 30  # The days of uses the command stats and unused commands look at
+MAX_LISTED_COMMANDS = 25  # The most commands listed in a reply
 
-    To get the random facts, I used numbersapi.com which makes it easy
-    to request a random fact, as it responds in plain text the random fact.
+
+async def command_stats(cmd_args: CommandArgs):
+    """Lists the most used commands of this server (or of every server from the
+    console) in the last STATS_DAYS days
     """
-    import urllib.request
-    import html
+    import src.usage_stats as usage_stats
 
-    response = urllib.request.urlopen('http://numbersapi.com/random')
-    response_as_text = str(response.read())
-    response_as_text = response_as_text[2:-1]  # Remove extra characters
-    fact = html.unescape(response_as_text)
+    if usage_stats.usage_stats is None:
+        await reply_simple_cmd_args(cmd_args, 'Command uses are not being counted yet')
+        return
+    server_id = None
+    if not cmd_args.is_from_console:
+        server = cmd_args.message.server
+        server_id = usage_stats.DIRECT_MESSAGES if server is None else server.id
+    totals = usage_stats.usage_stats.get_totals(STATS_DAYS * 24, server_id)
+    lines = ['{}: {}'.format(name, uses)
+             for name, uses in totals.most_common(MAX_LISTED_COMMANDS)]
+    await reply_simple_cmd_args(cmd_args, 'Most used commands in the last {} days:\n{}'.format(
+        STATS_DAYS, '\n'.join(lines)) if lines else 'No commands were used')
+
+
+async def command_unused(cmd_args: CommandArgs):
+    """Lists the custom commands that weren't used in any server in the last STATS_DAYS days"""
+    import src.usage_stats as usage_stats
+    from src.file import files
 
-    await reply_simple_cmd_args(cmd_args, fact)
+    if usage_stats.usage_stats is None:
+        await reply_simple_cmd_args(cmd_args, 'Command uses are not being counted yet')
+        return
+    totals = usage_stats.usage_stats.get_totals(STATS_DAYS * 24)
+    unused = sorted(name for name in files.commands_file.get_data() if name not in totals)
+    if not unused:
+        await reply_simple_cmd_args(cmd_args, 'Every custom command was used in the last {} days'
+                                    .format(STATS_DAYS))
+        return
+    listed = ', '.join(unused[:MAX_LISTED_COMMANDS])
+    if len(unused) > MAX_LISTED_COMMANDS:
+        listed += ' and {} more'.format(len(unused) - MAX_LISTED_COMMANDS)
+    await reply_simple_cmd_args(cmd_args, '{} custom commands weren\'t used in the last {} days: {}'
+                                .format(len(unused), STATS_DAYS, listed))
+
+
+async def plugin_load(cmd_args: CommandArgs):
+    """Loads the plugin, adding its commands"""
+    import src.plugin_loader as plugin_loader
+
+    name = cmd_args.match_result[0]
+    try:
+        plugin_loader.load_plugin(name)
+    except plugin_loader.PluginError as ex:
+        await reply_simple_cmd_args(cmd_args, ex.strerror)
+        return
+    await reply_simple_cmd_args(cmd_args, 'Loaded {}, adding {}'.format(
+        name, ', '.join(command.name for command in
+                        plugin_loader.get_loaded_plugins()[name].commands)))
+
+
+async def plugin_unload(cmd_args: CommandArgs):
+    """Unloads the plugin, removing its commands"""
+    import src.plugin_loader as plugin_loader
+
+    name = cmd_args.match_result[0]
+    try:
+        plugin_loader.unload_plugin(name)
+    except plugin_loader.PluginError as ex:
+        await reply_simple_cmd_args(cmd_args, ex.strerror)
+        return
+    await reply_simple_cmd_args(cmd_args, 'Unloaded {}'.format(name))
+
+
+async def plugin_list(cmd_args: CommandArgs):
+    """Lists the plugins, and the commands of those loaded"""
+    import src.plugin_loader as plugin_loader
+
+    loaded = plugin_loader.get_loaded_plugins()
+    lines = []
+    for name in plugin_loader.get_available_plugins():
+        plugin = loaded.get(name)
+        if plugin is None:
+            lines.append('{} (not loaded)'.format(name))
+        else:
+            lines.append('{}: {} ({})'.format(name, plugin.description, ', '.join(
+                command.name for command in plugin.commands)))
+    await reply_simple_cmd_args(cmd_args, '\n'.join(lines) or 'There are no plugins')
+
+
+MAX_SCHEDULE_MINUTES = 60 * 24 * 365  # The furthest ahead a command can be scheduled
+MAX_LISTED_JOBS = 25  # The most scheduled commands listed in a reply
+
+
+async def remind(cmd_args: CommandArgs):
+    """Reminds the user of 'message' in 'minutes'"""
+    await __schedule(cmd_args, False)
+
+
+async def every(cmd_args: CommandArgs):
+    """Runs 'command' every 'minutes', as if sent by the user in this channel"""
+    await __schedule(cmd_args, True)
+
+
+async def __schedule(cmd_args: CommandArgs, repeat):
+    """Schedules the job of the remind and every commands"""
+    import time
+    import src.scheduler as scheduler
+    from src import C_PREFIX
+
+    if scheduler.scheduler is None:
+        await reply_simple_cmd_args(cmd_args, 'The scheduler is not running yet')
+        return
+    minutes = cmd_args.match_result[0]
+    # The text was split at each '|', put it back together
+    text = '|'.join(cmd_args.match_result[1]).strip()
+    if not 0 < minutes <= MAX_SCHEDULE_MINUTES or text == '' or \
+            (repeat and minutes * 60 < scheduler.MIN_INTERVAL):
+        await reply_simple_cmd_args(cmd_args, 'Invalid time, must be between {} and {} minutes'
+                                    .format(scheduler.MIN_INTERVAL // 60 if repeat else 0,
+                                            MAX_SCHEDULE_MINUTES))
+        return
+    channel_id = author_id = None
+    if not cmd_args.is_from_console:
+        channel_id = cmd_args.message.channel.id
+        author_id = cmd_args.message.author.id
+        if len(scheduler.scheduler.get_jobs(author_id=author_id)) >= \
+                scheduler.MAX_JOBS_PER_USER:
+            await reply_simple_cmd_args(cmd_args, 'You already have {} scheduled commands'
+                                        .format(scheduler.MAX_JOBS_PER_USER))
+            return
+    if repeat:
+        text = C_PREFIX + text[len(C_PREFIX):] if text.startswith(C_PREFIX) else C_PREFIX + text
+    job = scheduler.Job(time.time() + minutes * 60, text, channel_id, author_id,
+                        minutes * 60 if repeat else None, not repeat)
+    scheduler.scheduler.add(job)
+    await reply_simple_cmd_args(cmd_args, 'Scheduled {}, cancel it with $schedule cancel {}'
+                                .format(job.get_description(), job.id))
+
+
+async def schedule_list(cmd_args: CommandArgs):
+    """Lists the scheduled commands of this channel (or all from the console)"""
+    import time
+    import src.scheduler as scheduler
+
+    if scheduler.scheduler is None:
+        await reply_simple_cmd_args(cmd_args, 'The scheduler is not running yet')
+        return
+    jobs = scheduler.scheduler.get_jobs(
+        None if cmd_args.is_from_console else cmd_args.message.channel.id)
+    lines = ['in {:.0f} minutes: {}'.format(max(0, job.due - time.time()) / 60,
+                                            job.get_description())
+             for job in jobs[:MAX_LISTED_JOBS]]
+    if len(jobs) > MAX_LISTED_JOBS:
+        lines.append('... and {} more'.format(len(jobs) - MAX_LISTED_JOBS))
+    await reply_simple_cmd_args(cmd_args, '\n'.join(lines) or 'There are no scheduled commands')
+
+
+async def schedule_cancel(cmd_args: CommandArgs):
+    """Cancels a scheduled command, only superusers can cancel the commands of others"""
+    import src.scheduler as scheduler
+
+    job = None if scheduler.scheduler is None else \
+        scheduler.scheduler.get_job(cmd_args.match_result[0])
+    if job is None:
+        reply = 'That scheduled command doesn\'t exist'
+    elif not cmd_args.is_from_console and \
+            cmd_args.as_permission < permissions.PermissionLevel.SUPERUSER and \
+            job.author_id != cmd_args.message.author.id:
+        reply = 'Only superusers can cancel the scheduled commands of others'
+    else:
+        scheduler.scheduler.cancel(job.id)
+        reply = 'Cancelled {}'.format(job.get_description())
+    await reply_simple_cmd_args(cmd_args, reply)
+
+
+# The sentences the choose command replies with, the option chosen is put in the {}
+CHOOSE_SENTENCES = (
+    'The option chosen is {}',
+    'Obviously I\'d choose {}',
+    'Definitely {}',
+    'Of course {}'
+)
 
 
 async def choose(cmd_args: CommandArgs):
     """Chooses one of the options out of the options given"""
-    options = cmd_args.match_result[0]
-    option_chosen = options[random.randint(0, len(options) - 1)]
-    possible_sentences = (
-        'The option chosen is {}',
-        'Obviously I\'d choose {}',
-        'Definitely {}',
-        'Of course {}'
-    )
-    sentence_chosen = possible_sentences[random.randint(
-        0, len(possible_sentences) - 1)]
-    reply = sentence_chosen.format(option_chosen)
+    option_chosen = random_pool.pool.choice(cmd_args.match_result[0])
+    reply = random_pool.pool.choice(CHOOSE_SENTENCES).format(option_chosen)
 
     await reply_simple_cmd_args(cmd_args, reply)
 
 
+# The answers the 8ball command replies with
+EIGHT_BALL_SENTENCES = (
+    'It is certain',
+    'It is decidedly so',
+    'Without a doubt',
+    'Yes definitely',
+    'You may rely on it',
+    'As I see it, yes',
+    'Most likely',
+    'Outlook good',
+    'Yes',
+    'Signs point to yes',
+    'Reply hazy try again',
+    'Ask again later',
+    'Better not tell you now',
+    'Cannot predict now',
+    'Concentrate and ask again',
+    'Don\'t count on it',
+    'My reply is no',
+    'My sources say no',
+    'Outlook not so good',
+    'Very doubtful'
+)
+
+
 async def eight_ball(cmd_args: CommandArgs):
     """Returns a decision to any question"""
-    possible_sentences = (
-        'It is certain',
-        'It is decidedly so',
-        'Without a doubt',
-        'Yes definitely',
-        'You may rely on it',
-        'As I see it, yes',
-        'Most likely',
-        'Outlook good',
-        'Yes',
-        'Signs point to yes',
-        'Reply hazy try again',
-        'Ask again later',
-        'Better not tell you now',
-        'Cannot predict now',
-        'Concentrate and ask again',
-        'Don\'t count on it',
-        'My reply is no',
-        'My sources say no',
-        'Outlook not so good',
-        'Very doubtful'
-    )
-    sentence_chosen = possible_sentences[random.randint(
-        0, len(possible_sentences) - 1)]
-
-    await reply_simple_cmd_args(cmd_args, sentence_chosen)
+    await reply_simple_cmd_args(cmd_args, random_pool.pool.choice(EIGHT_BALL_SENTENCES))
 
 
 async def command_add(cmd_args: CommandArgs):
@@ -223,15 +594,15 @@ async def command_add(cmd_args: CommandArgs):
     reply = ''
 
     try:
-        success = commands.add_command(
-            commands.CustomCommand(
-                cmd_args.match_result[0],
-                cmd_args.match_result[1],
-                custom_command))
+        command = commands.CustomCommand(
+            cmd_args.match_result[0],
+            cmd_args.match_result[1],
+            custom_command)
+        success = commands.add_command(command)
         if success:
             reply = 'Added \'{}\' to the list of commands'.format(
                 cmd_args.match_result[0])
-            file_functions.save_custom_commands()
+            file_functions.save_custom_command(command)
         else:
             reply = 'A command with that name already exists!'
 
@@ -248,13 +619,61 @@ async def command_remove(cmd_args: CommandArgs):
     if commands.remove_command_by_name(cmd_args.match_result[0]):
         reply = 'Removed the command \'{}\' from the commands list'.format(
             cmd_args.match_result[0])
-        file_functions.save_custom_commands()
+        file_functions.delete_custom_command(cmd_args.match_result[0])
     else:
         reply = 'That command doesn\'t exist'
 
     await reply_simple_cmd_args(cmd_args, reply)
 
 
+async def command_alias(cmd_args: CommandArgs):
+    """Adds an alias to a custom command"""
+    import src.user.commands as commands
+    command_name = cmd_args.match_result[0]
+    alias = cmd_args.match_result[1]
+    command = commands.get_command_by_name(command_name)
+
+    if command is None or command.type != commands.CommandType.CUSTOM:
+        reply = 'That custom command doesn\'t exist'
+    elif commands.add_alias(command_name, alias):
+        reply = 'Added \'{}\' as an alias of \'{}\''.format(alias, command_name)
+        file_functions.save_custom_command(commands.get_command_by_name(command_name))
+    else:
+        reply = 'A command with that name already exists!'
+
+    await reply_simple_cmd_args(cmd_args, reply)
+
+
+async def data_export(cmd_args: CommandArgs):
+    """Exports the custom commands and user permissions to a JSON Lines file"""
+    import src.data_transfer as data_transfer
+
+    if not cmd_args.is_from_console:
+        await reply_simple_cmd_args(cmd_args, 'This command can only be run via console.')
+        return
+    path = cmd_args.match_result[0]
+    try:
+        reply = 'Exported {} records to {}'.format(data_transfer.export_records(path), path)
+    except OSError as ex:
+        reply = 'Couldn\'t write the export file: {}'.format(ex)
+    await reply_simple_cmd_args(cmd_args, reply)
+
+
+async def data_import(cmd_args: CommandArgs):
+    """Imports custom commands and user permissions from a JSON Lines file"""
+    import src.data_transfer as data_transfer
+
+    if not cmd_args.is_from_console:
+        await reply_simple_cmd_args(cmd_args, 'This command can only be run via console.')
+        return
+    try:
+        report = await data_transfer.import_records(cmd_args.match_result[0])
+        reply = report.get_summary()
+    except OSError as ex:
+        reply = 'Couldn\'t read the import file: {}'.format(ex)
+    await reply_simple_cmd_args(cmd_args, reply)
+
+
 async def custom_command(cmd_args: CommandArgs):
     """The command run for all custom commands,
     simply just passing a message through to the user
@@ -264,8 +683,9 @@ async def custom_command(cmd_args: CommandArgs):
 
 async def reply_simple(client, message, channel=None):
     if channel is None:
-        print(message)
+        console_print(message)
     else:
+        __capture_reply(message)
         await client.send_message(channel, message)
 
 
@@ -276,3 +696,27 @@ async def reply_simple_cmd_args(cmd_args: CommandArgs, message):
     await reply_simple(cmd_args.client, message,
                        None if cmd_args.is_from_console
                        else cmd_args.message.channel)
+
+
+async def run_command_function(command, cmd_args):
+    """Runs the function of the command, or sends the replies saved from running
+    it with the same arguments if the command is cached (see response_cache.py)
+    """
+    import src.response_cache as response_cache
+
+    key = None if command.cache_ttl is None else response_cache.get_key(command, cmd_args)
+    if key is None:
+        await command.function(cmd_args)
+        return
+    replies = response_cache.cache.get(key)
+    if replies is not None:
+        for reply in replies:
+            await reply_simple_cmd_args(cmd_args, reply)
+        return
+    captured = []
+    token = reply_capture.set(captured)
+    try:
+        await command.function(cmd_args)
+    finally:
+        reply_capture.reset(token)
+    response_cache.cache.put(key, tuple(captured), command.cache_ttl)
@@ -0,0 +1,140 @@
+""" Profiles the running bot for a bounded window of time ($profile <seconds>)
+
+While a profile runs, cProfile records every call made on the event loop
+thread (which runs run_command and every command function), and a sampler
+thread records the stack of the loop thread every SAMPLE_INTERVAL seconds.
+When the window ends the profile is stopped and written under data/:
+    profile-<time>.txt -- the cProfile stats, sorted by cumulative time
+    profile-<time>.prof -- the raw cProfile stats, for pstats or snakeviz
+    profile-<time>.collapsed -- the sampled stacks in the collapsed format
+                                flamegraph.pl and speedscope read
+A profile always stops after its window, which is at most MAX_SECONDS long.
+"""
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+MAX_SECONDS = 300  # The longest a profile can run for
+SAMPLE_INTERVAL = 0.005  # Seconds between each sample of the loop thread's stack
+STATS_LINES = 60  # The amount of functions written to the sorted stats file
+# Where the profiles are written, relative to the src directory
+PROFILE_DIRECTORY = '../data'
+
+
+class ProfileRunningError(Exception):
+    """An error when a profile is started while another is running"""
+
+    def __init__(self, arg):
+        self.strerror = arg
+        self.args = {arg}
+
+
+def get_collapsed_stack(frame):
+    """Returns the stack of the frame as 'outermost;...;innermost'"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename),
+                                          code.co_firstlineno))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Samples the stack of a thread on a background thread
+
+    Args:
+        thread_id (int) -- the id of the thread to sample
+    """
+
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.stacks = Counter()  # The amount of samples of each collapsed stack
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(target=self.__sample, daemon=True,
+                                         name='profile-sampler')
+
+    def start(self):
+        self.__thread.start()
+
+    def stop(self):
+        self.__stopped.set()
+        self.__thread.join()
+
+    def __sample(self):
+        while not self.__stopped.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[get_collapsed_stack(frame)] += 1
+            del frame
+
+
+class CommandProfiler:
+    """Profiles the event loop thread, one window at a time"""
+
+    def __init__(self):
+        self.__profile = None
+        self.__sampler = None
+        self.__started = None
+
+    def is_running(self):
+        return self.__profile is not None
+
+    def start(self):
+        """Starts profiling the event loop thread, must be called on the loop
+
+        Raises ProfileRunningError if a profile is already running
+        Raises ValueError if cProfile can't be enabled (ex. another profiler is active)
+        """
+        if self.is_running():
+            raise ProfileRunningError('A profile is already running')
+        profile = cProfile.Profile()
+        profile.enable()
+        self.__profile = profile
+        self.__sampler = StackSampler(threading.get_ident())
+        self.__sampler.start()
+        self.__started = time.time()
+
+    async def finish(self, seconds, directory=PROFILE_DIRECTORY):
+        """Stops the running profile (seconds) after it was started, and writes it
+
+        Returns the paths of the files written
+        """
+        seconds = min(max(seconds, 0.0), MAX_SECONDS)
+        try:
+            await asyncio.sleep(max(0.0, self.__started + seconds - time.time()))
+        finally:
+            # Always stop, even if the waiting task was cancelled
+            self.__profile.disable()
+            self.__sampler.stop()
+            profile, sampler = self.__profile, self.__sampler
+            self.__profile = self.__sampler = None
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, write_profile, profile, sampler.stacks,
+                                          directory, self.__started)
+
+
+def write_profile(profile, stacks, directory, started):
+    """Writes the profile and the sampled stacks, returns the paths written"""
+    base = os.path.join(directory, 'profile-{}'.format(
+        time.strftime('%Y%m%d-%H%M%S', time.localtime(started))))
+    stats_text = io.StringIO()
+    stats = pstats.Stats(profile, stream=stats_text)
+    stats.sort_stats('cumulative').print_stats(STATS_LINES)
+    with open(base + '.txt', 'w') as stats_file:
+        stats_file.write(stats_text.getvalue())
+    stats.dump_stats(base + '.prof')
+    with open(base + '.collapsed', 'w') as collapsed_file:
+        for stack, count in stacks.most_common():
+            collapsed_file.write('{} {}\n'.format(stack, count))
+    return [base + '.txt', base + '.prof', base + '.collapsed']
+
+
+# The profiler of the bot
+profiler = CommandProfiler()
@@ -0,0 +1,241 @@
+""" Streaming import and export of custom commands and user permissions
+
+Records are stored as JSON Lines, one JSON object per line, so files can be
+read and written a line at a time no matter how many records they hold:
+    {"type": "command", "name": "hi", "response": "hello!", "aliases": ["hey"]}
+    {"type": "permission", "user": "229628971736654096", "permission": "superuser"}
+
+Imports validate every record, skipping (and reporting) invalid ones. Records
+are applied in batches of IMPORT_BATCH_SIZE, letting the event loop run between
+batches, and the data files are written and the permission index rebuilt only
+once at the end of the import.
+"""
+import asyncio
+import json
+import src.file_functions as file_functions
+import src.user.commands as commands
+import src.user.permissions as permissions
+from src.file import files
+
+IMPORT_BATCH_SIZE = 1000  # The amount of records applied between event loop yields
+MAX_REPORTED_ERRORS = 20  # The most invalid records listed in an import's summary
+
+
+class InvalidRecordError(Exception):
+    """An error when a record being imported is not valid"""
+
+    def __init__(self, arg):
+        self.strerror = arg
+        self.args = {arg}
+
+
+class ImportReport:
+    """The results of an import"""
+
+    def __init__(self, path):
+        self.path = path
+        self.commands = 0  # The amount of custom commands imported
+        self.permissions = 0  # The amount of user permissions imported
+        self.invalid = 0  # The amount of invalid records skipped
+        self.errors = []  # (line number, error) of the first invalid records
+
+    def add_error(self, line_number, error):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_number, error))
+
+    def get_summary(self):
+        """Returns the summary of the import as a printable string"""
+        lines = ['Imported {} commands and {} permissions from {}, skipped {} invalid records'
+                 .format(self.commands, self.permissions, self.path, self.invalid)]
+        for line_number, error in self.errors:
+            lines.append('  line {}: {}'.format(line_number, error))
+        if self.invalid > len(self.errors):
+            lines.append('  ... and {} more'.format(self.invalid - len(self.errors)))
+        return '\n'.join(lines)
+
+
+def iter_records():
+    """Yields every custom command and user permission as a record"""
+    for name, data in list(files.commands_file.get_data().items()):
+        command = file_functions.custom_command_from_data(name, data)
+        record = {'type': 'command', 'name': command.name, 'response': command.response}
+        if command.aliases:
+            record['aliases'] = list(command.aliases)
+        yield record
+    for key, user_ids in list(files.users_file.get_data().items()):
+        for user_id in list(user_ids):
+            yield {'type': 'permission', 'user': user_id, 'permission': key[:-1]}
+
+
+def export_records(path):
+    """Writes every record to the JSON Lines file (path)
+
+    Returns the amount of records written
+    Raises OSError if the file can't be written
+    """
+    count = 0
+    with open(path, 'w') as export_file:
+        for record in iter_records():
+            export_file.write(json.dumps(record))
+            export_file.write('\n')
+            count += 1
+    return count
+
+
+def read_records(path):
+    """Yields (line number, record) for each line of the JSON Lines file (path),
+    the record is an InvalidRecordError if the line is not valid JSON
+    """
+    with open(path) as import_file:
+        for line_number, line in enumerate(import_file, 1):
+            line = line.strip()
+            if line == '':
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = InvalidRecordError('not valid JSON')
+            if not isinstance(record, (dict, InvalidRecordError)):
+                record = InvalidRecordError('not a JSON object')
+            yield line_number, record
+
+
+def validate_command_record(record):
+    """Returns the CustomCommand of a command record
+
+    Raises InvalidRecordError if the record is not valid
+    """
+    import src.command_functions as command_functions
+
+    name = record.get('name')
+    response = record.get('response')
+    aliases = record.get('aliases', [])
+    if not isinstance(name, str) or not isinstance(response, str):
+        raise InvalidRecordError('a command needs a \'name\' and a \'response\'')
+    if name.strip() == '':
+        raise InvalidRecordError('the name of a command must not be empty')
+    if not isinstance(aliases, list) or not all(isinstance(a, str) for a in aliases):
+        raise InvalidRecordError('\'aliases\' must be a list of words')
+    try:
+        return commands.CustomCommand(name, response, command_functions.custom_command,
+                                      aliases)
+    except commands.ImproperNameError as ex:
+        raise InvalidRecordError('command \'{}\': {}'.format(name, ex.strerror))
+
+
+def validate_permission_record(record):
+    """Returns the (user id, permission) of a permission record
+
+    Raises InvalidRecordError if the record is not valid
+    """
+    user = record.get('user')
+    user_id = commands.keyword_function_user_reference(user) \
+        if isinstance(user, str) else None
+    if user_id is None:
+        raise InvalidRecordError('\'{}\' is not a user id'.format(user))
+    permission = permissions.PERMISSION_LABELS.get(record.get('permission'))
+    if permission is None:
+        raise InvalidRecordError('\'{}\' is not a permission'.format(
+            record.get('permission')))
+    return user_id, permission
+
+
+class PermissionImport:
+    """Applies imported permissions to the users file in bulk
+
+    Membership is tracked in sets while importing, and the permission lists
+    in the users file are rewritten once by finish()
+    """
+
+    def __init__(self):
+        self.__users = files.users_file.get_data()
+        self.__members = {}  # The ids in each permission list by key
+        for key, user_ids in self.__users.items():
+            self.__members[key] = set(user_ids)
+
+    def apply(self, user_id, permission):
+        """Sets the permission of the user (id)"""
+        new_key = None
+        if permission != permissions.PermissionLevel.DEFAULT:
+            new_key = permissions.get_label_of_permission(permission) + 's'
+        # A user can only be in one permission list
+        for key, members in self.__members.items():
+            if key != new_key:
+                members.discard(user_id)
+        if new_key is not None:
+            self.__members.setdefault(new_key, set()).add(user_id)
+
+    def finish(self):
+        """Rewrites the permission lists of the users file, keeping the existing
+        order of users, and rebuilds the permission index
+        """
+        permission_lists = {}
+        for key, members in self.__members.items():
+            old_ids = self.__users.get(key, [])
+            kept = [user_id for user_id in old_ids if user_id in members]
+            kept_set = set(kept)
+            added = sorted(members - kept_set)
+            permission_lists[key] = kept + added
+        files.users_file.update(permission_lists)
+        file_functions.reindex_user_permissions()
+
+
+async def import_records(path):
+    """Imports the records in the JSON Lines file (path), replacing the response
+    of custom commands and the permission of users that already exist
+
+    Returns an ImportReport
+    Raises OSError if the file can't be read
+    """
+    report = ImportReport(path)
+    permission_import = PermissionImport()
+
+    with file_functions.batch_changes():
+        applied = 0
+        for line_number, record in read_records(path):
+            try:
+                if isinstance(record, InvalidRecordError):
+                    raise record
+                record_type = record.get('type')
+                if record_type == 'command':
+                    __import_command(validate_command_record(record), report, line_number)
+                    report.commands += 1
+                elif record_type == 'permission':
+                    permission_import.apply(*validate_permission_record(record))
+                    report.permissions += 1
+                else:
+                    raise InvalidRecordError('unknown record type \'{}\''.format(record_type))
+            except InvalidRecordError as ex:
+                report.add_error(line_number, ex.strerror)
+
+            applied += 1
+            if applied % IMPORT_BATCH_SIZE == 0:
+                # Let the bot keep running between batches
+                await asyncio.sleep(0)
+        permission_import.finish()
+    return report
+
+
+def __import_command(command, report, line_number):
+    """Adds the imported custom command. If a custom command with its name
+    already exists, its response is replaced and the aliases are added to it,
+    the aliases already in use by another command are reported to (report)
+
+    Raises InvalidRecordError if the name is used by a command that isn't custom
+    """
+    existing = commands.get_command_by_name(command.name)
+    if existing is not None and existing.type == commands.CommandType.CUSTOM:
+        # A command from the command table must be in the command list to be changed
+        commands.materialize_command(existing)
+        existing.response = command.response
+        for alias in command.aliases:
+            if alias not in existing.aliases and not commands.add_alias(existing.name, alias):
+                report.add_error(line_number, 'the alias \'{}\' of command \'{}\' is '
+                                              'already in use'.format(alias, command.name))
+        file_functions.save_custom_command(existing)
+    elif commands.add_command(command):
+        file_functions.save_custom_command(command)
+    else:
+        raise InvalidRecordError('the name of command \'{}\' is already in use'
+                                 .format(command.name))
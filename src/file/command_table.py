@@ -0,0 +1,197 @@
+""" A compiled, read-only table of the custom commands that is memory-mapped from disk
+
+For deployments with a very large commands file, loading it with json.load
+creates a string for every name and response before the bot can start. The
+command table is a binary file built from the commands file instead, which is
+memory-mapped so opening it takes the same time no matter how many commands it
+holds, and its pages are shared between every process (ex. shard) that opens it.
+A response is only decoded when its command is looked up.
+
+File layout (all integers are little endian):
+    header -- magic (8 bytes), entry count (u32), offset of the entries (u64),
+              offset of the string blob (u64)
+    entries -- one entry per name and alias, sorted by name, each holding the
+               (offset, length) in the blob of the name, the name of the command
+               it belongs to, the command's response and the command's aliases
+               (separated by new lines)
+    blob -- the utf-8 encoded names and responses
+"""
+import logging
+import mmap
+import os
+import struct
+
+MAGIC = b'SCMDTBL1'
+HEADER = struct.Struct('<8sIQQ')
+# The (offset, length) of the name, command name, response and aliases
+ENTRY = struct.Struct('<QIQIQIQI')
+
+
+class CommandTableError(Exception):
+    """An error when a command table file is not valid"""
+
+    def __init__(self, arg):
+        self.strerror = arg
+        self.args = {arg}
+
+
+def build_command_table(path, commands_data):
+    """Builds the command table file (path) from the data of the commands file
+
+    The table is written to a temporary file first and then moved into place,
+    so processes with the old table open keep reading the old table.
+    Args:
+        path (str) -- the path to write the table to
+        commands_data (dict) -- the data of the commands file, see files.py
+    """
+    blob = bytearray()
+    blob_offsets = {}  # The offset of each string already in the blob
+
+    def add_to_blob(string):
+        encoded = string.encode()
+        offset = blob_offsets.get(encoded)
+        if offset is None:
+            offset = len(blob)
+            blob_offsets[encoded] = offset
+            blob.extend(encoded)
+        return offset, len(encoded)
+
+    entries = {}  # The entry of each name (or alias) by its encoded name
+    for name, data in commands_data.items():
+        if isinstance(data, dict):
+            response, aliases = data['response'], data.get('aliases', ())
+        else:
+            response, aliases = data, ()
+        command = add_to_blob(name) + add_to_blob(response) + \
+            add_to_blob('\n'.join(aliases))
+        for entry_name in (name,) + tuple(aliases):
+            # A name wins over an alias of another command
+            if entry_name != name and entry_name.encode() in entries:
+                continue
+            entries[entry_name.encode()] = add_to_blob(entry_name) + command
+    blob_offsets = None
+
+    entries_offset = HEADER.size
+    blob_offset = entries_offset + ENTRY.size * len(entries)
+    # Each process builds into its own temporary file, in case several
+    # processes (ex. shards) rebuild the table at once
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp_path, 'wb') as table_file:
+        table_file.write(HEADER.pack(MAGIC, len(entries), entries_offset, blob_offset))
+        for encoded_name in sorted(entries):
+            table_file.write(ENTRY.pack(*entries[encoded_name]))
+        table_file.write(blob)
+    os.replace(temp_path, path)
+
+
+class CommandTable:
+    """A memory-mapped command table file, see build_command_table()
+
+    Args:
+        path (str) -- the path of the table file
+    Raises OSError if the file can't be opened
+    Raises CommandTableError if the file is not a command table
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as table_file:
+            size = os.fstat(table_file.fileno()).st_size
+            if size < HEADER.size:
+                raise CommandTableError('{} is not a command table'.format(path))
+            self.__map = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.__count, self.__entries_offset, self.__blob_offset = \
+            HEADER.unpack_from(self.__map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise CommandTableError('{} is not a command table'.format(path))
+
+    def __len__(self):
+        """Returns the amount of names and aliases in the table"""
+        return self.__count
+
+    def __get_entry(self, index):
+        return ENTRY.unpack_from(self.__map, self.__entries_offset + index * ENTRY.size)
+
+    def __get_string(self, offset, length):
+        start = self.__blob_offset + offset
+        return self.__map[start:start + length]
+
+    def lookup(self, name):
+        """Finds the name (or alias) in the table with a binary search
+
+        Returns the tuple (command name, response, aliases) if found, None otherwise
+        """
+        encoded_name = name.encode()
+        low, high = 0, self.__count
+        while low < high:
+            middle = (low + high) // 2
+            entry = self.__get_entry(middle)
+            entry_name = self.__get_string(entry[0], entry[1])
+            if entry_name < encoded_name:
+                low = middle + 1
+            elif entry_name > encoded_name:
+                high = middle
+            else:
+                aliases = self.__get_string(entry[6], entry[7]).decode()
+                return (self.__get_string(entry[2], entry[3]).decode(),
+                        self.__get_string(entry[4], entry[5]).decode(),
+                        tuple(aliases.split('\n')) if aliases else ())
+        return None
+
+    def close(self):
+        """Unmaps the table file"""
+        self.__map.close()
+
+
+class CommandTableBuilder:
+    """Rebuilds the command table in the background, REBUILD_DELAY seconds after
+    the last change to the commands file, so a burst of changes is built once
+
+    Args:
+        path (str) -- the path of the table file
+        get_commands_data (function) -- returns the data of the commands file to
+                                        build from, called on the event loop
+        on_built (function) -- called on the event loop with the new CommandTable
+        loop (object) -- the event loop
+    """
+    REBUILD_DELAY = 5.0
+
+    def __init__(self, path, get_commands_data, on_built, loop):
+        self.path = path
+        self.__get_commands_data = get_commands_data
+        self.__on_built = on_built
+        self.__loop = loop
+        self.__handle = None  # The scheduled rebuild
+        self.__building = False
+        self.__rebuild_again = False  # was a rebuild scheduled while building?
+
+    def schedule(self):
+        """Schedules a rebuild of the table, pushing back any scheduled rebuild"""
+        if self.__handle is not None:
+            self.__handle.cancel()
+        self.__handle = self.__loop.call_later(CommandTableBuilder.REBUILD_DELAY,
+                                               self.__rebuild)
+
+    def __rebuild(self):
+        self.__handle = None
+        if self.__building:
+            self.__rebuild_again = True
+            return
+        self.__building = True
+        # A shallow copy is enough, as the values are replaced, never changed
+        commands_data = dict(self.__get_commands_data())
+        future = self.__loop.run_in_executor(None, build_command_table,
+                                             self.path, commands_data)
+        future.add_done_callback(self.__built)
+
+    def __built(self, future):
+        self.__building = False
+        try:
+            future.result()
+            self.__on_built(CommandTable(self.path))
+        except (OSError, CommandTableError):
+            logging.getLogger(__name__).exception("Couldn't rebuild %s", self.path)
+        if self.__rebuild_again:
+            self.__rebuild_again = False
+            self.schedule()
@@ -0,0 +1,50 @@
+""" Functions for finding and applying changes between versions of json data
+
+Changes are found at the top level keys of the data only, ex. for the users file
+a change to the 'superusers' list is a change to the 'superusers' key. This is
+enough to keep each command or permission level in sync separately.
+
+Values are compared by identity before equality, versions of the data share
+the values of the keys that weren't changed (see data_versions.py), so
+comparing two versions of a large file only compares the changed keys.
+"""
+
+
+def diff_data(old, new):
+    """Compares the top level keys of two json data dicts
+
+    Returns a tuple of (set, delete) where:
+        set (dict) -- the keys in (new) that were added or changed, with their values
+        delete (list) -- the keys in (old) that are not in (new)
+    """
+    changed = {}
+    for key, value in new.items():
+        if key not in old or (old[key] is not value and old[key] != value):
+            changed[key] = value
+    deleted = [key for key in old if key not in new]
+    return changed, deleted
+
+
+def apply_diff(data, changed, deleted):
+    """Applies the result of diff_data() to the json data dict (data)"""
+    for key in deleted:
+        data.pop(key, None)
+    data.update(changed)
+
+
+def merge_diff(base, ours, theirs):
+    """Finds the changes made in (theirs) to merge into (ours), where both are
+    changed versions of (base). Our changes win when both changed the same key
+
+    Neither version is changed, the values of (theirs) are shared with the result.
+    Returns the changes to apply to (ours) as a tuple of (set, delete)
+    """
+    ours_changed, ours_deleted = diff_data(base, ours)
+    theirs_changed, theirs_deleted = diff_data(base, theirs)
+
+    changed = {}
+    for key, value in theirs_changed.items():
+        if key not in ours_changed and key not in ours_deleted:
+            changed[key] = value
+    deleted = [key for key in theirs_deleted if key not in ours_changed]
+    return changed, deleted
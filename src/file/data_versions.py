@@ -0,0 +1,81 @@
+""" Copy-on-write versions of json data, for reading it from any thread without locks
+
+The data of a file is kept as a series of versions. A published version is never
+changed, so any thread can keep one and use it (ex. write it to disk) while the
+event loop goes on changing the data, without copying it or locking.
+
+Changes are made to a draft, a shallow copy of the last published version that
+only the thread making the changes sees. The draft is published (and a new one
+copied on the next change) when another thread takes a snapshot, so the top
+level of the data is copied at most once per snapshot (ex. once per auto save)
+rather than once per change, and bulk changes stay cheap.
+
+The values under the top level keys are shared between versions, and must
+never be changed in place either, only replaced:
+    users = data_file.get_data()
+    data_file.set('superusers', users['superusers'] + [user_id])  # not .append()
+"""
+import threading
+from src.file.data_diff import apply_diff
+
+
+class DataVersions:
+    """The published version of some json data, and the draft of the next one
+
+    Args:
+        data (dict) -- the first version of the data
+    """
+    __missing = object()  # Stands in for the value of a missing key when comparing versions
+
+    def __init__(self, data):
+        self.current = data  # The published version, never changed
+        self.__draft = None  # The next version, if changed since the last snapshot
+        # Held while changing the draft or publishing it, only ever held briefly
+        self.__lock = threading.Lock()
+
+    def get(self):
+        """Returns the latest version, including the changes not yet published
+
+        Only for the thread making the changes, other threads use snapshot()
+        """
+        draft = self.__draft  # Read once, another thread may publish it meanwhile
+        return self.current if draft is None else draft
+
+    def update(self, changed, deleted=()):
+        """Sets the keys of (changed) and deletes the keys (deleted) in the draft"""
+        with self.__lock:
+            if self.__draft is None:
+                self.__draft = dict(self.current)
+            apply_diff(self.__draft, changed, deleted)
+
+    def replace(self, data):
+        """Replaces the whole data with a copy of (data)"""
+        with self.__lock:
+            self.__draft = dict(data)
+
+    def snapshot(self):
+        """Publishes the draft and returns the published version"""
+        with self.__lock:
+            if self.__draft is not None:
+                self.current, self.__draft = self.__draft, None
+            return self.current
+
+    def apply_external(self, changed, deleted, ours):
+        """Publishes changes made elsewhere (ex. by another process), found by
+        comparing against the snapshot (ours). Keys changed since that snapshot
+        are skipped, as our changes win
+
+        Returns (the version the changes were applied to, the published version,
+        the keys set, the keys deleted)
+        """
+        with self.__lock:
+            base = self.__draft if self.__draft is not None else self.current
+            if base is not ours:
+                changed = {key: value for key, value in changed.items()
+                           if base.get(key, self.__missing) is ours.get(key, self.__missing)}
+                deleted = [key for key in deleted
+                           if base.get(key, self.__missing) is ours.get(key, self.__missing)]
+            data = dict(base)
+            apply_diff(data, changed, deleted)
+            self.current, self.__draft = data, None
+        return base, data, changed, deleted
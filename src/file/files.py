@@ -1,24 +1,91 @@
+"""The JSON files used by the bot to access and write data
+
+The files are opened by open_files(), which is called once at startup
+(see src.initialize()), until then each file is None.
+"""
 from .json_data_file import JSONDataFile
-# JSON files used by the bot to access and write data
-properties_file = JSONDataFile("../data/properties.json", {
-    'token': None
-})
-scripts_file = JSONDataFile("../data/scripts.json")
-users_file = JSONDataFile("../data/users.json", {
-    "superusers": [],
-    "users": []
-})
-commands_file = JSONDataFile("../data/commands.json")
+
+# When running as a shard (see shard/launcher.py), the data files are owned by
+# the coordinator process, this is the link to it. None when not a shard
+shard_link = None
+
+COMMANDS_FILE_PATH = "../data/commands.json"
+# The compiled table of the custom commands, see command_table.py
+COMMAND_TABLE_PATH = "../data/commands.table"
+
+properties_file = None
+scripts_file = None
+users_file = None
+commands_file = None
+roles_file = None  # The permission rules of server roles, see user/roles.py
+schedules_file = None  # The scheduled commands, see scheduler.py
+usage_file = None  # The uses of each command, see usage_stats.py
 # Example commands file layout:
 # {
 #   'cool_command': 'what\'s up ma dudes'
 #   'squad': 'http://www.stuff.com/pic_of_squad.png'
+#   'hi': {'response': 'hello!', 'aliases': ['hey', 'yo']}
 # }
 
 
+def open_files(lazy_commands=False):
+    """Opens all files, loading them from disk (or from the
+    coordinator when running as a shard)
+
+    Args:
+        lazy_commands (bool) -- if True, the commands file is only loaded
+                                from disk once its data is first used
+    """
+    global shard_link, properties_file, scripts_file, users_file, commands_file, \
+        roles_file, schedules_file, usage_file
+    from src.shard.link import connect_from_environment
+
+    shard_link = connect_from_environment()
+    if shard_link is None:
+        properties_file = JSONDataFile("../data/properties.json", {
+            'token': None
+        })
+        scripts_file = JSONDataFile("../data/scripts.json")
+        users_file = JSONDataFile("../data/users.json", {
+            "superusers": [],
+            "users": []
+        })
+        commands_file = JSONDataFile(COMMANDS_FILE_PATH, lazy=lazy_commands)
+        roles_file = JSONDataFile("../data/roles.json", {
+            'roles': {},
+            'channels': {}
+        })
+        schedules_file = JSONDataFile("../data/schedules.json")
+        usage_file = JSONDataFile("../data/usage.json")
+    else:
+        properties_file = shard_link.get_file('properties')
+        scripts_file = shard_link.get_file('scripts')
+        users_file = shard_link.get_file('users')
+        commands_file = shard_link.get_file('commands')
+        roles_file = shard_link.get_file('roles')
+        schedules_file = shard_link.get_file('schedules')
+        usage_file = shard_link.get_file('usage')
+
+
+def get_files_by_name():
+    """Returns all files by their names, ex. {'users': users_file, ...}"""
+    return {
+        'properties': properties_file,
+        'scripts': scripts_file,
+        'users': users_file,
+        'commands': commands_file,
+        'roles': roles_file,
+        'schedules': schedules_file,
+        'usage': usage_file
+    }
+
+
 def close():
     """Closes all files"""
     properties_file.close()
     scripts_file.close()
     users_file.close()
     commands_file.close()
+    roles_file.close()
+    schedules_file.close()
+    usage_file.close()
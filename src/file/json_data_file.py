@@ -4,32 +4,72 @@ For All further explanation see the class docstring
 
 """
 import json
+import os
 import threading  # used to attempt to write to disk every 5 seconds if data was changed
-import copy  # allows for deep copying of dictionary data used in json
+from contextlib import contextmanager
+from src.file.data_diff import merge_diff
+from src.file.data_versions import DataVersions
+try:
+    import fcntl  # used to lock the file while it is written, only available on unix
+except ImportError:
+    fcntl = None
 
 
 class JSONDataFile:
     """Allows simple loading, getting, and setting of an individual json data file.
 
     The JSONDataFile is always kept in sync with the file it represents on disk.
+    If another process changes the file, those changes are merged into the data
+    at the next save (every 5 seconds), with changes made in this process winning
+    when both changed the same top level key. Writes hold a lock on a '.lock' file
+    beside the file so two processes never write at the same time.
+
+    The data is copy-on-write (see data_versions.py): get_data() returns data
+    that must not be changed, changes are made with set(), delete() and update().
+    The auto save writes a snapshot of the data on its own thread, without
+    copying it or locking out the changes made meanwhile.
     Example:
         properties = JSONDataFile('properties.json')
+        properties.set('token', token)
     """
 
-    def __init__(self, file, default_data={}):
+    def __init__(self, file, default_data={}, lazy=False):
         """Initialize by loading the file data and storing it within data
 
             :param file: The relative path to the json file
             :param default_data: the default json data to be set into the file if theres an error
+            :param lazy: if True, the file is only loaded when its data is first used
         """
         self.__file = file
-        self.__data = None  # The current json data
-        # A copy of the json (__data) that was last saved to disk
+        self.__default_data = default_data
+        self.__versions = DataVersions(None)  # The versions of the json data
+        self.__data_loaded = False  # has the data been loaded from disk yet?
+        # The version of the data that was last saved to disk
         self.__data_last = None
-        self.__data_was_changed = False  # was the data changed since last save to disk?
+        # The (inode, modified time, size) of the file when it was last read or
+        # written by us, used to detect changes made by other processes
+        self.__disk_signature = None
+        self.__change_listeners = []
+        self.__auto_save_timer = None
+        self.__closed = False
+        self.__writes_held = 0  # While above 0, the auto save doesn't write to disk
+        # Held while writing to disk, so the auto save timer's thread and
+        # flush() or close() never write at the same time
+        self.__write_lock = threading.RLock()
+        if not lazy:
+            self.__load()
+        self.__start_auto_save_timer()
+
+    def __load(self):
+        """ Loads the data from the file, creating the file if it doesn't exist """
+        file = self.__file
         try:
-            json_data_file = open(file)
-            self.__data = json.load(json_data_file)
+            with self.__locked():
+                with open(file) as json_data_file:
+                    data = json.load(json_data_file)
+                self.__disk_signature = self.__get_disk_signature()
+            self.__versions.current = self.__data_last = data
+            self.__data_loaded = True
         except (FileNotFoundError, json.JSONDecodeError) as ex:
             if isinstance(ex, json.JSONDecodeError):
                 print("Error decoding {}, reseting file ... ".format(file), end='')
@@ -38,52 +78,179 @@ class JSONDataFile:
             # Create a new file and write default_data
             json_data_file = open(file, "w+")
             json_data_file.close()
-            self.set_data(default_data)
-            self.__write_data_to_disk()
-        print("{} loaded ...".format(file), end='')
-        self.__start_auto_save_timer()
-        print()  # print new line
+            self.__versions.current = self.__default_data
+            self.__data_loaded = True
+            self.__write_data_to_disk(False)
+        print("{} loaded ...".format(file))
 
     def __start_auto_save_timer(self):
         """ Automatically attempt to write the data (__data) to disk (__file) in 5 seconds """
-        threading.Timer(5.0, self.__write_data_to_disk).start()
+        if self.__closed:
+            return
+        self.__auto_save_timer = threading.Timer(5.0, self.__auto_save)
+        self.__auto_save_timer.start()
 
-    def __write_data_to_disk(self):
-        """ writes the data stored in (__data) to the file (__file) if data was changed """
-        self.__data_change_check()
+    def __auto_save(self):
+        """ Writes the data to disk unless writes are being held """
+        if self.__closed:
+            return
+        if self.__writes_held > 0:
+            self.__start_auto_save_timer()
+        else:
+            self.__write_data_to_disk()
 
-        if self.__data_was_changed:
-            # Update file on disk
-            with open(self.__file, "w") as json_data_file:
-                json.dump(self.__data, json_data_file)
-            json_data_file.close()
-            # Set data was changed to false as the data in memory
-            # is the same as in the file now
-            self.__data_was_changed = False
-            self.__data_last = copy.deepcopy(self.__data)  # copy
-        self.__start_auto_save_timer()
+    def __write_data_to_disk(self, restart_timer=True):
+        """ writes the data stored in (__data) to the file (__file) if data was changed,
+        after merging in any changes made to the file by other processes
+        """
+        with self.__write_lock:
+            if not self.__data_loaded:
+                # Nothing to write until the data of a lazy file is used
+                if restart_timer and not self.__closed:
+                    self.__start_auto_save_timer()
+                return
+            with self.__locked():
+                self.__merge_external_changes()
+                # A version is never changed once published, so it was changed
+                # since the last save if it's not the same version
+                data = self.__versions.snapshot()
+                if data is not self.__data_last:
+                    # Update file on disk, writing to a temporary file first so the
+                    # file is never left half written
+                    temp_file = self.__file + '.tmp'
+                    with open(temp_file, "w") as json_data_file:
+                        json.dump(data, json_data_file)
+                    os.replace(temp_file, self.__file)
+                    self.__disk_signature = self.__get_disk_signature()
+                    self.__data_last = data
+            if restart_timer and not self.__closed:
+                self.__start_auto_save_timer()
+
+    @contextmanager
+    def __locked(self):
+        """ Holds the lock on the file for the duration of a with statement """
+        if fcntl is None:
+            yield
+            return
+        with open(self.__file + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def __get_disk_signature(self):
+        """ Returns the (inode, modified time, size) of the file, None if it doesn't exist """
+        try:
+            stat = os.stat(self.__file)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def __merge_external_changes(self):
+        """ Merges in changes made to the file by other processes since we last
+        read or wrote it, only the changed top level keys are touched
+
+        Must be called while holding the lock
+        """
+        disk_signature = self.__get_disk_signature()
+        if disk_signature == self.__disk_signature or self.__data_last is None:
+            return
+        try:
+            with open(self.__file) as json_data_file:
+                disk_data = json.load(json_data_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self.__disk_signature = disk_signature
+
+        ours = self.__versions.snapshot()
+        changed, deleted = merge_diff(self.__data_last, ours, disk_data)
+        base, merged = ours, ours
+        if changed or deleted:
+            base, merged, changed, deleted = self.__versions.apply_external(
+                changed, deleted, ours)
+        if ours is self.__data_last and base is ours:
+            # Without changes of our own the merged version is the data on disk
+            self.__data_last = merged
+        else:
+            # The data on disk is now what the data was last in sync with
+            self.__data_last = disk_data
+        if changed or deleted:
+            for listener in self.__change_listeners:
+                listener(changed, deleted)
+
+    def add_change_listener(self, listener):
+        """ Adds a function to call with the arguments (set, delete) whenever
+        changes made to the file by another process are merged in
+        Note:
+            listeners are called from the auto save timer's thread
+        """
+        self.__change_listeners.append(listener)
 
     def set_data(self, data):
         """ Forcefully sets the entire json data, use carefully
         Args:
             data (dict): JSON data string for the file
         """
-        self.__data = data
-
-    def __data_change_check(self):
-        """ Checks if data was changed, if so, mark it in self.__dataWasChanged """
-        if str(self.__data) != str(self.__data_last):
-            self.__data_was_changed = True
+        if not self.__data_loaded:
+            self.__load()
+        self.__versions.replace(data)
 
     def get_data(self):
-        """ Gets the string data of the json file
+        """ Gets the data of the json file
         Note:
-            this is a direct reference and not a copy of the data
+            this is not a copy of the data, it must not be changed (nor the
+            values in it), use set(), delete() or update() instead
         Returns:
             dict: the data for the JSON file
         """
-        return self.__data
+        if not self.__data_loaded:
+            self.__load()
+        return self.__versions.get()
+
+    def set(self, key, value):
+        """ Sets the top level (key) of the data to (value) """
+        self.update({key: value})
+
+    def delete(self, key):
+        """ Deletes the top level (key) of the data, if it exists """
+        self.update({}, (key,))
+
+    def update(self, changed, deleted=()):
+        """ Sets the top level keys of (changed) and deletes the keys (deleted)
+        Args:
+            changed (dict): the keys to set with their values
+            deleted (iterable): the keys to delete
+        """
+        if not self.__data_loaded:
+            self.__load()
+        self.__versions.update(changed, deleted)
+
+    def is_loaded(self):
+        """ Returns True if the data was loaded from disk (lazy files load on first use) """
+        return self.__data_loaded
+
+    def hold_writes(self):
+        """ Stops the auto save from writing to disk until release_writes() is called,
+        so many changes can be made and then written once with flush()
+        """
+        self.__writes_held += 1
+
+    def release_writes(self):
+        """ Lets the auto save write to disk again after hold_writes() """
+        self.__writes_held = max(0, self.__writes_held - 1)
+
+    def flush(self):
+        """ Writes the data to disk now if it was changed """
+        self.__write_data_to_disk(False)
 
     def close(self):
         """ Saves and closes the JSON file while removing any threads on a timer """
-        self.__write_data_to_disk()
+        # Waits for a write by the auto save timer's thread to finish first
+        with self.__write_lock:
+            self.__closed = True
+            if self.__auto_save_timer is not None:
+                self.__auto_save_timer.cancel()
+            # Written even while writes are held (ex. closed from inside a batch),
+            # the changes would be lost otherwise
+            self.__write_data_to_disk(False)
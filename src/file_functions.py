@@ -1,7 +1,10 @@
 """ Functions for all higher level file operations"""
+from contextlib import contextmanager
 import src.user.permissions as permissions
+import src.user.roles as roles
 import src.file.files as files
 import src.user.commands as commands
+import src.response_cache as response_cache
 
 
 def id_to_user(client, user_id):
@@ -14,13 +17,116 @@ def id_to_user(client, user_id):
     return None
 
 
+# The permission level of every user in the users file by their id, so checking
+# the permission of a user is a single lookup. Built on first use.
+__user_permissions = None
+# The ids indexed from each permission list in the users file
+# ex. {'superusers': {'229628971736654096'}, 'users': set()}
+__indexed_user_ids = {}
+
+
+def __index_permission_list(key, user_ids):
+    """(Re)indexes the permission list (key) of the users file, ex. 'superusers'"""
+    permission = permissions.get_permission_of_label(key[:-1])
+    for user_id in __indexed_user_ids.pop(key, ()):
+        if __user_permissions.get(user_id) == permission:
+            del __user_permissions[user_id]
+    user_ids = set(user_ids)
+    __indexed_user_ids[key] = user_ids
+    for user_id in user_ids:
+        # A user listed twice has the highest of the permissions
+        if __user_permissions.get(user_id, permission) <= permission:
+            __user_permissions[user_id] = permission
+
+
+def reindex_user_permissions(keys=None):
+    """Rebuilds the index of user permissions for the permission lists (keys)
+    of the users file, ex. ['superusers'], or for every list by default.
+
+    Must be called after changing the users file other than through
+    set_user_permission()
+    """
+    global __user_permissions
+    users_data = files.users_file.get_data()
+    if keys is None or __user_permissions is None:
+        __user_permissions = {}
+        __indexed_user_ids.clear()
+        keys = users_data.keys()
+    for key in keys:
+        __index_permission_list(key, users_data.get(key, ()))
+    # Cached replies may depend on the permissions that changed
+    response_cache.invalidate()
+
+
+def apply_user_permission_changes(changed, deleted):
+    """Applies changes to the users file made by another process
+    to the index of user permissions, only reindexing the changed lists
+    """
+    reindex_user_permissions(list(changed.keys()) + list(deleted))
+
+
 def get_user_permission_level(user_id):
     """Returns the permission level of the user"""
-    user_perms_list = files.users_file.get_data()
-    for perm in user_perms_list:
-        if user_id in user_perms_list[perm]:
-            return permissions.get_permission_of_label(perm[:-1])
-    return permissions.PermissionLevel.DEFAULT
+    if __user_permissions is None:
+        reindex_user_permissions()
+    return __user_permissions.get(user_id, permissions.PermissionLevel.DEFAULT)
+
+
+# Resolves the permissions members get from the rules of their roles
+role_permissions = roles.PermissionResolver(lambda: files.roles_file.get_data())
+
+
+def get_message_permission_level(message):
+    """Returns the effective permission level of the author of the message, the
+    highest of their own permission and the rules of their roles in its channel
+    """
+    permission = get_user_permission_level(message.author.id)
+    if permission == permissions.PermissionLevel.SUPERUSER:
+        return permission
+    return max(permission, role_permissions.get_permission_level(
+        message.author, message.channel.id))
+
+
+def set_role_permission(role_id, permission, channel_id=None):
+    """Sets the permission level members with the role (id) get, in the
+    channel (id) or in the whole server if no channel is given. Setting
+    it to the default permission removes the rule
+    """
+    rules = files.roles_file.get_data()
+    # The rules are copied, the data of the roles file must not be changed in place
+    if channel_id is None:
+        role_rules = dict(rules.get('roles', {}))
+    else:
+        role_rules = dict(rules.get('channels', {}).get(channel_id, {}))
+    if permission == permissions.PermissionLevel.DEFAULT:
+        role_rules.pop(role_id, None)
+    else:
+        role_rules[role_id] = permissions.get_label_of_permission(permission)
+    if channel_id is None:
+        files.roles_file.set('roles', role_rules)
+    else:
+        channels = dict(rules.get('channels', {}))
+        if role_rules:
+            channels[channel_id] = role_rules
+        else:
+            channels.pop(channel_id, None)
+        files.roles_file.set('channels', channels)
+    role_permissions.invalidate()
+
+
+def apply_role_rule_changes(changed, deleted):
+    """Applies changes to the roles file made by another process"""
+    role_permissions.invalidate()
+
+
+def add_superuser(user_id):
+    """Adds the user (id) to the superusers without checking that the user exists,
+    this is used to add the first superuser before the bot shares a server with them
+    """
+    superusers = files.users_file.get_data()['superusers']
+    if user_id not in superusers:
+        files.users_file.set('superusers', superusers + [user_id])
+    reindex_user_permissions(['superusers'])
 
 
 def set_user_permission(user_id, client, permission):
@@ -60,8 +166,11 @@ def set_user_permission(user_id, client, permission):
     if current_permission != permissions.PermissionLevel.DEFAULT:
         key_in_file = permissions.get_label_of_permission(
             current_permission) + 's'
-        if user_id in files.users_file.get_data()[key_in_file]:
-            files.users_file.get_data()[key_in_file].remove(user_id)
+        user_ids = files.users_file.get_data()[key_in_file]
+        if user_id in user_ids:
+            files.users_file.set(key_in_file, [other_id for other_id in user_ids
+                                               if other_id != user_id])
+        reindex_user_permissions([key_in_file])
 
     # Set the permission of the user
     # Note that we do not add users with the default permission to the users file.
@@ -70,35 +179,172 @@ def set_user_permission(user_id, client, permission):
     if permission != permissions.PermissionLevel.DEFAULT:
         permission_save_name = permissions.get_label_of_permission(
             permission) + 's'
-        files.users_file.get_data()[permission_save_name].append(user_id)
+        files.users_file.set(permission_save_name,
+                             files.users_file.get_data()[permission_save_name] + [user_id])
+        reindex_user_permissions([permission_save_name])
     return "{} is now a {}".format(
         user_to_add.name,
         permissions.get_label_of_permission(permission))
 
 
-def save_custom_commands():
-    """Saves the custom commands to the commands file"""
-    # Reset file data
-    files.commands_file.set_data({})
+# While above 0, changes are being batched (see batch_changes())
+__batch_depth = 0
+
+
+@contextmanager
+def batch_changes():
+    """Batches all changes made in a with statement,
+    so the data files are written to disk only once at the end
+
+    Example:
+        with file_functions.batch_changes():
+            for ...:
+                commands.add_command(...)
+                save_custom_command(...)  # written to disk at the end
+    """
+    global __batch_depth
+    data_files = files.get_files_by_name().values()
+    __batch_depth += 1
+    for data_file in data_files:
+        data_file.hold_writes()
+    try:
+        yield
+    finally:
+        __batch_depth -= 1
+        for data_file in data_files:
+            data_file.release_writes()
+        if __batch_depth == 0:
+            for data_file in data_files:
+                data_file.flush()
+
+
+def save_custom_command(command):
+    """Saves the custom command (added or changed) to the commands file"""
+    files.commands_file.set(command.name, custom_command_to_data(command))
+    __schedule_command_table_rebuild()
+
+
+def delete_custom_command(name):
+    """Deletes the custom command (name) from the commands file"""
+    files.commands_file.delete(name)
+    __schedule_command_table_rebuild()
 
-    for command_type in commands.get_commands().keys():
-        for command in commands.get_commands(command_type):
-            if command_type == commands.CommandType.CUSTOM:
-                files.commands_file.get_data()[
-                    command.name] = command.response
+
+def custom_command_to_data(command):
+    """Returns the data saved in the commands file for the custom command
+
+    Commands without aliases are saved as just their response, while commands
+    with aliases are saved as a dict:
+        {'response': 'what\'s up ma dudes', 'aliases': ['sup']}
+    """
+    if not command.aliases:
+        return command.response
+    return {'response': command.response, 'aliases': list(command.aliases)}
+
+
+def custom_command_from_data(name, data):
+    """Returns a CustomCommand from its name and data in the commands file"""
+    import src.command_functions as command_functions
+
+    if isinstance(data, dict):
+        return commands.CustomCommand(name, data['response'],
+                                      command_functions.custom_command,
+                                      data.get('aliases', ()))
+    return commands.CustomCommand(name, data, command_functions.custom_command)
+
+
+def call_on_event_loop(function):
+    """Returns a change listener that calls (function) on the event loop,
+    as data files may call their listeners from another thread
+    """
+    import asyncio
+    loop = asyncio.get_event_loop()
+
+    def listener(changed, deleted):
+        loop.call_soon_threadsafe(function, changed, deleted)
+    return listener
+
+
+def apply_custom_command_changes(changed, deleted):
+    """Applies changes to the commands file made by another process
+    to the command list, only touching the commands that changed
+
+    Args:
+        changed (dict) -- the data of added or changed commands by their names
+        deleted (list) -- the names of the removed commands
+    """
+    for name in deleted:
+        commands.remove_command_by_name(name)
+    for name, data in changed.items():
+        commands.remove_command_by_name(name)
+        commands.add_command(custom_command_from_data(name, data))
+    __schedule_command_table_rebuild()
 
 
 def load_custom_commands():
     """Loads the commands in the commands file and
     returns the list as CustomCommand objects
     """
-    import src.command_functions as command_functions
-
     loaded = []
     for command_data in files.commands_file.get_data().items():
-        loaded.append(commands.CustomCommand(
+        loaded.append(custom_command_from_data(
             command_data[0],
-            command_data[1],
-            command_functions.custom_command))
+            command_data[1]))
 
     return loaded
+
+
+# The open command table and the builder that rebuilds it in the background,
+# None unless open_command_table() was called
+__command_table = None
+__command_table_builder = None
+
+
+def __schedule_command_table_rebuild():
+    if __command_table_builder is not None:
+        __command_table_builder.schedule()
+
+
+def open_command_table():
+    """Looks up custom commands in a memory-mapped command table (see
+    file/command_table.py) instead of loading them into the command list
+
+    The table is built first if it doesn't exist or is older than the commands
+    file, and is rebuilt in the background after the custom commands change.
+    Must be called from the event loop thread
+    """
+    global __command_table, __command_table_builder
+    import asyncio
+    import os
+    import src.command_functions as command_functions
+    from src.file import command_table
+
+    path = files.COMMAND_TABLE_PATH
+    try:
+        is_stale = os.stat(path).st_mtime < os.stat(files.COMMANDS_FILE_PATH).st_mtime
+    except FileNotFoundError:
+        is_stale = True
+    try:
+        if is_stale:
+            command_table.build_command_table(path, files.commands_file.get_data())
+        __command_table = command_table.CommandTable(path)
+    except command_table.CommandTableError:
+        # Replace a damaged table
+        command_table.build_command_table(path, files.commands_file.get_data())
+        __command_table = command_table.CommandTable(path)
+    commands.set_command_table(__command_table, command_functions.custom_command)
+
+    def get_commands_data():
+        # Changes to a data file are only seen by other processes once written
+        files.commands_file.flush()
+        return files.commands_file.get_data()
+
+    def on_built(table):
+        global __command_table
+        old_table = __command_table
+        __command_table = table
+        commands.set_command_table(table, command_functions.custom_command)
+        old_table.close()
+
+    __command_table_builder = command_table.CommandTableBuilder(
+        path, get_commands_data, on_built, asyncio.get_event_loop())
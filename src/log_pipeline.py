@@ -0,0 +1,177 @@
+""" Logging that doesn't block the event loop
+
+Writing a log record to a terminal or pipe is a blocking write, and a slow reader
+holds up the whole bot. Instead, every record is put on a queue by the thread
+that logged it, and a background thread formats and writes the records.
+
+Levels can be set per module, ex. to keep discord's logs at warnings while
+debugging a single module, and high volume debug logs can be sampled, keeping
+only one in every n records of a logger. With JSON output each record is one
+line, including the 'command' and 'latency_ms' of records logged with them:
+    logger.debug('Ran command', extra={'command': 'help', 'latency_ms': 0.42})
+
+Example:
+    log_pipeline.setup('INFO,discord=WARNING,src.scripty=DEBUG',
+                       json_output=True, sample_rates={'src.scripty': 100})
+    ...
+    log_pipeline.stop()  # writes the records still queued
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+DEFAULT_LEVELS = 'INFO'
+# The fields of a record added to its JSON output when the record has them
+EXTRA_FIELDS = ('command', 'latency_ms')
+
+# The listener writing queued records, None until setup() is called
+__listener = None
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """Puts records on the queue with their message merged with its arguments,
+    leaving the formatting (ex. of tracebacks) to the writer thread
+    """
+
+    def prepare(self, record):
+        # Arguments are merged now, as they may be changed once this returns
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only one in every n debug records of the loggers (and their children)
+
+    Args:
+        sample_rates (dict) -- the n of each logger, by the logger's name
+    """
+
+    def __init__(self, sample_rates):
+        super().__init__()
+        self.sample_rates = sample_rates
+        self.__counts = {}  # The amount of debug records seen of each logger
+        self.__lock = threading.Lock()
+
+    def __get_rate(self, name):
+        while name:
+            rate = self.sample_rates.get(name)
+            if rate is not None:
+                return rate
+            name = name.rpartition('.')[0]
+        return 1
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = self.__get_rate(record.name)
+        if rate <= 1:
+            return True
+        with self.__lock:
+            count = self.__counts.get(record.name, 0)
+            self.__counts[record.name] = count + 1
+        return count % rate == 0
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats each record as a single line JSON object"""
+
+    def format(self, record):
+        output = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for field in EXTRA_FIELDS:
+            if hasattr(record, field):
+                output[field] = getattr(record, field)
+        if record.exc_info:
+            output['exception'] = self.formatException(record.exc_info)
+        return json.dumps(output)
+
+
+def parse_levels(levels):
+    """Parses the levels of the root logger and of each module from a string
+    ex. 'INFO,discord=WARNING' to (logging.INFO, {'discord': logging.WARNING})
+
+    Raises ValueError if a level is not a logging level
+    """
+    root_level = logging.INFO
+    module_levels = {}
+    for part in levels.split(','):
+        name, _, level_name = part.strip().rpartition('=')
+        level = logging.getLevelName(level_name.strip().upper())
+        if not isinstance(level, int):
+            raise ValueError('{} is not a logging level'.format(level_name))
+        if name:
+            module_levels[name.strip()] = level
+        else:
+            root_level = level
+    return root_level, module_levels
+
+
+def parse_sample_rates(rates):
+    """Parses the sample rate of each logger from a string
+    ex. 'discord.gateway=100,src.scripty=10' to {'discord.gateway': 100, 'src.scripty': 10}
+
+    Raises ValueError if a rate is not a whole number
+    """
+    sample_rates = {}
+    for part in rates.split(','):
+        name, _, rate = part.strip().rpartition('=')
+        sample_rates[name.strip()] = int(rate)
+    return sample_rates
+
+
+def setup(levels=DEFAULT_LEVELS, json_output=False, sample_rates=None, stream=None):
+    """Sends every log record through a queue to a background writer thread
+
+    Args:
+        levels (str) -- the level of the root logger and of each module,
+                        see parse_levels()
+        json_output (bool) -- if True, records are written as JSON lines
+        sample_rates (dict) -- keep one in every n debug records of these loggers,
+                               n by logger name, see SamplingFilter
+        stream (object) -- where records are written, sys.stderr by default
+    Raises ValueError if a level is not a logging level
+    """
+    global __listener
+    root_level, module_levels = parse_levels(levels)
+    stop()
+
+    writer = logging.StreamHandler(sys.stderr if stream is None else stream)
+    if json_output:
+        writer.setFormatter(JSONFormatter())
+    else:
+        writer.setFormatter(logging.Formatter(
+            '%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    records = queue.SimpleQueue()
+    handler = QueueHandler(records)
+    if sample_rates:
+        handler.addFilter(SamplingFilter(sample_rates))
+
+    root = logging.getLogger()
+    for old_handler in list(root.handlers):
+        root.removeHandler(old_handler)
+    root.addHandler(handler)
+    root.setLevel(root_level)
+    for name, level in module_levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    __listener = logging.handlers.QueueListener(records, writer)
+    __listener.start()
+
+
+def stop():
+    """Writes the records still queued and stops the writer thread"""
+    global __listener
+    if __listener is not None:
+        __listener.stop()
+        __listener = None
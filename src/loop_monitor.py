@@ -0,0 +1,161 @@
+""" Monitors the event loop for lag and for code that blocks it
+
+The console, the discord client and every command function share one event loop,
+so a blocking call in any of them (ex. urlopen, or writing to disk) freezes the
+whole bot. The LoopMonitor measures how late the loop runs a regularly scheduled
+sample, keeping a rolling histogram of this lag, and runs a watchdog thread that
+logs the stack of the loop thread, and the command being run, whenever the loop
+is held for longer than a threshold.
+
+Example:
+    loop_monitor.start(client.loop)
+    print(loop_monitor.get_report())
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+SAMPLE_INTERVAL = 0.1  # Seconds between each lag sample
+SAMPLE_HISTORY = 3000  # The amount of samples kept (5 minutes worth)
+STALL_THRESHOLD = 0.5  # Seconds the loop can be held for before the watchdog logs it
+# The upper bounds (in ms) of each bucket of the lag histogram
+LAG_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+logger = logging.getLogger(__name__)
+
+# The monitor of the bot's event loop, None until start() is called
+monitor = None
+
+
+def get_running_command(frame):
+    """Returns the name of the command being run in the stack of (frame), by
+    looking for the 'command' local variable of run_command(). Returns None if
+    no command is being run
+    """
+    from src.user.commands import BaseCommand
+
+    while frame is not None:
+        command = frame.f_locals.get('command')
+        if isinstance(command, BaseCommand):
+            return command.name
+        frame = frame.f_back
+    return None
+
+
+class LoopMonitor:
+    """Samples the lag of an event loop and watches for it being held too long
+
+    Args:
+        loop (object) -- the event loop to monitor
+        stall_threshold (float) -- seconds the loop can be held for before
+                                   the watchdog logs the stack of the loop thread
+    """
+
+    def __init__(self, loop, stall_threshold=STALL_THRESHOLD):
+        self.loop = loop
+        self.stall_threshold = stall_threshold
+        self.samples = deque(maxlen=SAMPLE_HISTORY)  # Lag of each sample in seconds
+        self.stalls = 0  # The amount of times the loop was held past the threshold
+        self.__last_tick = time.monotonic()
+        self.__ticks = 0
+        self.__loop_thread_id = None
+        self.__watchdog = None
+
+    async def run(self):
+        """Samples the lag of the loop forever, must be run as a task on the loop"""
+        self.__loop_thread_id = threading.get_ident()
+        self.__watchdog = threading.Thread(target=self.__watch, daemon=True,
+                                           name='loop-watchdog')
+        self.__watchdog.start()
+
+        while True:
+            expected = time.monotonic() + SAMPLE_INTERVAL
+            await asyncio.sleep(SAMPLE_INTERVAL)
+            now = time.monotonic()
+            self.samples.append(max(0.0, now - expected))
+            self.__last_tick = now
+            self.__ticks += 1
+
+    def __watch(self):
+        """Runs on the watchdog thread, logging every time the loop is held
+        for longer than the stall threshold
+        """
+        reported_tick = None
+        while True:
+            time.sleep(self.stall_threshold / 4)
+            held_for = time.monotonic() - self.__last_tick - SAMPLE_INTERVAL
+            if held_for < self.stall_threshold or reported_tick == self.__ticks:
+                continue
+            # Only report each stall once
+            reported_tick = self.__ticks
+            self.stalls += 1
+            frame = sys._current_frames().get(self.__loop_thread_id)
+            if frame is None:
+                continue
+            logger.warning(
+                "Event loop held for %.2fs while running command %r:\n%s",
+                held_for, get_running_command(frame),
+                ''.join(traceback.format_stack(frame)))
+
+    def get_percentile(self, percent):
+        """Returns the lag (in seconds) that (percent)% of samples are under"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+    def get_histogram(self):
+        """Returns the amount of samples in each bucket of LAG_BUCKETS_MS as a
+        list of (upper bound in ms, count), with None as the last bound for
+        samples over the highest bucket
+        """
+        bounds = LAG_BUCKETS_MS + (None,)
+        counts = [0] * len(bounds)
+        for lag in self.samples:
+            lag_ms = lag * 1000
+            for index, bound in enumerate(LAG_BUCKETS_MS):
+                if lag_ms <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+        return list(zip(bounds, counts))
+
+    def get_report(self):
+        """Returns the lag histogram and statistics as a printable string"""
+        lines = ['Event loop lag over the last {} samples:'.format(len(self.samples))]
+        total = max(1, len(self.samples))
+        previous_bound = 0
+        for bound, count in self.get_histogram():
+            if bound is None:
+                label = '>{} ms'.format(previous_bound)
+            else:
+                label = '{}-{} ms'.format(previous_bound, bound)
+                previous_bound = bound
+            lines.append('{:>12} {:>6} {}'.format(
+                label, count, '#' * int(40 * count / total)))
+        lines.append('p50 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms, {} stalls over {:.1f}s'
+                     .format(self.get_percentile(50) * 1000,
+                             self.get_percentile(99) * 1000,
+                             max(self.samples, default=0.0) * 1000,
+                             self.stalls, self.stall_threshold))
+        return '\n'.join(lines)
+
+
+def start(loop, stall_threshold=STALL_THRESHOLD):
+    """Starts monitoring the event loop (loop)"""
+    global monitor
+    monitor = LoopMonitor(loop, stall_threshold)
+    loop.create_task(monitor.run())
+
+
+def get_report():
+    """Returns the report of the running monitor"""
+    if monitor is None:
+        return 'The event loop monitor is not running'
+    return monitor.get_report()
@@ -0,0 +1,140 @@
+""" Reports what the bot's memory is used by ($memory)
+
+The report has three parts:
+    a census of the live objects of the types most likely to leak (commands,
+    deques, dicts, ...) and of the most common types overall,
+    the sizes of the command registry and of the data of each data file,
+    the allocation sites that changed the most since the last report, from
+    tracemalloc snapshots
+Tracing is started by the first report (which has nothing to compare against
+yet) and costs memory and time on every allocation, so stop it once done.
+Building a report holds the event loop while every object is counted, which
+can take a moment with a large heap.
+"""
+import gc
+import sys
+import tracemalloc
+from collections import Counter
+
+# The types always counted in the census, by name
+CENSUS_TYPES = ('Command', 'CustomCommand', 'Job', 'deque', 'dict', 'list', 'function')
+TOP_TYPES = 10  # The amount of the most common types listed in the census
+TOP_SITES = 15  # The amount of allocation sites listed in the report
+TRACE_FRAMES = 1  # The frames of the stack tracemalloc keeps for each allocation
+# Allocations made by tracemalloc and the import system aren't the bot's
+IGNORED_FILES = (tracemalloc.__file__, '<frozen importlib._bootstrap>',
+                 '<frozen importlib._bootstrap_external>')
+
+
+def get_object_census():
+    """Returns the amount of live objects of each of CENSUS_TYPES, and the
+    TOP_TYPES most common types, each as a list of (type name, amount)
+    """
+    counts = Counter(type(obj).__name__ for obj in gc.get_objects())
+    return [(name, counts[name]) for name in CENSUS_TYPES], counts.most_common(TOP_TYPES)
+
+
+def get_deep_size(data):
+    """Returns the approximate size in bytes of JSON data (dicts, lists, strings
+    and numbers), including everything it contains
+    """
+    size = 0
+    seen = set()
+    pending = [data]
+    while pending:
+        item = pending.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            pending.extend(item.keys())
+            pending.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            pending.extend(item)
+    return size
+
+
+def get_data_file_sizes():
+    """Returns (name, top level keys, size in bytes) of each data file, the keys
+    and size are None if the file wasn't loaded yet (it isn't loaded to measure it)
+    """
+    from src.file import files
+
+    sizes = []
+    for name, data_file in files.get_files_by_name().items():
+        if data_file is None or not data_file.is_loaded():
+            sizes.append((name, None, None))
+        else:
+            data = data_file.get_data()
+            sizes.append((name, len(data), get_deep_size(data)))
+    return sizes
+
+
+class AllocationTracer:
+    """Takes tracemalloc snapshots, comparing each against the one before"""
+
+    def __init__(self):
+        self.__snapshot = None
+
+    def is_tracing(self):
+        return tracemalloc.is_tracing()
+
+    def take_snapshot(self):
+        """Takes a snapshot, starting tracing if it isn't yet
+
+        Returns the TOP_SITES allocation sites that changed the most since the
+        last snapshot (tracemalloc.StatisticDiff), None if this is the first
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+            self.__snapshot = None
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, file) for file in IGNORED_FILES])
+        previous, self.__snapshot = self.__snapshot, snapshot
+        if previous is None:
+            return None
+        return snapshot.compare_to(previous, 'lineno')[:TOP_SITES]
+
+    def stop(self):
+        """Stops tracing, freeing the traces and the last snapshot"""
+        self.__snapshot = None
+        tracemalloc.stop()
+
+
+# The allocation tracer of the bot
+tracer = AllocationTracer()
+
+
+def __format_size(size):
+    return '{:.1f}KB'.format(size / 1024)
+
+
+def get_report():
+    """Takes a snapshot and returns the memory report as a printable string"""
+    import src.user.commands as commands
+
+    lines = ['Objects:']
+    census, most_common = get_object_census()
+    lines.extend('  {:<16} {}'.format(name, amount) for name, amount in census)
+    lines.append('Most common objects:')
+    lines.extend('  {:<16} {}'.format(name, amount) for name, amount in most_common)
+
+    lines.append('Command registry:')
+    lines.extend('  {:<16} {}'.format(name, size)
+                 for name, size in commands.get_registry_sizes().items())
+    lines.append('Data files:')
+    for name, keys, size in get_data_file_sizes():
+        lines.append('  {:<16} {}'.format(name, 'not loaded' if keys is None else
+                                          '{} keys, {}'.format(keys, __format_size(size))))
+
+    differences = tracer.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    lines.append('Traced memory: {} (peak {})'.format(__format_size(current),
+                                                     __format_size(peak)))
+    if differences is None:
+        lines.append('Allocation tracing started, the next report compares against now')
+    else:
+        lines.append('Allocation sites that changed the most since the last report:')
+        lines.extend('  {}'.format(difference) for difference in differences)
+    return '\n'.join(lines)
@@ -0,0 +1,203 @@
+""" Loads and unloads plugins, packs of commands kept outside the default commands
+
+A plugin is a package in the plugins directory with a manifest.json declaring
+its commands, and a handler module with the functions of those commands:
+    src/plugins/numbers/manifest.json
+    {
+        "description": "Facts about numbers",
+        "module": "handlers",
+        "commands": [
+            {"name": "fact", "desc": "Gets random number facts",
+             "type": "Standard", "permission": "default",
+             "function": "random_fact", "usage": "fact", "aliases": []}
+        ]
+    }
+Only the manifest is read when a plugin is loaded, the handler module (and
+everything it imports) is imported the first time one of its commands is run.
+The plugins loaded at startup are saved in the properties file under 'plugins',
+and plugins loaded or unloaded with $plugin are saved there too.
+"""
+import importlib
+import json
+import logging
+import os
+import re
+import sys
+from src.user.commands import Command, CommandType
+import src.user.commands as commands
+import src.user.permissions as permissions
+from src.file import files
+
+# The directory of the plugins, and the package they are imported from
+PLUGINS_DIRECTORY = os.path.join(os.path.dirname(__file__), 'plugins')
+PLUGINS_PACKAGE = 'src.plugins'
+DEFAULT_PLUGINS = ('numbers',)  # The plugins loaded when none were saved yet
+__plugin_name_regex = re.compile(r'\w+')
+
+# The loaded plugins by name
+__plugins = {}
+
+logger = logging.getLogger(__name__)
+
+
+class PluginError(Exception):
+    """An error when a plugin can't be loaded or unloaded"""
+
+    def __init__(self, arg):
+        self.strerror = arg
+        self.args = {arg}
+
+
+class LazyHandler:
+    """Stands in for the function of a plugin's command, importing the handler
+    module the first time the command is run
+
+    Args:
+        module_name (str) -- the name of the handler module, ex. 'src.plugins.numbers.handlers'
+        function_name (str) -- the name of the command's function in the module
+    """
+    __slots__ = ('module_name', 'function_name', 'function')
+
+    def __init__(self, module_name, function_name):
+        self.module_name = module_name
+        self.function_name = function_name
+        self.function = None  # The command's function, once imported
+
+    async def __call__(self, cmd_args):
+        if self.function is None:
+            module = importlib.import_module(self.module_name)
+            try:
+                self.function = getattr(module, self.function_name)
+            except AttributeError:
+                raise PluginError('{} has no command function {}'.format(
+                    self.module_name, self.function_name))
+        await self.function(cmd_args)
+
+
+class Plugin:
+    """A loaded plugin
+
+    Args:
+        name (str) -- the name of the plugin (its package)
+        description (str) -- what the plugin does
+        module_name (str) -- the name of its handler module
+        commands (list) -- its commands, in the command list while it's loaded
+    """
+
+    def __init__(self, name, description, module_name, commands):
+        self.name = name
+        self.description = description
+        self.module_name = module_name
+        self.commands = commands
+
+
+def get_available_plugins():
+    """Returns the names of the plugins in the plugins directory, sorted"""
+    try:
+        entries = os.listdir(PLUGINS_DIRECTORY)
+    except FileNotFoundError:
+        return []
+    return sorted(entry for entry in entries
+                  if os.path.isfile(os.path.join(PLUGINS_DIRECTORY, entry, 'manifest.json')))
+
+
+def get_loaded_plugins():
+    """Returns the loaded plugins by name"""
+    return __plugins
+
+
+def read_manifest(name):
+    """Reads the manifest of the plugin (name)
+
+    Returns the Plugin, with its commands created but not added to the command list
+    Raises PluginError if there is no such plugin, or its manifest is not valid
+    """
+    if __plugin_name_regex.fullmatch(name) is None:
+        raise PluginError('\'{}\' is not a plugin name'.format(name))
+    try:
+        with open(os.path.join(PLUGINS_DIRECTORY, name, 'manifest.json')) as manifest_file:
+            manifest = json.load(manifest_file)
+    except FileNotFoundError:
+        raise PluginError('There is no plugin named {}'.format(name))
+    except json.JSONDecodeError as ex:
+        raise PluginError('The manifest of {} is not valid JSON: {}'.format(name, ex))
+
+    module_name = '{}.{}.{}'.format(PLUGINS_PACKAGE, name, manifest.get('module', 'handlers'))
+    plugin_commands = []
+    for command_data in manifest.get('commands', ()):
+        try:
+            plugin_commands.append(Command(
+                command_data['name'],
+                command_data.get('desc', 'No description provided'),
+                CommandType(command_data.get('type', CommandType.STANDARD.value)),
+                permissions.get_permission_of_label(command_data.get('permission', 'default')),
+                LazyHandler(module_name, command_data['function']),
+                command_data.get('usage'),
+                command_data.get('aliases', ()),
+                command_data.get('cache_ttl')))
+        except (KeyError, ValueError, TypeError, commands.ImproperNameError) as ex:
+            raise PluginError('A command in the manifest of {} is not valid: {!r}'.format(
+                name, ex))
+    return Plugin(name, manifest.get('description', ''), module_name, plugin_commands)
+
+
+def load_plugin(name, save=True):
+    """Loads the plugin (name), adding its commands to the command list
+
+    Args:
+        name (str) -- the name of the plugin
+        save (bool) -- if True, the plugin is saved to be loaded at startup
+    Raises PluginError if it can't be loaded, ex. a command's name is already
+        in use, in which case none of its commands are added
+    """
+    if name in __plugins:
+        raise PluginError('{} is already loaded'.format(name))
+    plugin = read_manifest(name)
+    added = []
+    for command in plugin.commands:
+        if not commands.add_command(command):
+            for added_command in added:
+                commands.remove_command(added_command)
+            raise PluginError('The command {} of {} is already in use'.format(
+                command.name, name))
+        added.append(command)
+    __plugins[name] = plugin
+    if save:
+        __save_loaded_plugins()
+
+
+def unload_plugin(name, save=True):
+    """Unloads the plugin (name), removing its commands from the command list
+    and its modules, so loading it again imports its handlers again
+
+    Args:
+        name (str) -- the name of the plugin
+        save (bool) -- if True, the plugin is saved to not be loaded at startup
+    Raises PluginError if the plugin isn't loaded
+    """
+    plugin = __plugins.pop(name, None)
+    if plugin is None:
+        raise PluginError('{} is not loaded'.format(name))
+    for command in plugin.commands:
+        commands.remove_command(command)
+    package = '{}.{}'.format(PLUGINS_PACKAGE, name)
+    for module_name in [module_name for module_name in sys.modules
+                        if module_name == package or module_name.startswith(package + '.')]:
+        del sys.modules[module_name]
+    if save:
+        __save_loaded_plugins()
+
+
+def __save_loaded_plugins():
+    files.properties_file.set('plugins', sorted(__plugins))
+
+
+def load_saved_plugins():
+    """Loads the plugins saved in the properties file (DEFAULT_PLUGINS if none
+    were saved yet), a plugin that fails to load is reported and skipped
+    """
+    for name in files.properties_file.get_data().get('plugins', DEFAULT_PLUGINS):
+        try:
+            load_plugin(name, save=False)
+        except PluginError as ex:
+            logger.warning('Failed to load the plugin %s: %s', name, ex.strerror)
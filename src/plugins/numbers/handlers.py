@@ -0,0 +1,20 @@
+""" The functions of the commands of the numbers plugin, see manifest.json
+Imported the first time one of its commands is run
+"""
+import html
+import urllib.request
+from src.command_functions import CommandArgs, reply_simple_cmd_args
+
+
+async def random_fact(cmd_args: CommandArgs):
+    """Gets a random fact about a number
+
+    To get the random facts, I used numbersapi.com which makes it easy
+    to request a random fact, as it responds in plain text the random fact.
+    """
+    response = urllib.request.urlopen('http://numbersapi.com/random')
+    response_as_text = str(response.read())
+    response_as_text = response_as_text[2:-1]  # Remove extra characters
+    fact = html.unescape(response_as_text)
+
+    await reply_simple_cmd_args(cmd_args, fact)
@@ -0,0 +1,321 @@
+""" Functions and classes for purging (bulk deleting) messages from a channel
+
+A purge streams the channel's message history in pages, picks out the messages
+that match its filter and deletes them in bulk delete batches. Progress is
+reported by editing a single status message, and a running purge can be
+cancelled with cancel_purge().
+
+Example:
+    job = PurgeJob(client, channel, 2000, PurgeFilter(author_id='229628971736654096'))
+    deleted = await job.run()
+"""
+import asyncio
+import datetime
+import discord.errors
+
+HISTORY_PAGE_SIZE = 100  # The amount of messages requested per page of history
+BULK_DELETE_MAX = 100  # The most messages discord allows in a single bulk delete
+# Discord refuses to bulk delete messages older than this, they are
+# deleted one at a time instead
+BULK_DELETE_MAX_AGE = datetime.timedelta(days=14)
+PROGRESS_INTERVAL = 2.0  # Minimum seconds between edits of the status message
+# The most messages of history a filtered purge will look through
+# for every message it is allowed to delete
+SCAN_LIMIT_FACTOR = 10
+
+# The purges that are currently running, by the id of their channel
+__active_purges = {}
+
+
+class PurgeFilter:
+    """Decides which messages in the channel history get purged
+
+    Args:
+        author_id (str) -- only purge messages sent by this user, None for anyone
+        pattern (str) -- only purge messages whose content matches this
+                         regular expression, None for any content
+        newer_than (datetime.timedelta) -- only purge messages sent within this
+                         amount of time, None for any age
+    Raises re.error if the pattern is not a valid regular expression
+    """
+
+    def __init__(self, author_id=None, pattern=None, newer_than=None):
+        import re
+
+        self.author_id = author_id
+        self.pattern = None if pattern is None else re.compile(pattern)
+        self.cutoff = None
+        if newer_than is not None:
+            self.cutoff = datetime.datetime.utcnow() - newer_than
+
+    def is_filtering(self):
+        """Returns True if this filter rejects any messages"""
+        return self.author_id is not None or self.pattern is not None \
+            or self.cutoff is not None
+
+    def matches(self, message):
+        """Returns True if the message should be purged"""
+        if self.author_id is not None and message.author.id != self.author_id:
+            return False
+        if self.pattern is not None and self.pattern.search(message.content) is None:
+            return False
+        if self.cutoff is not None and message.timestamp < self.cutoff:
+            return False
+        return True
+
+    def is_past_cutoff(self, message):
+        """Returns True if the message, and all of the history before it,
+        is too old to be purged
+        """
+        return self.cutoff is not None and message.timestamp < self.cutoff
+
+
+class AdaptivePacer:
+    """Paces the requests made by a purge so it stays under discord's rate limits
+
+    The delay between requests is doubled whenever discord rate limits us (or a
+    request was slowed down by a rate limit within discord.py) and slowly reduced
+    again while requests are going through quickly.
+    """
+    MIN_DELAY = 0.0
+    MAX_DELAY = 10.0
+    BASE_DELAY = 0.25  # The delay to start backing off from
+    SLOW_REQUEST = 2.0  # A request taking this many seconds was likely rate limited
+    RECOVERY_RATE = 0.75  # The delay is multiplied by this after each fast request
+
+    def __init__(self):
+        self.delay = AdaptivePacer.MIN_DELAY
+        self.__retry_after = 0.0
+
+    async def wait(self):
+        """Waits before the next request can be made"""
+        delay = max(self.delay, self.__retry_after)
+        self.__retry_after = 0.0
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def succeeded(self, elapsed):
+        """Records that a request went through, taking (elapsed) seconds"""
+        if elapsed >= AdaptivePacer.SLOW_REQUEST:
+            self.__back_off()
+        else:
+            self.delay = max(AdaptivePacer.MIN_DELAY,
+                             self.delay * AdaptivePacer.RECOVERY_RATE)
+
+    def rate_limited(self, retry_after):
+        """Records that a request was rate limited, and must not
+        be retried for (retry_after) seconds
+        """
+        self.__back_off()
+        self.__retry_after = min(AdaptivePacer.MAX_DELAY, retry_after)
+
+    def __back_off(self):
+        self.delay = min(AdaptivePacer.MAX_DELAY,
+                         max(self.delay * 2, AdaptivePacer.BASE_DELAY))
+
+
+def get_retry_after(response):
+    """Returns the seconds to wait before retrying a rate limited request,
+    read from the rate limit headers of its response
+    """
+    retry_after = 0.0
+    headers = getattr(response, 'headers', None) or {}
+    for header in ('Retry-After', 'X-RateLimit-Reset-After'):
+        try:
+            retry_after = max(retry_after, float(headers[header]))
+        except (KeyError, TypeError, ValueError):
+            pass
+    return retry_after if retry_after > 0 else AdaptivePacer.BASE_DELAY
+
+
+class PurgeJob:
+    """A purge of up to (limit) messages matching (message_filter) from a channel
+
+    Args:
+        client (object) -- the client of the discord bot
+        channel (object) -- the channel to purge messages from
+        limit (int) -- the most messages to delete
+        message_filter (PurgeFilter) -- decides which messages get deleted,
+                                        every message is deleted by default
+        command_message (object) -- the message that started the purge, it is
+                                    deleted along with the purged messages and
+                                    history is read from before it
+    """
+
+    def __init__(self, client, channel, limit, message_filter=None,
+                 command_message=None):
+        self.client = client
+        self.channel = channel
+        self.limit = limit
+        self.message_filter = PurgeFilter() if message_filter is None else message_filter
+        self.command_message = command_message
+        self.deleted = 0  # The amount of messages deleted so far
+        self.scanned = 0  # The amount of messages of history read so far
+        self.cancelled = False
+        self.status_message = None
+        self.__pacer = AdaptivePacer()
+        self.__last_progress = 0.0
+
+    def cancel(self):
+        """Stops the purge before its next request"""
+        self.cancelled = True
+
+    def get_scan_limit(self):
+        """Returns the most messages of history this purge will read"""
+        if self.message_filter.is_filtering():
+            return self.limit * SCAN_LIMIT_FACTOR
+        return self.limit
+
+    async def run(self):
+        """Runs the purge until (limit) messages are deleted, the history
+        runs out or the purge is cancelled
+
+        Returns the amount of messages deleted
+        Raises discord.errors.Forbidden if the bot can't delete messages here
+        """
+        self.status_message = await self.client.send_message(
+            self.channel, 'Purging messages ...')
+        pending = []
+        if self.command_message is not None:
+            pending.append(self.command_message)
+        matched = 0
+
+        async for message in self.__stream_history():
+            if self.cancelled or matched >= self.limit:
+                break
+            if message.id == self.status_message.id:
+                continue
+            if not self.message_filter.matches(message):
+                continue
+            pending.append(message)
+            matched += 1
+            if len(pending) >= BULK_DELETE_MAX:
+                await self.__delete(pending)
+                pending = []
+                await self.__report_progress()
+
+        if pending and not self.cancelled:
+            await self.__delete(pending)
+        await self.__report_progress(True)
+        return self.deleted
+
+    async def __stream_history(self):
+        """Yields the channel's messages, newest first, a page at a time"""
+        before = self.command_message
+        scan_limit = self.get_scan_limit()
+
+        while self.scanned < scan_limit and not self.cancelled:
+            page = []
+            page_size = min(HISTORY_PAGE_SIZE, scan_limit - self.scanned)
+            await self.__pacer.wait()
+            async for message in self.client.logs_from(
+                    self.channel, limit=page_size, before=before):
+                page.append(message)
+            if not page:
+                return
+            self.scanned += len(page)
+            for message in page:
+                if self.message_filter.is_past_cutoff(message):
+                    return
+                yield message
+            before = page[-1]
+
+    async def __delete(self, messages):
+        """Deletes the messages, in a single bulk delete where discord allows it"""
+        bulk_cutoff = datetime.datetime.utcnow() - BULK_DELETE_MAX_AGE
+        bulk = [m for m in messages if m.timestamp >= bulk_cutoff]
+        single = [m for m in messages if m.timestamp < bulk_cutoff]
+        # Discord only allows bulk deleting 2 or more messages
+        if len(bulk) == 1:
+            single.extend(bulk)
+            bulk = []
+
+        if bulk:
+            await self.__call_paced(self.client.delete_messages, bulk)
+            self.__count_deleted(bulk)
+        for message in single:
+            if self.cancelled:
+                return
+            try:
+                await self.__call_paced(self.client.delete_message, message)
+            except discord.errors.NotFound:
+                pass  # Already deleted
+            self.__count_deleted((message,))
+            await self.__report_progress()
+
+    def __count_deleted(self, messages):
+        """Adds the messages to the deleted count, not counting the
+        message that started the purge
+        """
+        for message in messages:
+            if message is not self.command_message:
+                self.deleted += 1
+
+    async def __call_paced(self, function, *args):
+        """Calls the client function once the pacer allows,
+        retrying it if discord rate limits the request
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            await self.__pacer.wait()
+            start = loop.time()
+            try:
+                result = await function(*args)
+            except discord.errors.HTTPException as ex:
+                if getattr(ex.response, 'status', None) != 429:
+                    raise
+                self.__pacer.rate_limited(get_retry_after(ex.response))
+                continue
+            self.__pacer.succeeded(loop.time() - start)
+            return result
+
+    async def __report_progress(self, finished=False):
+        """Edits the status message with the progress of the purge,
+        at most once every PROGRESS_INTERVAL seconds unless (finished)
+        """
+        now = asyncio.get_event_loop().time()
+        if not finished and now - self.__last_progress < PROGRESS_INTERVAL:
+            return
+        self.__last_progress = now
+
+        if finished and self.cancelled:
+            status = 'Purge cancelled, removed {} messages'.format(self.deleted)
+        elif finished:
+            status = 'Removed {} messages'.format(self.deleted)
+        else:
+            status = 'Purging messages ... removed {} of up to {} ({} scanned)'\
+                .format(self.deleted, self.limit, self.scanned)
+        try:
+            self.status_message = await self.client.edit_message(
+                self.status_message, status)
+        except discord.errors.HTTPException:
+            pass  # Progress is best effort, the purge itself carries on
+
+
+async def run_purge(job):
+    """Runs the purge job, registering it so it can be cancelled
+
+    Returns the amount of messages deleted, or None if a purge is
+    already running in the job's channel
+    """
+    channel_id = job.channel.id
+    if channel_id in __active_purges:
+        return None
+    __active_purges[channel_id] = job
+    try:
+        return await job.run()
+    finally:
+        del __active_purges[channel_id]
+
+
+def cancel_purge(channel_id):
+    """Cancels the purge running in the channel
+
+    Returns True if a purge was cancelled
+    Returns False if no purge is running in that channel
+    """
+    job = __active_purges.get(channel_id)
+    if job is None:
+        return False
+    job.cancel()
+    return True
@@ -0,0 +1,98 @@
+""" Caches the replies of commands whose output only depends on their arguments
+
+A command opts in by being created with a cache_ttl (see commands.Command), ex.
+the help command. The replies sent the first time the command is run are saved
+for cache_ttl seconds, and sent again for the same arguments without running
+the command's function. Entries are keyed by the command, its normalized match
+result, the permission level and the user, and the least recently used entry is
+evicted once the cache holds MAX_ENTRIES.
+
+The whole cache is invalidated whenever the command list or a user's
+permission changes, as either can change the output of any cached command.
+"""
+import time
+from collections import OrderedDict
+
+MAX_ENTRIES = 1024  # The most replies kept before the least recently used are evicted
+
+
+def normalize_match_result(match_result):
+    """Returns the match result as a hashable key, or None if it can't be one"""
+    if isinstance(match_result, (list, tuple)):
+        normalized = []
+        for result in match_result:
+            result = normalize_match_result(result)
+            if result is None:
+                return None
+            normalized.append(result)
+        return tuple(normalized)
+    if isinstance(match_result, str):
+        return match_result.strip()
+    if match_result is None or isinstance(match_result, (int, float)):
+        return match_result
+    return None
+
+
+class ResponseCache:
+    """A least recently used cache of command replies that expire
+
+    Args:
+        max_entries (int) -- the most entries kept before the least recently used are evicted
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.__entries = OrderedDict()  # (expiry time, replies) by key
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, key):
+        """Returns the replies saved for the key, or None if there
+        are none or they have expired
+        """
+        entry = self.__entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self.__entries[key]
+            self.misses += 1
+            return None
+        self.__entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, replies, ttl):
+        """Saves the replies (tuple of str) for the key for (ttl) seconds"""
+        self.__entries[key] = (time.monotonic() + ttl, replies)
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.max_entries:
+            self.__entries.popitem(last=False)
+
+    def clear(self):
+        """Removes every entry"""
+        self.__entries.clear()
+
+
+# The cache of every command's replies
+cache = ResponseCache()
+
+
+def get_key(command, cmd_args):
+    """Returns the cache key of running the command with the CommandArgs,
+    or None if its replies can't be cached
+    """
+    match_result = normalize_match_result(cmd_args.match_result)
+    if match_result is None and cmd_args.match_result is not None:
+        return None
+    # Replies can mention the user (ex. help), so each user has their own entries
+    user_id = None if cmd_args.is_from_console else cmd_args.message.author.id
+    return (command.name, match_result, cmd_args.as_permission, user_id)
+
+
+def invalidate():
+    """Removes every saved reply, must be called after changing the command
+    list or the permission of a user
+    """
+    cache.clear()
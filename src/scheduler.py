@@ -0,0 +1,249 @@
+""" Runs commands at a future time, once or repeating ($remind and $every)
+
+Every pending job is kept in a single heap ordered by when it is due, with one
+timer on the event loop for the earliest job, so adding a job is O(log n) and
+waiting costs the same no matter how many jobs are pending. Jobs are saved in
+the schedules file and restored at startup:
+    {
+        '<job id>': {'due': 1530000000.0, 'interval': 3600, 'channel': '<channel id>',
+                     'author': '<user id>', 'command': '$8ball', 'reminder': false}
+    }
+A job's command is run as if its author sent it in its channel (through
+run_command), or for reminders, the command text is sent back to the author.
+Jobs without a channel were scheduled from the console and run there.
+"""
+import asyncio
+import heapq
+import logging
+import time
+import uuid
+from src.file import files
+
+MIN_INTERVAL = 60  # The fewest seconds between the runs of a repeating job
+MAX_JOBS_PER_USER = 25  # The most pending jobs a user (other than the console) can have
+# The most jobs started at once, the rest are started on the next pass of the
+# loop so a backlog of due jobs (ex. after downtime) doesn't hold the loop
+MAX_JOBS_PER_TICK = 500
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """A command to run at a time (due), and every (interval) seconds after if set
+
+    Args:
+        due (float) -- when the job is due, in seconds since the epoch
+        command (str) -- the command to run (with its prefix), or the reminder's text
+        channel_id (str) -- the channel to run the command in, None for the console
+        author_id (str) -- the user that scheduled the job, None for the console
+        interval (float) -- seconds between each run, None to only run once
+        reminder (bool) -- if True, the command is sent to the author as a reminder
+                           rather than run
+        job_id (str) -- the id of the job, a new id by default
+    """
+    __slots__ = ('id', 'due', 'command', 'channel_id', 'author_id', 'interval', 'reminder')
+
+    def __init__(self, due, command, channel_id=None, author_id=None,
+                 interval=None, reminder=False, job_id=None):
+        self.id = uuid.uuid4().hex[:12] if job_id is None else job_id
+        self.due = due
+        self.command = command
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.interval = interval
+        self.reminder = reminder
+
+    def to_data(self):
+        """Returns the data saved in the schedules file for this job"""
+        return {'due': self.due, 'interval': self.interval, 'channel': self.channel_id,
+                'author': self.author_id, 'command': self.command,
+                'reminder': self.reminder}
+
+    @staticmethod
+    def from_data(job_id, data):
+        """Returns the job from its id and data in the schedules file"""
+        return Job(data['due'], data['command'], data.get('channel'), data.get('author'),
+                   data.get('interval'), data.get('reminder', False), job_id)
+
+    def get_description(self):
+        """Returns the job as a printable string"""
+        return '{} {} {}{}'.format(
+            self.id, 'reminder' if self.reminder else 'command', self.command,
+            '' if self.interval is None
+            else ' (every {:g} minutes)'.format(self.interval / 60))
+
+
+class Scheduler:
+    """Runs jobs when they are due
+
+    Args:
+        run_job (function) -- the coroutine function that runs a job, called as
+                              run_job(job). Returns False if the job can no longer
+                              run (ex. its channel was deleted), cancelling it
+        is_owned (function) -- returns True if this process should run the job,
+                               ex. only the shard with the job's channel
+        loop (object) -- the event loop
+    """
+
+    def __init__(self, run_job, is_owned=lambda job: True, loop=None):
+        self.__run_job = run_job
+        self.__is_owned = is_owned
+        self.__loop = asyncio.get_event_loop() if loop is None else loop
+        self.__jobs = {}  # The pending jobs by id
+        # (due, id) of every pending job, the earliest first. Cancelled jobs are
+        # left in the heap and skipped once they reach the top
+        self.__heap = []
+        self.__timer = None  # The timer of the earliest job
+        self.__timer_due = None
+        self.__stopped = False
+
+    def __len__(self):
+        return len(self.__jobs)
+
+    def get_jobs(self, channel_id=None, author_id=None):
+        """Returns the pending jobs, only those of the channel (id)
+        or author (id) if given, the earliest first
+        """
+        return sorted((job for job in self.__jobs.values()
+                       if (channel_id is None or job.channel_id == channel_id)
+                       and (author_id is None or job.author_id == author_id)),
+                      key=lambda job: job.due)
+
+    def get_job(self, job_id):
+        """Returns the pending job (id), or None if there isn't one"""
+        return self.__jobs.get(job_id)
+
+    def restore(self):
+        """Schedules the jobs saved in the schedules file that this process owns"""
+        for job_id, data in files.schedules_file.get_data().items():
+            job = Job.from_data(job_id, data)
+            if self.__is_owned(job):
+                self.__jobs[job.id] = job
+                self.__heap.append((job.due, job.id))
+        heapq.heapify(self.__heap)
+        self.__arm()
+
+    def add(self, job):
+        """Schedules the job and saves it"""
+        files.schedules_file.set(job.id, job.to_data())
+        self.__push(job)
+
+    def __push(self, job):
+        self.__jobs[job.id] = job
+        heapq.heappush(self.__heap, (job.due, job.id))
+        if self.__timer_due is None or job.due < self.__timer_due:
+            self.__arm()
+
+    def cancel(self, job_id):
+        """Cancels the job (id) and removes it from the schedules file
+
+        Returns True if successful, False if there is no such job
+        """
+        job = self.__jobs.pop(job_id, None)
+        files.schedules_file.delete(job_id)
+        return job is not None
+
+    def stop(self):
+        """Stops running jobs, they stay saved to run once the bot starts again"""
+        self.__stopped = True
+        if self.__timer is not None:
+            self.__timer.cancel()
+        self.__timer = None
+        self.__timer_due = None
+
+    def apply_changes(self, changed, deleted):
+        """Applies changes to the schedules file made by another process"""
+        for job_id in deleted:
+            self.__jobs.pop(job_id, None)
+        for job_id, data in changed.items():
+            job = Job.from_data(job_id, data)
+            if job_id not in self.__jobs and self.__is_owned(job):
+                self.__push(job)
+
+    def __arm(self):
+        """Sets the timer for the earliest pending job"""
+        while self.__heap and self.__heap[0][1] not in self.__jobs:
+            heapq.heappop(self.__heap)
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+            self.__timer_due = None
+        if not self.__heap or self.__stopped:
+            return
+        self.__timer_due = self.__heap[0][0]
+        self.__timer = self.__loop.call_later(
+            max(0.0, self.__timer_due - time.time()), self.__fire)
+
+    def __fire(self):
+        """Starts every job that is due"""
+        self.__timer = None
+        self.__timer_due = None
+        if self.__stopped:
+            return
+        now = time.time()
+        started = 0
+        while self.__heap and self.__heap[0][0] <= now and started < MAX_JOBS_PER_TICK:
+            due, job_id = heapq.heappop(self.__heap)
+            job = self.__jobs.get(job_id)
+            if job is None or job.due != due:
+                continue  # Cancelled, or rescheduled
+            started += 1
+            if job.interval is None:
+                self.cancel(job_id)
+            else:
+                # Skip the runs missed while the bot was offline
+                missed = max(0, int((now - job.due) // job.interval))
+                job.due += (missed + 1) * job.interval
+                self.add(job)
+            self.__loop.create_task(self.__run(job))
+        if started == MAX_JOBS_PER_TICK:
+            if self.__timer is not None:
+                # Armed by add() while rescheduling a repeating job
+                self.__timer.cancel()
+            self.__timer_due = now
+            self.__timer = self.__loop.call_soon(self.__fire)
+        else:
+            self.__arm()
+
+    async def __run(self, job):
+        try:
+            if await self.__run_job(job) is False:
+                self.cancel(job.id)
+        except Exception:  # pylint: disable=broad-except
+            # A failing job must not stop the other jobs
+            logger.exception("Scheduled job %s failed", job.id)
+
+
+class ScheduledMessage:
+    """Stands in for the discord message a scheduled command is run from
+
+    Args:
+        author (object) -- the member that scheduled the command
+        channel (object) -- the channel to run the command in
+        content (str) -- the command
+    """
+    # Command functions check this to not treat the message as one sent in discord,
+    # ex. a purge doesn't try to delete it
+    is_scheduled = True
+
+    def __init__(self, author, channel, content):
+        self.id = None
+        self.author = author
+        self.channel = channel
+        self.server = getattr(channel, 'server', None)
+        self.content = content
+
+
+# The scheduler of the bot, None until start() is called
+scheduler = None
+
+
+def start(run_job, is_owned=lambda job: True, loop=None):
+    """Starts the scheduler, restoring the saved jobs, see Scheduler for the arguments"""
+    import src.file_functions as file_functions
+    global scheduler
+    scheduler = Scheduler(run_job, is_owned, loop)
+    scheduler.restore()
+    # Pick up the jobs scheduled by other processes (ex. other shards)
+    files.schedules_file.add_change_listener(
+        file_functions.call_on_event_loop(scheduler.apply_changes))
@@ -1,23 +1,62 @@
 """Scripty-Bot is a simple bot for Discord that does what you need it to
+
+Usage:
+    python3 scripty.py [--profile-startup] [--admin-socket] [--batch <file>]
+                       [--command-table] [--random-seed <n>] [--record-trace <file>]
+                       [--log-level <levels>] [--log-sample <rates>] [--log-json]
+
+    --profile-startup  prints how long each import and phase of startup took
+    --admin-socket     accepts console commands through a unix socket,
+                       see admin_console.py
+    --batch <file>     runs the console commands in the file once the bot is ready,
+                       see batch.py
+    --command-table    looks up custom commands in a memory-mapped table instead of
+                       loading the commands file at startup, see file/command_table.py
+    --random-seed <n>  seeds the random, choose and 8ball commands so their
+                       results are reproducible, see random_pool.py
+    --record-trace <file>  appends every message received to the trace file, to
+                       replay offline with soak/harness.py
+    --log-level <levels>   the log level overall and per module,
+                       ex. INFO,discord=WARNING,src.scripty=DEBUG (see log_pipeline.py)
+    --log-sample <rates>   keeps one in every n debug logs of the modules,
+                       ex. discord.gateway=100
+    --log-json         writes logs as JSON lines
 """
+import time
+STARTUP_TIME = time.perf_counter()  # Used to profile startup with --profile-startup
 import os.path
 # Support for modification in file path
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-import discord
-import aioconsole
-import logging
-from src.file import files
+from src.startup_profiler import StartupProfiler
+import src
 import src.user.permissions as permissions
 import src.user.commands as commands
 import src.file_functions as file_functions
 import src.command_functions as command_func
+import src.log_pipeline as log_pipeline
+import src.loop_monitor as loop_monitor
+import src.random_pool as random_pool
+import src.scheduler as scheduler
+import src.usage_stats as usage_stats
+import src.shutdown as shutdown
+from src.admin_console import AdminConsole, has_terminal
+from src.file import files
 from src import C_PREFIX
+profiler = StartupProfiler(STARTUP_TIME)
+profiler.mark('import src (commands and command functions)')
 
-# Initialization stuff
-client = discord.Client()
-TOKEN = files.properties_file.get_data()['token']  # the token for the bot
+import discord
+import logging
+profiler.mark('import discord')
+
+client = None  # The discord client, created at startup by main()
+TOKEN = None  # the token for the bot
+admin_console = None  # The console for the host, started once the bot is ready
+trace_recorder = None  # Records the messages received with --record-trace
+# Named explicitly, as this module is run as __main__
+logger = logging.getLogger('src.scripty')
 
 
 def extract_message_data(message, FROM_CONSOLE=False):
@@ -32,8 +71,7 @@ def extract_message_data(message, FROM_CONSOLE=False):
         permission_level = permissions.PermissionLevel.SUPERUSER
         message_string = message
     else:
-        permission_level = file_functions.get_user_permission_level(
-            message.author.id)
+        permission_level = file_functions.get_message_permission_level(message)
         message_string = message.content
 
     # It is considered a command if the message string begins with the prefix
@@ -51,49 +89,59 @@ async def run_command(message, FROM_CONSOLE=False):
        However, if its not (ex. message sent through the client), then the
        message string is stored in message.content. This is done to simplify message
        checks
+
+       Returns True if a command was run, False otherwise
     '''
 
+    # Ignore every message once the bot is shutting down
+    if shutdown.coordinator.stopping:
+        return False
     # Ignore messages written by the bot (itself) to prevent spamming
     if not FROM_CONSOLE:
         if message.author.id == client.user.id:
-            return
+            return False
 
     # Extract message data
     message_string, permission_level, is_command = extract_message_data(message, FROM_CONSOLE)
 
     if not is_command:
-        return
+        return False
 
     ############################## Default Commands ##########################
-    # Loop through all of the commands in the commands list
-    for command in commands.get_commands_as_list():
+    # Loop through the commands that could match, found through the
+    # dispatch table using the first word of the message
+    denied_command = None  # The first command that matched but was denied
+    for command in commands.get_candidate_commands(message_string):
         # Check if the message typed matches a commands arguments and
         # the users minimum permissions required to use it
-        try:
-            match_result = command.matches(message_string, permission_level)
-            if match_result is not None and command.function is not None:
-                cmd_args = command_func.CommandArgs(
-                    client, message, match_result, permission_level, FROM_CONSOLE
-                )
-                await command.function(cmd_args)
-                return
-        except permissions.PermissionDeniedError as e:
-            await command_func.reply_simple(client, e.strerror,
-                                            None if FROM_CONSOLE else message.channel)
-
-'''This is the console that allows the owner who is running the server to always have permission
-as a superuser.
-'''
-async def console():
-    while True:
-        text = await aioconsole.ainput('$ ')
-        command = '$' + text.strip()
-        if command == '$':
-            continue
-        await run_command(command, FROM_CONSOLE=True)
+        match_result = command.matches(message_string, permission_level)
+        if match_result is commands.PERMISSION_DENIED:
+            if denied_command is None:
+                denied_command = command
+        elif match_result is not None and command.function is not None:
+            cmd_args = command_func.CommandArgs(
+                client, message, match_result, permission_level, FROM_CONSOLE
+            )
+            if not FROM_CONSOLE and usage_stats.usage_stats is not None:
+                usage_stats.usage_stats.record(
+                    usage_stats.DIRECT_MESSAGES if message.server is None else message.server.id,
+                    command.name)
+            start = time.perf_counter()
+            with shutdown.coordinator.track():
+                await command_func.run_command_function(command, cmd_args)
+            if logger.isEnabledFor(logging.DEBUG):
+                latency_ms = (time.perf_counter() - start) * 1000
+                logger.debug('Ran %s in %.2fms', command.name, latency_ms,
+                             extra={'command': command.name, 'latency_ms': latency_ms})
+            return True
 
+    if denied_command is not None and (FROM_CONSOLE or permissions.denial_limiter.should_reply(
+            message.author.id, denied_command.name)):
+        with shutdown.coordinator.track():
+            await command_func.reply_simple(client, 'Permission denied',
+                                            None if FROM_CONSOLE else message.channel)
+    return False
 
-@client.event
 async def on_ready():
     print('Logged in as')
     print(client.user.name)
@@ -103,41 +151,186 @@ async def on_ready():
           "https://discordapp.com/oauth2/authorize?client_id={}&scope=bot&permissions=43008"
           .format(client.user.id))
     # Update token
-    p_json = files.properties_file.get_data()
-    p_json['token'] = TOKEN
-    files.properties_file.set_data(p_json)
-    # Make user add self as a superuser
-    if len(files.users_file.get_data()['superusers']) == 0:
-        first_superuser = input(
-            "Add yourself as a superuser (input user id): "
-        )
-        users = files.users_file.get_data()
-        users['superusers'].append(first_superuser)
+    files.properties_file.set('token', TOKEN)
+    # Run the scheduled commands, on_ready is run again after reconnecting
+    if scheduler.scheduler is None:
+        scheduler.start(run_scheduled_job, is_scheduled_job_owned, client.loop)
+    if usage_stats.usage_stats is None:
+        usage_stats.start(client.loop)
+    # Only the first shard has the console
+    if files.shard_link is not None and files.shard_link.shard_id != 0:
+        return
     # Enable console to run for host to type commands through while bot is
-    # running
-    await console()
+    # running. on_ready is run again after reconnecting, so only start it once
+    global admin_console
+    if admin_console is not None:
+        return
+    admin_console = AdminConsole(run_command)
+    if '--admin-socket' in sys.argv:
+        await admin_console.serve()
+    if '--batch' in sys.argv:
+        # Run the batch file given after --batch
+        await admin_console.source(sys.argv[sys.argv.index('--batch') + 1])
+    if has_terminal():
+        client.loop.create_task(admin_console.run_terminal())
+    elif len(files.users_file.get_data()['superusers']) == 0:
+        print("There are no superusers, add yourself with "
+              "'superuser <your user id>' through the admin socket")
+
+
+def is_scheduled_job_owned(job):
+    """Returns True if this process runs the scheduled job, as
+    each shard runs the jobs of its channels and the first shard
+    runs the jobs of the console
+    """
+    if job.channel_id is None:
+        return files.shard_link is None or files.shard_link.shard_id == 0
+    return client.get_channel(job.channel_id) is not None
+
+
+async def run_scheduled_job(job):
+    """Runs the scheduled job, see scheduler.py
+
+    Returns False if the job can no longer run, as its channel or author is gone
+    """
+    if job.channel_id is None:
+        if job.reminder:
+            command_func.console_print('Reminder: {}'.format(job.command))
+        else:
+            await run_command(job.command, FROM_CONSOLE=True)
+        return True
+    channel = client.get_channel(job.channel_id)
+    if channel is None:
+        return False
+    if job.reminder:
+        await client.send_message(channel, '<@{}> Reminder: {}'.format(
+            job.author_id, job.command))
+        return True
+    server = getattr(channel, 'server', None)
+    author = server.get_member(job.author_id) if server is not None \
+        else file_functions.id_to_user(client, job.author_id)
+    if author is None:
+        return False
+    await run_command(scheduler.ScheduledMessage(author, channel, job.command))
+    return True
 
 
-@client.event
 async def on_message(message):
+    # Once shutting down the messages are ignored, and the trace may be closed
+    if trace_recorder is not None and not shutdown.coordinator.stopping:
+        trace_recorder.record(message)
     await run_command(message)
 
-"""
-On startup first check if there is a server token that has been established.
-if not, allow the user to set it via command-line
-"""
-if not TOKEN:
-    isValid = False
-    TOKEN = input("Enter the app bot user token: ")
-try:
-    logging.basicConfig(level=logging.INFO)  # Log discord debug information
-    client.run(TOKEN)
-except discord.LoginFailure:
-    print("Invalid token. "
-          "Setup your bot and get its token at: "
-          "https://discordapp.com/developers under MyApps->YourApp")
-
-    # Close the client and free it of resources
-    client.logout()
-    print("Client logged out")
-    exit(0)
+
+async def on_member_update(before, after):
+    if before.roles != after.roles:
+        file_functions.role_permissions.invalidate_member(after.server.id, after.id)
+
+
+async def on_member_remove(member):
+    file_functions.role_permissions.invalidate_member(member.server.id, member.id)
+
+
+async def on_server_role_update(before, after):
+    file_functions.role_permissions.invalidate_server(after.server.id)
+
+
+async def on_server_role_delete(role):
+    file_functions.role_permissions.invalidate_server(role.server.id)
+
+
+def create_client():
+    """Creates the discord client, as a shard if this process was started as one"""
+    if files.shard_link is None:
+        new_client = discord.Client()
+    else:
+        new_client = discord.Client(shard_id=files.shard_link.shard_id,
+                                    shard_count=files.shard_link.shard_count)
+        # Keep the data files in sync with the coordinator and the other shards
+        new_client.loop.create_task(files.shard_link.run())
+    # Watch for anything blocking the event loop, see the $lag command
+    loop_monitor.start(new_client.loop)
+    new_client.event(on_ready)
+    new_client.event(on_message)
+    # Keep the permissions members get from their roles up to date
+    new_client.event(on_member_update)
+    new_client.event(on_member_remove)
+    new_client.event(on_server_role_update)
+    new_client.event(on_server_role_delete)
+    return new_client
+
+
+def get_flag_value(flag, default=None):
+    """Returns the argument given after the flag, or (default) if the flag wasn't given
+
+    Raises IndexError if the flag was given without an argument
+    """
+    if flag not in sys.argv:
+        return default
+    return sys.argv[sys.argv.index(flag) + 1]
+
+
+def main():
+    global client, TOKEN, trace_recorder
+
+    try:
+        log_pipeline.setup(
+            get_flag_value('--log-level', log_pipeline.DEFAULT_LEVELS),
+            '--log-json' in sys.argv,
+            log_pipeline.parse_sample_rates(get_flag_value('--log-sample'))
+            if '--log-sample' in sys.argv else None)
+    except (IndexError, ValueError) as ex:
+        print("Invalid --log-level or --log-sample: {}".format(ex))
+        exit(1)
+    src.initialize(use_command_table='--command-table' in sys.argv)
+    profiler.mark('load data files and commands')
+    client = create_client()
+    # Shut down gracefully when the process manager stops the bot
+    shutdown.handle_signals(client, client.loop)
+    profiler.mark('create client')
+    if '--profile-startup' in sys.argv:
+        print(profiler.get_report())
+    if '--batch' in sys.argv and sys.argv.index('--batch') == len(sys.argv) - 1:
+        print("Usage: python3 scripty.py --batch <file>")
+        exit(1)
+    if '--record-trace' in sys.argv:
+        from src.soak.trace import TraceRecorder
+        try:
+            trace_recorder = TraceRecorder(sys.argv[sys.argv.index('--record-trace') + 1])
+        except (IndexError, OSError):
+            print("Usage: python3 scripty.py --record-trace <file>")
+            exit(1)
+    if '--random-seed' in sys.argv:
+        try:
+            random_pool.seed(int(sys.argv[sys.argv.index('--random-seed') + 1]))
+        except (IndexError, ValueError):
+            print("Usage: python3 scripty.py --random-seed <n>")
+            exit(1)
+
+    """
+    On startup first check if there is a server token that has been established.
+    if not, allow the user to set it via command-line
+    """
+    TOKEN = files.properties_file.get_data()['token']
+    if not TOKEN:
+        TOKEN = input("Enter the app bot user token: ")
+    try:
+        client.run(TOKEN)
+    except discord.LoginFailure:
+        print("Invalid token. "
+              "Setup your bot and get its token at: "
+              "https://discordapp.com/developers under MyApps->YourApp")
+
+        # Close the client and free it of resources
+        client.logout()
+        print("Client logged out")
+        log_pipeline.stop()
+        exit(0)
+    finally:
+        if trace_recorder is not None:
+            trace_recorder.close()
+    log_pipeline.stop()
+
+
+if __name__ == '__main__':
+    main()
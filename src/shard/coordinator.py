@@ -0,0 +1,84 @@
+""" The coordinator owns the bot's data files when it runs as multiple shards
+
+Every shard process connects to the coordinator over a unix socket (see
+link.py for the messages sent). The coordinator applies the changes each shard
+sends to its JSONDataFiles, which it alone writes to disk, and passes them on
+to every other shard.
+"""
+import asyncio
+import logging
+import os
+from src.shard.link import encode_message, decode_message, MAX_MESSAGE_SIZE
+
+
+class Coordinator:
+    """Serves the data files (data_files) to shards over the unix socket (path)
+
+    Args:
+        path (str) -- the path to create the unix socket at
+        data_files (dict) -- the JSONDataFiles to serve by their names
+                             ex. {'users': users_file}
+    """
+
+    def __init__(self, path, data_files):
+        self.path = path
+        self.__data_files = data_files
+        self.__subscribers = []  # The writers of shards receiving updates
+        self.__server = None
+
+    async def start(self):
+        """Starts accepting connections from shards"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.__server = await asyncio.start_unix_server(
+            self.__handle_connection, self.path, limit=MAX_MESSAGE_SIZE)
+
+    async def close(self):
+        """Stops accepting connections and removes the unix socket"""
+        self.__server.close()
+        await self.__server.wait_closed()
+        for writer in self.__subscribers:
+            writer.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def get_snapshot(self):
+        """Returns a snapshot message holding the data of every file"""
+        files = {}
+        for name, data_file in self.__data_files.items():
+            files[name] = data_file.get_data()
+        return {'op': 'snapshot', 'files': files}
+
+    async def __handle_connection(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = decode_message(line)
+                if message['op'] == 'snapshot':
+                    writer.write(encode_message(self.get_snapshot()))
+                elif message['op'] == 'subscribe':
+                    self.__subscribers.append(writer)
+                    writer.write(encode_message(self.get_snapshot()))
+                elif message['op'] == 'update':
+                    self.__apply_update(message, writer)
+                await writer.drain()
+        except (ConnectionError, ValueError) as ex:
+            logging.getLogger(__name__).warning("Shard connection lost: %s", ex)
+        finally:
+            if writer in self.__subscribers:
+                self.__subscribers.remove(writer)
+            writer.close()
+
+    def __apply_update(self, message, origin):
+        """Applies an update sent by a shard, and sends it to
+        every shard other than the one that sent it (origin)
+        """
+        data_file = self.__data_files[message['file']]
+        data_file.update(message['set'], message['delete'])
+
+        encoded = encode_message(message)
+        for writer in self.__subscribers:
+            if writer is not origin:
+                writer.write(encoded)
@@ -0,0 +1,80 @@
+"""Runs Scripty-Bot as multiple shard processes, each with its own client and
+event loop, to spread the servers the bot is in across multiple cores.
+
+This process is the coordinator, it owns the data files and keeps them in sync
+between the shards. Only the first shard has the console.
+
+Usage (from the src directory, like scripty.py):
+    python3 shard/launcher.py <shard count>
+"""
+import os.path
+# Support for modification in file path
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import asyncio
+import signal
+import subprocess
+import src.log_pipeline as log_pipeline
+from src.file import files
+from src.shard import link
+from src.shard.coordinator import Coordinator
+
+# The script each shard process runs
+SCRIPTY_PATH = os.path.join(os.path.dirname(__file__), '..', 'scripty.py')
+
+
+async def run_shards(shard_count, socket_path):
+    """Runs the shards until any one of them exits, then stops the rest"""
+    coordinator = Coordinator(socket_path, files.get_files_by_name())
+    await coordinator.start()
+
+    processes = []
+    for shard_id in range(shard_count):
+        env = dict(os.environ)
+        env[link.SHARD_ID_ENV] = str(shard_id)
+        env[link.SHARD_COUNT_ENV] = str(shard_count)
+        env[link.SHARD_SOCKET_ENV] = socket_path
+        processes.append(await asyncio.create_subprocess_exec(
+            sys.executable, SCRIPTY_PATH, env=env,
+            # Only the first shard gets the console
+            stdin=None if shard_id == 0 else subprocess.DEVNULL))
+
+    await asyncio.wait([asyncio.ensure_future(p.wait()) for p in processes],
+                       return_when=asyncio.FIRST_COMPLETED)
+    for process in processes:
+        if process.returncode is None:
+            process.send_signal(signal.SIGINT)
+    await asyncio.wait([asyncio.ensure_future(p.wait()) for p in processes])
+    await coordinator.close()
+
+
+def main():
+    try:
+        shard_count = int(sys.argv[1])
+        if shard_count < 1:
+            raise ValueError
+    except (IndexError, ValueError):
+        print("Usage: python3 shard/launcher.py <shard count>")
+        exit(1)
+
+    log_pipeline.setup()
+    files.open_files()
+    # Shards get the token from the coordinator's properties file
+    if not files.properties_file.get_data()['token']:
+        files.properties_file.set('token', input("Enter the app bot user token: "))
+
+    socket_path = os.path.abspath(link.DEFAULT_SOCKET_PATH)
+    loop = asyncio.get_event_loop()
+    try:
+        loop.run_until_complete(run_shards(shard_count, socket_path))
+    except KeyboardInterrupt:
+        pass
+    # Saves all json files and stops their save timers
+    files.close()
+    log_pipeline.stop()
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+""" Connects a shard process to the coordinator that owns the bot's data files
+
+When the bot runs as multiple shard processes (see launcher.py), none of the
+shards write the JSON data files themselves. Each data file is instead a
+RemoteDataFile: a local copy of the coordinator's data that is checked for
+changes every SYNC_INTERVAL seconds, with any changes sent to the coordinator
+and from there to every other shard.
+
+Messages are JSON objects sent one per line over a unix socket:
+    {'op': 'snapshot'} -- requests the data of every file, answered with
+                          {'op': 'snapshot', 'files': {'users': {...}, ...}}
+    {'op': 'subscribe'} -- same as snapshot, but keeps the connection open to
+                           receive the updates made by other shards
+    {'op': 'update', 'file': 'commands', 'set': {...}, 'delete': [...]}
+                        -- sets and deletes keys at the top level of a file
+"""
+import asyncio
+import json
+import os
+import socket
+from src.file.data_diff import diff_data
+from src.file.data_versions import DataVersions
+
+# Environment variables the launcher uses to tell a shard process how to run
+SHARD_ID_ENV = 'SCRIPTY_SHARD_ID'
+SHARD_COUNT_ENV = 'SCRIPTY_SHARD_COUNT'
+SHARD_SOCKET_ENV = 'SCRIPTY_SHARD_SOCKET'
+# Where the coordinator creates its unix socket, relative to the src directory
+DEFAULT_SOCKET_PATH = '../data/scripty.sock'
+
+SYNC_INTERVAL = 0.5  # Seconds between checks for changes to send to the coordinator
+MAX_MESSAGE_SIZE = 2 ** 26  # The longest line (in bytes) a message may be
+
+
+def encode_message(message):
+    """Encodes the message (dict) as a single line of bytes"""
+    return (json.dumps(message) + '\n').encode()
+
+
+def decode_message(line):
+    """Decodes a line of bytes into a message (dict)"""
+    return json.loads(line.decode())
+
+
+class RemoteDataFile:
+    """A data file owned by the coordinator, with the same interface as JSONDataFile
+
+    Args:
+        link (ShardLink) -- the link to the coordinator
+        name (str) -- the name of the file, ex. 'users'
+        data (dict) -- the data of the file when the shard connected
+    """
+
+    def __init__(self, link, name, data):
+        self.name = name
+        self.__link = link
+        self.__versions = DataVersions(data)  # The versions of the data
+        # The top level keys changed by this shard that were not sent yet
+        self.__changed_keys = set()
+        self.__change_listeners = []
+        self.__writes_held = 0  # While above 0, changes are not sent to the coordinator
+
+    def get_data(self):
+        """ Gets the data of the file
+        Note:
+            this is not a copy of the data, it must not be changed (nor the
+            values in it), use set(), delete() or update() instead
+        """
+        return self.__versions.get()
+
+    def set(self, key, value):
+        """ Sets the top level (key) of the data to (value) """
+        self.update({key: value})
+
+    def delete(self, key):
+        """ Deletes the top level (key) of the data, if it exists """
+        self.update({}, (key,))
+
+    def update(self, changed, deleted=()):
+        """ Sets the top level keys of (changed) and deletes the keys (deleted) """
+        self.__versions.update(changed, deleted)
+        self.__changed_keys.update(changed)
+        self.__changed_keys.update(deleted)
+
+    def is_loaded(self):
+        """ Returns True, the data is sent by the coordinator when the shard connects """
+        return True
+
+    def set_data(self, data):
+        """ Forcefully sets the entire json data, use carefully """
+        self.update(*diff_data(self.get_data(), data))
+
+    def add_change_listener(self, listener):
+        """Adds a function to call with the arguments (set, delete)
+        whenever another shard changes this file
+        """
+        self.__change_listeners.append(listener)
+
+    def take_changes(self):
+        """Returns the changes made to the data since the last call as
+        an update message, or None if the data was not changed
+        (or changes are being held)
+        """
+        if self.__writes_held > 0 or not self.__changed_keys:
+            return None
+        data = self.__versions.snapshot()
+        keys, self.__changed_keys = self.__changed_keys, set()
+        changed = {key: data[key] for key in keys if key in data}
+        deleted = [key for key in keys if key not in data]
+        return {'op': 'update', 'file': self.name,
+                'set': changed, 'delete': deleted}
+
+    def apply_changes(self, changed, deleted):
+        """Applies the changes made to this file by another shard"""
+        self.__versions.update(changed, deleted)
+        # Their changes replace ours, as they reached the coordinator first
+        self.__changed_keys.difference_update(changed)
+        self.__changed_keys.difference_update(deleted)
+        for listener in self.__change_listeners:
+            listener(changed, deleted)
+
+    def hold_writes(self):
+        """ Stops changes being sent to the coordinator until release_writes() """
+        self.__writes_held += 1
+
+    def release_writes(self):
+        """ Lets changes be sent to the coordinator again after hold_writes() """
+        self.__writes_held = max(0, self.__writes_held - 1)
+
+    def flush(self):
+        """ Does nothing, changes are sent at the link's next sync """
+
+    def close(self):
+        """ Sends any changes to the coordinator """
+        self.__link.close()
+
+
+class ShardLink:
+    """The connection between this shard process and the coordinator
+
+    Args:
+        path (str) -- the path of the coordinator's unix socket
+        shard_id (int) -- the id of this shard
+        shard_count (int) -- the amount of shards the bot runs as
+    """
+
+    def __init__(self, path, shard_id, shard_count):
+        self.path = path
+        self.shard_id = shard_id
+        self.shard_count = shard_count
+        self.__files = {}
+        self.__closed = False
+
+        snapshot = self.__request_blocking({'op': 'snapshot'})
+        for name, data in snapshot['files'].items():
+            self.__files[name] = RemoteDataFile(self, name, data)
+
+    def get_file(self, name):
+        """Returns the RemoteDataFile with the name (name)"""
+        return self.__files[name]
+
+    def take_changes(self):
+        """Returns the update messages for all changes made since the last call"""
+        updates = []
+        for data_file in self.__files.values():
+            update = data_file.take_changes()
+            if update is not None:
+                updates.append(update)
+        return updates
+
+    async def run(self):
+        """Keeps this shard in sync with the coordinator until it disconnects
+
+        Must be run as a task on the shard's event loop
+        """
+        reader, writer = await asyncio.open_unix_connection(
+            self.path, limit=MAX_MESSAGE_SIZE)
+        writer.write(encode_message({'op': 'subscribe'}))
+        push_task = asyncio.ensure_future(self.__push_changes(writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.__handle_message(decode_message(line))
+        finally:
+            push_task.cancel()
+            writer.close()
+
+    def __handle_message(self, message):
+        """Applies a message sent by the coordinator"""
+        if message['op'] == 'snapshot':
+            # Sent when subscribing, catches up on changes made since connecting
+            for name, data in message['files'].items():
+                data_file = self.__files[name]
+                changed, deleted = diff_data(data_file.get_data(), data)
+                if changed or deleted:
+                    data_file.apply_changes(changed, deleted)
+        elif message['op'] == 'update':
+            self.__files[message['file']].apply_changes(
+                message['set'], message['delete'])
+
+    async def __push_changes(self, writer):
+        """Sends the changes made by this shard every SYNC_INTERVAL seconds"""
+        while True:
+            await asyncio.sleep(SYNC_INTERVAL)
+            for update in self.take_changes():
+                writer.write(encode_message(update))
+            await writer.drain()
+
+    def close(self):
+        """Sends any changes that have not been sent yet to the coordinator
+
+        This blocks, so it can be used while the event loop is shutting down
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        updates = self.take_changes()
+        if updates:
+            self.__send_blocking(updates)
+
+    def __connect_blocking(self):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(self.path)
+        return connection
+
+    def __request_blocking(self, message):
+        """Sends the message and returns the reply, blocking until it arrives"""
+        with self.__connect_blocking() as connection:
+            connection.sendall(encode_message(message))
+            with connection.makefile('rb') as reader:
+                return decode_message(reader.readline(MAX_MESSAGE_SIZE))
+
+    def __send_blocking(self, messages):
+        """Sends the messages, blocking until they are sent"""
+        with self.__connect_blocking() as connection:
+            connection.sendall(b''.join(encode_message(m) for m in messages))
+
+
+def connect_from_environment():
+    """Connects to the coordinator if this process was started as a shard
+
+    Returns the ShardLink, or None if this process is not a shard
+    """
+    path = os.environ.get(SHARD_SOCKET_ENV)
+    if not path:
+        return None
+    return ShardLink(path,
+                     int(os.environ.get(SHARD_ID_ENV, 0)),
+                     int(os.environ.get(SHARD_COUNT_ENV, 1)))
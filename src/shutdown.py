@@ -0,0 +1,96 @@
+""" Shuts the bot down without losing work, on $logout or SIGTERM / SIGINT
+
+Shutting down:
+    1. stops accepting commands, run_command ignores every message after this
+    2. waits up to DRAIN_TIMEOUT seconds for the commands still running (and
+       the replies they are sending) to finish
+    3. stops the scheduler and adds the pending command uses to the usage file
+    4. writes every data file once, on a worker thread, waiting up to FLUSH_TIMEOUT
+       seconds so a stuck disk or coordinator can't hold the shutdown forever
+    5. closes the trace file of --record-trace, if recording
+    6. logs the client out, which ends client.run() in scripty.py's main()
+"""
+import asyncio
+import logging
+import signal
+from contextlib import contextmanager
+from src.file import files
+
+DRAIN_TIMEOUT = 10.0  # The most seconds waited for running commands to finish
+FLUSH_TIMEOUT = 10.0  # The most seconds waited for the data files to be written
+
+logger = logging.getLogger(__name__)
+
+
+class ShutdownCoordinator:
+    """Tracks the running commands, and shuts the bot down once they finish"""
+
+    def __init__(self):
+        self.stopping = False  # Once True, no new commands are run
+        self.in_flight = 0  # The amount of commands running
+        self.__drained = None  # Set once no commands are running while stopping
+        self.__task = None  # The task shutting down, once requested
+
+    @contextmanager
+    def track(self):
+        """Counts a command as running for the duration of a with statement"""
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0 and self.__drained is not None:
+                self.__drained.set()
+
+    def request(self, client, loop=None):
+        """Starts shutting down in a task, if not already
+
+        Returns the task shutting down
+        """
+        if self.__task is None:
+            loop = asyncio.get_event_loop() if loop is None else loop
+            self.__task = loop.create_task(self.shutdown(client))
+        return self.__task
+
+    async def shutdown(self, client):
+        """Shuts the bot down, see the module docstring"""
+        import src.scheduler as scheduler
+        import src.scripty as scripty
+        import src.usage_stats as usage_stats
+
+        self.stopping = True
+        if self.in_flight:
+            logger.info('Shutting down, waiting for %d running commands', self.in_flight)
+            self.__drained = asyncio.Event()
+            try:
+                await asyncio.wait_for(self.__drained.wait(), DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning('%d commands were still running after %.0fs, '
+                               'shutting down anyway', self.in_flight, DRAIN_TIMEOUT)
+
+        if scheduler.scheduler is not None:
+            scheduler.scheduler.stop()
+        if usage_stats.usage_stats is not None:
+            usage_stats.usage_stats.stop()
+        loop = asyncio.get_event_loop()
+        try:
+            await asyncio.wait_for(loop.run_in_executor(None, files.close), FLUSH_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error('The data files were not written within %.0fs', FLUSH_TIMEOUT)
+        if scripty.trace_recorder is not None:
+            scripty.trace_recorder.close()
+        await client.logout()
+
+
+# The shutdown coordinator of the bot
+coordinator = ShutdownCoordinator()
+
+
+def handle_signals(client, loop):
+    """Shuts down gracefully on SIGTERM (sent by process managers) and SIGINT"""
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signal_number, coordinator.request, client, loop)
+        except (NotImplementedError, RuntimeError):
+            # Signal handlers can't be added on windows, or outside the main thread
+            pass
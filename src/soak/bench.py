@@ -0,0 +1,194 @@
+"""Benchmarks of the bot's hot paths, run offline like the soak harness
+
+Usage (from the src directory, like scripty.py):
+    python3 soak/bench.py memory [--count <n>]
+
+    memory   the memory used by each CustomCommand, measured with tracemalloc
+             over (count) custom commands (default 200000), the name strings
+             included. Compared against commands storing the same attributes
+             in a __dict__, close to CustomCommand before it used __slots__
+    denied   the time run_command takes for (count) messages (default 20000)
+             running a command the author isn't allowed to ($logout), against
+             messages running a command they are allowed to ($rng 10)
+    games    the messages per second run_command handles for (count) messages
+             (default 10000) of each of choose, 8ball and random, and the cost
+             of a number from the random pool against the random module.
+             Seeded with --seed (default 1)
+
+The benchmarks running messages work from a scratch directory with empty data
+files, like the soak harness, so the real data is left untouched.
+"""
+import os.path
+# Support for modification in file path
+import sys
+# (absolute, as the benchmarks change the working directory)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import argparse
+import gc
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+# The ids of the fake server, channel and author the benchmark messages are sent from
+SERVER_ID = '100000000000000001'
+CHANNEL_ID = '100000000000000002'
+AUTHOR_ID = '100000000000000003'
+
+
+def measure_memory(factory, count):
+    """Returns the bytes allocated per object by calling factory(i) for
+    each i in range(count), keeping every object alive
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    objects = [factory(i) for i in range(count)]
+    size = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del objects
+    return size / count
+
+
+class DictCommand:
+    """A custom command storing every attribute in its __dict__, the way
+    CustomCommand did before it used __slots__
+    """
+
+    def __init__(self, name, response, function):
+        from src.user.commands import CommandType
+        from src.user.permissions import PermissionLevel
+
+        self.type = CommandType.CUSTOM
+        self.name = name
+        self.desc = 'A custom command'
+        self.minimum_permission = PermissionLevel.DEFAULT
+        self.function = function
+        self.usage = name
+        self.response = response
+
+
+def bench_memory(args):
+    from src.user.commands import CustomCommand
+
+    def function(cmd_args):
+        pass
+
+    for label, command_class in (('__dict__ (before)', DictCommand),
+                                 ('CustomCommand', CustomCommand)):
+        size = measure_memory(
+            lambda i: command_class('cmd{}'.format(i), 'hi', function), args.count)
+        print('{:<20} {:.0f} bytes per command'.format(label, size))
+
+
+def start_bot():
+    """Starts the bot with a FakeClient and empty data files in a scratch directory
+
+    Returns (the client, the scratch directory)
+    """
+    # The data files are opened relative to the working directory ('../data/...')
+    scratch = tempfile.mkdtemp(prefix='scripty-bench-')
+    os.mkdir(os.path.join(scratch, 'data'))
+    os.mkdir(os.path.join(scratch, 'src'))
+    os.chdir(os.path.join(scratch, 'src'))
+
+    import src
+    import src.scripty as scripty
+    from src.soak.fake_client import FakeClient
+
+    src.initialize()
+    client = FakeClient()
+    scripty.client = client
+    return client, scratch
+
+
+def stop_bot(scratch):
+    from src.file import files
+
+    files.close()
+    shutil.rmtree(scratch, ignore_errors=True)
+
+
+async def time_messages(client, content, count):
+    """Returns the seconds run_command takes per message, over (count) messages
+    with the content sent by AUTHOR_ID, one at a time
+    """
+    import src.scripty as scripty
+
+    messages = [client.create_message(SERVER_ID, CHANNEL_ID, AUTHOR_ID, content)
+                for _ in range(count)]
+    start = time.perf_counter()
+    for message in messages:
+        await scripty.run_command(message)
+    return (time.perf_counter() - start) / count
+
+
+def bench_denied(args):
+    client, scratch = start_bot()
+    try:
+        for label, content in (('denied ($logout)', '$logout'), ('matched ($rng 10)', '$rng 10')):
+            # Warm up first, ex. the first denial reply and the response cache
+            client.loop.run_until_complete(time_messages(client, content, 100))
+            seconds = client.loop.run_until_complete(time_messages(client, content, args.count))
+            print('{:<20} {:.1f}us per message'.format(label, seconds * 1e6))
+    finally:
+        stop_bot(scratch)
+
+
+GAME_COMMANDS = ('$choose pizza | tacos | sushi', '$8ball will it work?', '$rng 10')
+
+
+def time_calls(function, count):
+    """Returns the seconds each of (count) calls of function() takes"""
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return (time.perf_counter() - start) / count
+
+
+def bench_games(args):
+    import random
+    import src.random_pool as random_pool
+
+    client, scratch = start_bot()
+    try:
+        random_pool.seed(args.seed)
+        for content in GAME_COMMANDS:
+            client.loop.run_until_complete(time_messages(client, content, 100))
+            seconds = client.loop.run_until_complete(time_messages(client, content, args.count))
+            print('{:<32} {:.0f} msg/s'.format(content, 1 / seconds))
+    finally:
+        stop_bot(scratch)
+
+    random.seed(args.seed)
+    options = ('pizza', 'tacos', 'sushi')
+    for label, function in (
+            ('random.randint(0, 10)', lambda: random.randint(0, 10)),
+            ('pool.below(11)', lambda: random_pool.pool.below(11)),
+            ('random.choice(options)', lambda: random.choice(options)),
+            ('pool.choice(options)', lambda: random_pool.pool.choice(options))):
+        print('{:<32} {:.3f}us per call'.format(label, time_calls(function, 1000000) * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the bot's hot paths")
+    benchmarks = parser.add_subparsers(dest='benchmark')
+    memory = benchmarks.add_parser('memory')
+    memory.add_argument('--count', type=int, default=200000)
+    memory.set_defaults(run=bench_memory)
+    denied = benchmarks.add_parser('denied')
+    denied.add_argument('--count', type=int, default=20000)
+    denied.set_defaults(run=bench_denied)
+    games = benchmarks.add_parser('games')
+    games.add_argument('--count', type=int, default=10000)
+    games.add_argument('--seed', type=int, default=1)
+    games.set_defaults(run=bench_games)
+    args = parser.parse_args()
+    if args.benchmark is None:
+        parser.error('choose a benchmark')
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
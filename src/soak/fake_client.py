@@ -0,0 +1,191 @@
+"""A fake discord client for running the bot offline, see harness.py
+
+It stands in for the parts of discord.Client the bot uses, keeping the
+servers, channels and message history in memory instead of talking to discord.
+Only the attributes the bot reads are modeled.
+"""
+import asyncio
+import datetime
+import itertools
+from collections import deque
+
+HISTORY_SIZE = 1000  # The most messages kept in each channel's history
+
+# The ids of every fake object, snowflake sized like real discord ids
+__ids = itertools.count(100000000000000000)
+
+
+def new_id():
+    """Returns a new unique id"""
+    return str(next(__ids))
+
+
+class FakeRole:
+    def __init__(self, server, role_id=None, name='role'):
+        self.id = new_id() if role_id is None else role_id
+        self.name = name
+        self.server = server
+
+
+class FakeServer:
+    def __init__(self, server_id=None, name='server'):
+        self.id = new_id() if server_id is None else server_id
+        self.name = name
+        # The @everyone role has the id of the server
+        self.default_role = FakeRole(self, self.id, '@everyone')
+        self.roles = [self.default_role]
+        self.members = {}  # by id
+        self.channels = {}  # by id
+
+    def get_member(self, member_id):
+        """Returns the member (id) of this server, adding them if they aren't one"""
+        member = self.members.get(member_id)
+        if member is None:
+            member = FakeMember(member_id, self)
+            self.members[member_id] = member
+        return member
+
+    def get_channel(self, channel_id):
+        """Returns the channel (id) of this server, adding it if it doesn't exist"""
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            channel = FakeChannel(channel_id, self)
+            self.channels[channel_id] = channel
+        return channel
+
+
+class FakeMember:
+    def __init__(self, member_id, server, name=None):
+        self.id = member_id
+        self.name = 'user{}'.format(member_id[-4:]) if name is None else name
+        self.server = server
+        self.roles = [server.default_role]
+        self.bot = False
+
+    @property
+    def mention(self):
+        return '<@{}>'.format(self.id)
+
+
+class FakeChannel:
+    def __init__(self, channel_id, server):
+        self.id = channel_id
+        self.name = 'channel{}'.format(channel_id[-4:])
+        self.server = server
+        self.history = deque(maxlen=HISTORY_SIZE)  # The messages sent, oldest first
+
+
+class FakeMessage:
+    def __init__(self, author, channel, content):
+        self.id = new_id()
+        self.author = author
+        self.channel = channel
+        self.server = channel.server
+        self.content = content
+        self.timestamp = datetime.datetime.utcnow()
+
+
+class FakeClient:
+    """Stands in for discord.Client
+
+    Variables:
+        sent (int) -- the amount of messages the bot has sent
+        deleted (int) -- the amount of messages the bot has deleted
+    Args:
+        loop (object) -- the event loop, the current event loop by default
+    """
+
+    def __init__(self, loop=None):
+        self.loop = asyncio.get_event_loop() if loop is None else loop
+        self.servers = {}  # by id
+        self.user = FakeMember(new_id(), FakeServer(), 'scripty')
+        self.user.bot = True
+        self.sent = 0
+        self.deleted = 0
+        self.__events = {}
+        self.is_logged_in = True
+
+    def event(self, coro):
+        """Registers the coroutine as the handler of the event with its name"""
+        self.__events[coro.__name__] = coro
+        return coro
+
+    def get_server(self, server_id):
+        """Returns the server (id), adding it if it doesn't exist"""
+        server = self.servers.get(server_id)
+        if server is None:
+            server = FakeServer(server_id)
+            self.servers[server_id] = server
+        return server
+
+    def create_message(self, server_id, channel_id, author_id, content):
+        """Returns a message sent by a member, as received from the gateway"""
+        server = self.get_server(server_id)
+        channel = server.get_channel(channel_id)
+        message = FakeMessage(server.get_member(author_id), channel, content)
+        channel.history.append(message)
+        return message
+
+    async def dispatch(self, event, *args):
+        """Runs the handler of the event, if there is one"""
+        handler = self.__events.get(event)
+        if handler is not None:
+            await handler(*args)
+
+    async def send_message(self, destination, content):
+        message = FakeMessage(self.user, destination, content)
+        destination.history.append(message)
+        self.sent += 1
+        return message
+
+    async def edit_message(self, message, new_content):
+        message.content = new_content
+        return message
+
+    async def delete_message(self, message):
+        self.__remove_from_history(message.channel, (message,))
+
+    async def delete_messages(self, messages):
+        messages = list(messages)
+        if messages:
+            self.__remove_from_history(messages[0].channel, messages)
+
+    def __remove_from_history(self, channel, messages):
+        ids = set(message.id for message in messages)
+        kept = [message for message in channel.history if message.id not in ids]
+        self.deleted += len(channel.history) - len(kept)
+        channel.history.clear()
+        channel.history.extend(kept)
+
+    async def logs_from(self, channel, limit=100, before=None, after=None):
+        """Yields the channel's messages, newest first. Like discord's
+        snowflakes, ids increase over time so they are compared for before/after
+        """
+        count = 0
+        for message in reversed(list(channel.history)):
+            if count >= limit:
+                return
+            if before is not None and int(message.id) >= int(before.id):
+                continue
+            if after is not None and int(message.id) <= int(after.id):
+                return
+            count += 1
+            yield message
+
+    async def purge_from(self, channel, limit=100, check=None, before=None, after=None):
+        """Deletes up to (limit) messages from the channel that pass the check,
+        returning the deleted messages
+        """
+        deleted = []
+        async for message in self.logs_from(channel, limit, before, after):
+            if check is None or check(message):
+                deleted.append(message)
+        await self.delete_messages(deleted)
+        return deleted
+
+    def get_all_members(self):
+        for server in self.servers.values():
+            yield from server.members.values()
+
+    async def logout(self):
+        self.is_logged_in = False
@@ -0,0 +1,221 @@
+"""Soak tests the bot offline by replaying a trace of messages against a fake client
+
+The bot runs as usual, but with a FakeClient (see fake_client.py) in place of
+the discord client, and with data files in a scratch directory so the real data
+is left untouched. Messages from a recorded or synthetic trace (see trace.py)
+are delivered to on_message at their time in the trace, each in its own task
+like the discord client does. Every report interval it prints the throughput,
+the latency percentiles of handling a message, the RSS and the thread count,
+so slow leaks (ex. a thread per file save) and slow paths show up over a long run.
+
+Usage (from the src directory, like scripty.py):
+    python3 soak/harness.py [--rate <msg/s>] [--duration <seconds>]
+                            [--trace <file>] [--speed <factor>]
+                            [--interval <seconds>] [--data <dir>] [--seed <n>]
+
+    --rate       messages per second of the synthetic trace (default 1000)
+    --duration   seconds to run for (default 60), 0 to run until stopped
+    --trace      replays the recorded trace file instead of a synthetic trace
+    --speed      replays the recorded trace this many times faster
+    --interval   seconds between reports (default 10)
+    --data       copies the data files from this directory before starting,
+                 by default the bot starts with empty data files
+    --seed       seeds the synthetic trace and the bot's random commands
+"""
+import os.path
+# Support for modification in file path
+import sys
+# (absolute, as the harness changes the working directory)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import argparse
+import asyncio
+import itertools
+import logging
+import shutil
+import tempfile
+import threading
+import time
+
+REPORT_PERCENTILES = (50, 90, 99, 99.9)
+
+
+def get_rss():
+    """Returns the resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # Not linux, fall back to the peak resident set size
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def get_percentile(ordered, percent):
+    """Returns the value that (percent)% of the ordered values are under"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+class SoakStats:
+    """The measurements of a soak test, over the whole run and each interval"""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.handled = 0
+        self.errors = 0
+        self.first_error = None
+        self.in_flight = 0
+        self.samples = []  # (seconds, messages handled, rss, threads) of each report
+        self.__latencies = []  # Seconds to handle each message this interval
+        self.__interval_start = self.start
+        self.__interval_handled = 0
+
+    def message_handled(self, latency, error=None):
+        self.handled += 1
+        self.__interval_handled += 1
+        self.__latencies.append(latency)
+        if error is not None:
+            self.errors += 1
+            if self.first_error is None:
+                self.first_error = error
+
+    def report_interval(self):
+        """Returns the report of the interval since the last report, and starts a new one"""
+        now = time.monotonic()
+        latencies = sorted(self.__latencies)
+        throughput = self.__interval_handled / max(now - self.__interval_start, 1e-9)
+        rss = get_rss()
+        threads = threading.active_count()
+        self.samples.append((now - self.start, self.handled, rss, threads))
+        self.__latencies = []
+        self.__interval_start = now
+        self.__interval_handled = 0
+        return '{:>7.0f}s {:>8.0f} msg/s  {}  max {:.2f}ms  in flight {:>5}  ' \
+               'rss {:.1f}MB  threads {}'.format(
+                   now - self.start, throughput,
+                   '  '.join('p{} {:.2f}ms'.format(p, get_percentile(latencies, p) * 1000)
+                             for p in REPORT_PERCENTILES),
+                   max(latencies, default=0.0) * 1000, self.in_flight,
+                   rss / 2 ** 20, threads)
+
+    def get_summary(self):
+        """Returns the summary of the whole run as a printable string"""
+        elapsed = time.monotonic() - self.start
+        lines = ['Handled {} messages in {:.1f}s ({:.0f} msg/s), {} errors'.format(
+            self.handled, elapsed, self.handled / max(elapsed, 1e-9), self.errors)]
+        if self.samples:
+            first, last = self.samples[0], self.samples[-1]
+            lines.append('RSS {:.1f}MB -> {:.1f}MB ({:+.1f}MB), threads {} -> {}'.format(
+                first[2] / 2 ** 20, last[2] / 2 ** 20,
+                (last[2] - first[2]) / 2 ** 20, first[3], last[3]))
+        if self.first_error is not None:
+            lines.append('First error: {!r}'.format(self.first_error))
+        return '\n'.join(lines)
+
+
+async def handle_message(client, stats, message):
+    """Delivers the message to the bot, measuring how long it took to handle"""
+    start = time.monotonic()
+    stats.in_flight += 1
+    error = None
+    try:
+        await client.dispatch('on_message', message)
+    except Exception as ex:  # pylint: disable=broad-except
+        error = ex
+    stats.in_flight -= 1
+    stats.message_handled(time.monotonic() - start, error)
+
+
+async def replay(client, stats, trace, speed, interval):
+    """Delivers the messages of the trace at their times, reporting every interval"""
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    next_report = start + interval
+    for entry in trace:
+        due = start + entry['t'] / speed
+        while True:
+            now = loop.time()
+            if now >= next_report:
+                print(stats.report_interval())
+                next_report += interval
+            if now >= due:
+                break
+            await asyncio.sleep(min(due, next_report) - now)
+        message = client.create_message(entry.get('server') or '0', entry['channel'],
+                                        entry['author'], entry['content'])
+        loop.create_task(handle_message(client, stats, message))
+    # Let the last messages finish
+    while stats.in_flight:
+        await asyncio.sleep(0.01)
+    if not stats.samples or stats.samples[-1][1] != stats.handled:
+        print(stats.report_interval())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Soak tests the bot offline')
+    parser.add_argument('--rate', type=float, default=1000.0)
+    parser.add_argument('--duration', type=float, default=60.0)
+    parser.add_argument('--trace')
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--interval', type=float, default=10.0)
+    parser.add_argument('--data')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    # The data files are opened relative to the working directory ('../data/...'),
+    # so work from a scratch directory next to a scratch data directory
+    scratch = tempfile.mkdtemp(prefix='scripty-soak-')
+    if args.data is not None:
+        shutil.copytree(args.data, os.path.join(scratch, 'data'))
+    else:
+        os.mkdir(os.path.join(scratch, 'data'))
+    os.mkdir(os.path.join(scratch, 'src'))
+    if args.trace is not None:
+        args.trace = os.path.abspath(args.trace)
+    os.chdir(os.path.join(scratch, 'src'))
+
+    import src
+    import src.loop_monitor as loop_monitor
+    import src.random_pool as random_pool
+    import src.scripty as scripty
+    import src.usage_stats as usage_stats
+    from src.file import files
+    from src.soak import trace
+    from src.soak.fake_client import FakeClient
+
+    logging.basicConfig(level=logging.WARNING)
+    src.initialize()
+    if args.seed is not None:
+        random_pool.seed(args.seed)
+    client = FakeClient()
+    client.event(scripty.on_message)
+    scripty.client = client
+    loop_monitor.start(client.loop)
+    usage_stats.start(client.loop)
+
+    if args.trace is not None:
+        messages = trace.read_trace(args.trace)
+    else:
+        messages = trace.synthetic_trace(args.rate, args.duration or None, seed=args.seed)
+    if args.duration:
+        messages = itertools.takewhile(
+            lambda entry: entry['t'] / args.speed < args.duration, messages)
+    stats = SoakStats()
+    try:
+        client.loop.run_until_complete(
+            replay(client, stats, messages, args.speed, args.interval))
+    except KeyboardInterrupt:
+        pass
+    print(stats.get_summary())
+    print(loop_monitor.get_report())
+    usage_stats.usage_stats.stop()
+    files.close()
+    shutil.rmtree(scratch, ignore_errors=True)
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
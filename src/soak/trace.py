@@ -0,0 +1,86 @@
+"""Traces of messages to replay against the bot, see harness.py
+
+A trace is a JSON Lines file of the messages received, in the order received:
+    {"t": 0.52, "server": "1", "channel": "2", "author": "3", "content": "$8ball"}
+Where t is the seconds since the start of the trace. Traces can be recorded from
+a running bot with 'scripty.py --record-trace <file>', or generated synthetically
+"""
+import json
+import random
+import time
+
+# The messages of a synthetic trace and how often each is sent. $fact is left
+# out, as it requests numbersapi.com
+SYNTHETIC_MIX = (
+    ('$8ball', 20),
+    ('$choose pizza | tacos | sushi', 20),
+    ('$random 100', 20),
+    ('$permission', 10),
+    ('$help', 5),
+    ('$logout', 5),  # Denied to everyone but the console
+    ('just chatting, not a command', 20),
+)
+
+
+def read_trace(path):
+    """Yields each message (a dict) of the trace file"""
+    with open(path) as trace_file:
+        for line in trace_file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def synthetic_trace(rate, duration, servers=10, channels=5, authors=1000, seed=None):
+    """Yields the messages of a synthetic trace
+
+    Args:
+        rate (float) -- messages per second
+        duration (float) -- seconds of messages, None to never stop
+        servers (int) -- the amount of servers the messages are sent in
+        channels (int) -- the amount of channels in each server
+        authors (int) -- the amount of users sending the messages
+        seed (int) -- seeds the trace, so the same trace can be generated again
+    """
+    generator = random.Random(seed)
+    contents = [content for content, weight in SYNTHETIC_MIX for _ in range(weight)]
+    count = 0
+    while duration is None or count / rate < duration:
+        server = generator.randrange(servers)
+        yield {
+            't': count / rate,
+            'server': str(900000000000000000 + server),
+            'channel': str(800000000000000000 + server * channels
+                           + generator.randrange(channels)),
+            'author': str(700000000000000000 + generator.randrange(authors)),
+            'content': generator.choice(contents)
+        }
+        count += 1
+
+
+class TraceRecorder:
+    """Appends the messages the bot receives to a trace file
+
+    Args:
+        path (str) -- the path of the trace file
+    """
+
+    def __init__(self, path):
+        # Line buffered, so each message is on disk even if the bot is killed
+        self.__file = open(path, 'a', buffering=1)
+        self.__start = time.monotonic()
+
+    def record(self, message):
+        """Appends the message (a discord message) to the trace"""
+        self.__file.write(json.dumps({
+            't': round(time.monotonic() - self.__start, 4),
+            'server': getattr(message.server, 'id', None),
+            'channel': message.channel.id,
+            'author': message.author.id,
+            'content': message.content
+        }))
+        self.__file.write('\n')
+
+    def close(self):
+        """Closes the trace file, can be called more than once"""
+        self.__file.close()
@@ -0,0 +1,39 @@
+"""Times each phase of startup, shown when the bot is run with --profile-startup"""
+import time
+
+
+class StartupProfiler:
+    """Records how long each phase of startup took
+
+    Each call to mark() ends the current phase, so the time between two marks is
+    the time taken by the phase named in the second mark.
+    Example:
+        profiler = StartupProfiler()
+        import discord
+        profiler.mark('import discord')
+
+    Args:
+        start_time (float) -- the time.perf_counter() when startup began,
+                              now by default
+    """
+
+    def __init__(self, start_time=None):
+        self.start_time = time.perf_counter() if start_time is None else start_time
+        self.__last_mark = self.start_time
+        self.phases = []  # (name, seconds) of each phase in order
+
+    def mark(self, phase):
+        """Ends the current phase, naming it (phase)"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.__last_mark))
+        self.__last_mark = now
+
+    def get_report(self):
+        """Returns a table of the time taken by each phase"""
+        total = self.__last_mark - self.start_time
+        lines = ['******** Startup profile ********']
+        for phase, seconds in self.phases:
+            percent = 100 * seconds / total if total > 0 else 0
+            lines.append('{:>9.1f} ms {:>5.1f}%  {}'.format(seconds * 1000, percent, phase))
+        lines.append('{:>9.1f} ms         total'.format(total * 1000))
+        return '\n'.join(lines)
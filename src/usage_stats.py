@@ -0,0 +1,140 @@
+""" Counts how often each command is used in each server, by the hour
+
+Running a command only increments an in-memory counter for its (server,
+command, hour), the hour being kept up to date by a timer rather than read
+from the clock on every command. The counters are added to the usage file in
+bulk every FLUSH_INTERVAL seconds:
+    {
+        '<server id>': {'<command name>': {'<hour>': 12}}
+    }
+Where the hour is the hours since the epoch. Commands sent in direct messages
+are counted under 'direct'. Each server is a top level key, so shards (which
+each have their own servers) merge their counts without conflicts.
+Counts older than RETENTION_HOURS are dropped every hour.
+"""
+import asyncio
+import time
+from collections import Counter
+from src.file import files
+
+FLUSH_INTERVAL = 60  # Seconds between adding the counters to the usage file
+RETENTION_HOURS = 24 * 90  # The hours of counts kept in the usage file
+DIRECT_MESSAGES = 'direct'  # The server id of the commands sent in direct messages
+
+
+def get_current_hour():
+    """Returns the hours since the epoch"""
+    return int(time.time() // 3600)
+
+
+class UsageStats:
+    """Counts the uses of commands, see the module docstring
+
+    Args:
+        loop (object) -- the event loop
+    """
+
+    def __init__(self, loop=None):
+        self.__loop = asyncio.get_event_loop() if loop is None else loop
+        # The uses not yet added to the usage file by (server id, command name, hour)
+        self.__counts = Counter()
+        self.hour = get_current_hour()  # Kept up to date by __next_hour()
+        self.__hour_timer = None
+        self.__flush_timer = None
+
+    def start(self):
+        """Starts the timers keeping the hour up to date and flushing the counters"""
+        self.__next_hour()
+        self.__flush_timer = self.__loop.call_later(FLUSH_INTERVAL, self.__flush_periodically)
+
+    def stop(self):
+        """Stops the timers and flushes the counters"""
+        for timer in (self.__hour_timer, self.__flush_timer):
+            if timer is not None:
+                timer.cancel()
+        self.__hour_timer = self.__flush_timer = None
+        self.flush()
+
+    def record(self, server_id, command_name):
+        """Counts a use of the command in the server (id)"""
+        self.__counts[(server_id, command_name, self.hour)] += 1
+
+    def __next_hour(self):
+        self.hour = get_current_hour()
+        self.__hour_timer = self.__loop.call_later(
+            (self.hour + 1) * 3600 - time.time(), self.__next_hour)
+        self.__drop_old_counts()
+
+    def __drop_old_counts(self):
+        """Drops the counts in the usage file older than RETENTION_HOURS"""
+        oldest = self.hour - RETENTION_HOURS
+        changed = {}
+        deleted = []
+        # The counts of a server are copied only if some of them are dropped,
+        # the data of the usage file must not be changed in place
+        for server_id, server_counts in files.usage_file.get_data().items():
+            kept_counts = {}
+            for command_name, hours in server_counts.items():
+                kept_hours = {hour: count for hour, count in hours.items() if int(hour) >= oldest}
+                if kept_hours:
+                    kept_counts[command_name] = hours if len(kept_hours) == len(hours) \
+                        else kept_hours
+            if not kept_counts:
+                deleted.append(server_id)
+            elif kept_counts != server_counts:
+                changed[server_id] = kept_counts
+        if changed or deleted:
+            files.usage_file.update(changed, deleted)
+
+    def __flush_periodically(self):
+        self.flush()
+        self.__flush_timer = self.__loop.call_later(FLUSH_INTERVAL, self.__flush_periodically)
+
+    def flush(self):
+        """Adds the counters to the usage file"""
+        counts, self.__counts = self.__counts, Counter()
+        if not counts:
+            return
+        data = files.usage_file.get_data()
+        # Copies of the counts of the servers and commands used, the data of
+        # the usage file must not be changed in place
+        changed = {}
+        copied_commands = set()
+        for (server_id, command_name, hour), count in counts.items():
+            if server_id not in changed:
+                changed[server_id] = dict(data.get(server_id, {}))
+            server_counts = changed[server_id]
+            if (server_id, command_name) not in copied_commands:
+                copied_commands.add((server_id, command_name))
+                server_counts[command_name] = dict(server_counts.get(command_name, {}))
+            hours = server_counts[command_name]
+            hour = str(hour)
+            hours[hour] = hours.get(hour, 0) + count
+        files.usage_file.update(changed)
+
+    def get_totals(self, hours, server_id=None):
+        """Returns the uses of each command in the last (hours), in the server
+        (id) or in every server if None, as a Counter by command name
+        """
+        self.flush()
+        since = self.hour - hours
+        totals = Counter()
+        data = files.usage_file.get_data()
+        servers = data.values() if server_id is None else (data.get(server_id, {}),)
+        for server_counts in servers:
+            for command_name, command_hours in server_counts.items():
+                uses = sum(count for hour, count in command_hours.items() if int(hour) > since)
+                if uses:
+                    totals[command_name] += uses
+        return totals
+
+
+# The usage stats of the bot, None until start() is called
+usage_stats = None
+
+
+def start(loop=None):
+    """Starts counting the uses of commands"""
+    global usage_stats
+    usage_stats = UsageStats(loop)
+    usage_stats.start()
@@ -7,9 +7,12 @@ This includes:
 This is here to simplify the creation of new commands and checking if the users
 message matches the command correctly.
 """
+import re
 from enum import Enum
 from collections import deque
-from src.user.permissions import PermissionLevel, PermissionDeniedError
+from src.user.permissions import PermissionLevel
+import src.user.roles as roles
+import src.response_cache as response_cache
 
 ############################## Keyword Functions ##############################
 '''
@@ -22,6 +25,16 @@ Returns:
 '''
 
 
+# A discord id (snowflake) is a 64 bit number, so up to 20 digits. Ids are
+# 18 digits for most of 2017-2022, 19 digits since, and shorter before
+SNOWFLAKE_PATTERN = r'\d{15,20}'
+__user_reference_regex = re.compile(r'<@!?({0})>|({0})'.format(SNOWFLAKE_PATTERN))
+__channel_reference_regex = re.compile(r'<#({0})>|({0})'.format(SNOWFLAKE_PATTERN))
+# ex. 1d, 2h30m, 90s, 1h 30m must be typed without the space as a single word
+__duration_regex = re.compile(r'(?:(\d+)d)?(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?')
+__integer_range_regex = re.compile(r'(-?\d+)-(-?\d+)')
+
+
 def keyword_function_user_reference(string):
     """ Checks if the string is a user mention
 
@@ -29,19 +42,79 @@ def keyword_function_user_reference(string):
     Returns the user id found if a match
     An example matchs would be:
         <@782311255082572245>
+        <@!782311255082572245>
+        782311255082572245
+    """
+    match = __user_reference_regex.fullmatch(string)
+    if match is None:
+        return None
+    return match.group(match.lastindex)
+
+
+def keyword_function_channel_reference(string):
+    """ Checks if the string is a channel mention
+
+    Returns None if not a match
+    Returns the channel id found if a match
+    An example matchs would be:
+        <#782311255082572245>
         782311255082572245
     """
-    if string.startswith('<@') and string.endswith('>'):
-        string = string[2:-1]
-    if len(string) != 18:
+    match = __channel_reference_regex.fullmatch(string)
+    if match is None:
         return None
+    return match.group(match.lastindex)
+
+
+def keyword_function_duration(string):
+    """ Checks if the string is a duration in days, hours, minutes and seconds
+
+    Returns None if not a match
+    Returns the duration in seconds if a match
+    An example matchs would be:
+        1d
+        2h30m (returns 9000)
+        90s
+    """
+    match = __duration_regex.fullmatch(string)
+    if match is None or match.lastindex is None:
+        return None
+    days, hours, minutes, seconds = (int(group or 0) for group in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def keyword_function_integer(string):
+    """Checks if the string is a whole number
+
+    Returns None if not a match
+    Returns the number if a match
+    """
     try:
-        int(string)
-        return string
+        return int(string)
     except ValueError:
         return None
 
 
+def keyword_factory_integer_range(parameter):
+    """Creates the keyword function of a whole number in a range, from the
+    parameter of the keyword ex. '1-100' in '<int:1-100>'
+
+    Returns the keyword function
+    Raises ValueError if the parameter is not a range
+    """
+    match = __integer_range_regex.fullmatch(parameter)
+    if match is None:
+        raise ValueError('\'{}\' is not a range, ex. 1-100'.format(parameter))
+    lowest, highest = int(match.group(1)), int(match.group(2))
+
+    def keyword_function_integer_range(string):
+        number = keyword_function_integer(string)
+        if number is None or not lowest <= number <= highest:
+            return None
+        return number
+    return keyword_function_integer_range
+
+
 def keyword_function_number(string):
     """Checks if the string is a number
 
@@ -120,11 +193,23 @@ class CommandKeywords(Enum):
         keyword_function_options,
         KeywordCount.ALL_WORDS_AFTER)
     WORD = ('<word>', keyword_function_passthrough, KeywordCount.SINGLE_WORD)
+    CHANNEL_REFERENCE = (
+        '<channel>',
+        keyword_function_channel_reference,
+        KeywordCount.SINGLE_WORD)
+    ROLE_REFERENCE = ('<role>', roles.parse_role_reference, KeywordCount.SINGLE_WORD)
+    DURATION = ('<duration>', keyword_function_duration, KeywordCount.SINGLE_WORD)
+    # Also takes a range as its parameter, ex. '<int:1-100>'
+    INTEGER = ('<int>', keyword_function_integer, KeywordCount.SINGLE_WORD)
 
 
-def get_keyword_string_of(keyword):
-    """Gets the keyword string of the keyword"""
-    return keyword.value[0]
+def get_keyword_string_of(keyword, parameter=None):
+    """Gets the keyword string of the keyword, with the parameter if given
+    ex. '<int:1-100>' for (CommandKeywords.INTEGER, '1-100')
+    """
+    if parameter is None:
+        return keyword.value[0]
+    return '{}:{}>'.format(keyword.value[0][:-1], parameter)
 
 
 def get_keyword_function_of(keyword):
@@ -146,6 +231,87 @@ def matches_keyword_function(string, command_keyword):
     return keyword_function(string)
 
 
+########################### Keyword Type Registry ###########################
+# Every keyword type that can be used in a command's name, by the name of the
+# keyword (ex. 'user' for '<user>'). Each holds (keyword function, KeywordCount,
+# factory), where factory creates the keyword function of a keyword with a
+# parameter (ex. '<int:1-100>'), None if the type takes no parameter.
+# Command names are compiled against this when the command is created, so
+# types must be registered before the commands that use them are created
+__keyword_types = {}
+# Splits a word of a command's name into a keyword's name and parameter
+__keyword_regex = re.compile(r'<(\w+)(?::([^>]*))?>')
+
+
+def register_keyword_type(name, keyword_function, count=KeywordCount.SINGLE_WORD,
+                          factory=None):
+    """Registers a keyword type, so '<name>' can be used in the names of commands
+
+    Args:
+        name (str) -- the name of the keyword, ex. 'user' for '<user>'
+        keyword_function (function) -- the keyword function, see Keyword Functions
+        count (KeywordCount) -- how many words the keyword function is given
+        factory (function) -- if set, the keyword also takes a parameter ex. '<name:x>',
+                              and the keyword function of each parameter is
+                              factory(parameter). It raises ValueError if
+                              the parameter is not valid
+    Raises ValueError if a keyword type with the name is already registered
+    """
+    if name in __keyword_types:
+        raise ValueError('The keyword type <{}> is already registered'.format(name))
+    __keyword_types[name] = (keyword_function, count, factory)
+
+
+def unregister_keyword_type(name):
+    """Unregisters the keyword type, commands already created with it still use it"""
+    __keyword_types.pop(name, None)
+
+
+def compile_keyword(word):
+    """Compiles a word of a command's name
+
+    Returns (keyword function, KeywordCount) if the word is a registered keyword
+    Returns None if it is not a keyword
+    Raises ValueError if the keyword's parameter is not valid
+    """
+    match = __keyword_regex.fullmatch(word)
+    if match is None:
+        return None
+    keyword_type = __keyword_types.get(match.group(1))
+    if keyword_type is None:
+        return None
+    keyword_function, count, factory = keyword_type
+    parameter = match.group(2)
+    if parameter is None:
+        return keyword_function, count
+    if factory is None:
+        raise ValueError('The keyword type <{}> takes no parameter'.format(match.group(1)))
+    return factory(parameter), count
+
+
+def compile_command_name(name):
+    """Compiles the name of a command to what Command.matches() checks a string with
+
+    Returns a tuple with a part for each word of the name, either the word
+    itself or the (keyword function, KeywordCount) of a keyword
+    Raises ValueError if the parameter of a keyword is not valid
+    """
+    parts = []
+    for word in name.split():
+        keyword = compile_keyword(word)
+        parts.append(word if keyword is None else keyword)
+    return tuple(parts)
+
+
+# The factories of the CommandKeywords that take a parameter
+__keyword_factories = {CommandKeywords.INTEGER: keyword_factory_integer_range}
+for __keyword in CommandKeywords:
+    register_keyword_type(get_keyword_string_of(__keyword)[1:-1],
+                          get_keyword_function_of(__keyword),
+                          get_keyword_count_of(__keyword),
+                          __keyword_factories.get(__keyword))
+
+
 class CommandType(Enum):
     """The type of commands"""
     STANDARD = 'Standard'
@@ -169,8 +335,111 @@ class CommandType(Enum):
 # Note that the commands list under each category must be sorted by name.
 __commands = {}
 
+# The dispatch table, mapping the first word of each command's name (and of each
+# of its aliases) to the commands that begin with that word. This lets a message
+# be resolved to its few candidate commands with a single dictionary lookup
+# rather than trying to match every command.
+# Example layout:
+# {
+#   'help': [help],
+#   'h': [help],
+#   'command': [command add, command remove]
+# }
+__commands_index = {}
+# Commands that begin with a CommandKeyword can't be indexed by their first word,
+# these are checked against every message
+__commands_unindexed = deque()
+
+# The compiled table custom commands are looked up in when the bot runs with a
+# command table (see file/command_table.py), None otherwise. Custom commands in
+# the command list then act as changes made since the table was built.
+__command_table = None
+__command_table_function = None  # The function run by the commands in the table
+# The names of removed commands that may still be in the command table
+__command_table_removed = set()
+
+
+# Returned by Command.matches() when the string matches the command but the
+# permission level can't execute it. Denial is common (and can be spammed), so
+# it is a return value rather than an exception raised inside the match loop
+PERMISSION_DENIED = object()
+
+
+class BaseCommand(object):
+    """The attributes and methods every command has, see Command and CustomCommand
+
+    Commands are created in large numbers (one for every custom command), so
+    their attributes are kept in slots rather than a __dict__ for each command.
+    Only the slots every command sets are here, the subclasses add their own
+    Variables:
+        name (str) -- the name of the command
+        function (function) -- the function to run when the command is called
+        aliases (tuple) -- alternative words for the first word of the name
+    """
+    __slots__ = ('name', 'function', 'aliases')
+
+    def __eq__(self, other):
+        """Commands are considered equal if they share the same name"""
+        if (self.name == other.name):
+            return True
+        return False
+
+    def add_alias(self, alias):
+        """Adds an alias (a single word) that can be typed in place of the
+        first word of this command's name
+
+        Raises ImproperNameError if the alias contains spaces
+        Note:
+            This does not update the dispatch table, use the add_alias()
+            module function for commands already in the command list
+        """
+        alias = alias.strip()
+        if alias == '' or alias.find(' ') != -1:
+            raise ImproperNameError('Alias must be a single word!')
+        if alias not in self.aliases:
+            self.aliases += (alias,)
+
+    def get_first_word(self):
+        """Returns the first word of the command's name, or None if the
+        name begins with a CommandKeyword
+        """
+        first_word = self.name.split()[0]
+        if compile_keyword(first_word) is not None:
+            return None
+        return first_word
+
+    def get_names(self):
+        """Returns a tuple of the name and each of the names created
+        by replacing the first word of the name with an alias
+        """
+        rest_of_name = self.name.partition(' ')[2]
+        names = [self.name]
+        for alias in self.aliases:
+            names.append('{} {}'.format(alias, rest_of_name).strip())
+        return tuple(names)
+
+    def get_help(self):
+        """ Returns the name and description of the command """
+        if self.aliases:
+            return "{} (aliases: {}): {}".format(
+                self.usage, ', '.join(self.aliases), self.desc)
+        return "{}: {}".format(self.usage, self.desc)
+
+    def get_help_decorated(self):
+        """ Same as get_help(), but adds text decoration to be used in discord """
+        if self.aliases:
+            return "`{}` *(aliases: {})* {}".format(
+                self.usage, ', '.join(self.aliases), self.desc)
+        return "`{}` {}".format(self.usage, self.desc)
+
+    def has_permission_with(self, perm):
+        """ Checks if the given permission level (perm) can execute this command
+        Returns True if so, False otherwise
+        """
+        return perm >= self.minimum_permission.value
 
-class Command(object):
+
+class Command(BaseCommand):
     """The object for creating user commands
     Args:
         name (str) -- the name of the command, typing this and giving the
@@ -186,7 +455,16 @@ class Command(object):
         usage (str) -- similar to the name of the command, but more readable for
                 the end user to understand. This is shown beside the description
                 when the get_help() or get_help_decorated() function is run
+        aliases (tuple) -- alternative words that can be typed in place of the
+                first word of the name. ex. an alias of 'rng' for 'random <number>'
+                allows the command to be run with 'rng 10'
+        cache_ttl (float) -- if set, the replies of the command are saved for this
+                many seconds and sent again when it's run with the same arguments,
+                rather than running the function. Only for commands whose output
+                depends on nothing but their arguments, see response_cache.py
+    Raises ValueError if the parameter of a keyword in the name is not valid
     """
+    __slots__ = ('type', 'desc', 'minimum_permission', 'usage', 'cache_ttl', 'name_parts')
 
     def __init__(
             self,
@@ -195,9 +473,13 @@ class Command(object):
             type=CommandType.STANDARD,
             minimum_permission=PermissionLevel.DEFAULT,
             function=None,
-            usage=None):
+            usage=None,
+            aliases=(),
+            cache_ttl=None):
         self.type = type
         self.name = name.strip()
+        # The name compiled once for matching, see compile_command_name()
+        self.name_parts = compile_command_name(self.name)
         self.desc = desc.strip()
         self.minimum_permission = minimum_permission
         self.function = function
@@ -205,20 +487,10 @@ class Command(object):
             self.usage = name
         else:
             self.usage = usage.strip()
-
-    def __eq__(self, other):
-        """Commands are considered equal if they share the same name"""
-        if (self.name == other.name):
-            return True
-        return False
-
-    def get_help(self):
-        """ Returns the name and description of the command """
-        return "{}: {}".format(self.usage, self.desc)
-
-    def get_help_decorated(self):
-        """ Same as get_help(), but adds text decoration to be used in discord """
-        return "`{}` {}".format(self.usage, self.desc)
+        self.aliases = ()
+        for alias in aliases:
+            self.add_alias(alias)
+        self.cache_ttl = cache_ttl
 
     @staticmethod
     def get_words_until_delimiter(string):
@@ -260,98 +532,66 @@ class Command(object):
 
         However if this command does not fully match each command_keyword,
         it will Returns None
+        If it matches but the permission level can't execute this command,
+        it Returns PERMISSION_DENIED
         """
         string = string.strip()  # the string we want to test
-        # the command's name we want to match to
-        command_name_as_tuple = tuple(self.name.split())
-        string_as_tuple = tuple(string.split(' '))
+        words = string.split(' ')
+        name_parts = self.name_parts
+        # If an alias was typed, treat it as the first word of the command's name
+        if words[0] != name_parts[0] and words[0] in self.aliases and \
+                type(name_parts[0]) is str:
+            words[0] = name_parts[0]
         results = []
-        string_word_offset = 0
+        word_index = 0
 
-        # Go through word by word comparing the string to the command name
-        for i in range(len(command_name_as_tuple)
-                       ):  # pylint: disable=consider-using-enumerate
+        # Go through the name part by part comparing the string to it
+        for part in name_parts:
             # If we got to a point where the index in the string is out of
             # bounds, count this as a mismatch, return None
-            if len(string_as_tuple) - 1 < i + string_word_offset:
+            if word_index >= len(words):
                 return None
 
-            string_word_index = i + string_word_offset
-            string_word = string_as_tuple[string_word_index]
-            command_word = command_name_as_tuple[i]
-            keyword_match = False
-
-            # Check if this word typed matches our keyword for this command (if
-            # there is one)
-            for keyword in CommandKeywords:
-                # if the command word matches a CommandKeyword, run the match function
-                # specific to that command keyword
-                if command_word == get_keyword_string_of(keyword):
-                    match_function = get_keyword_function_of(keyword)
-                    count_type = get_keyword_count_of(keyword)
-
-                    # Do operations on multiple words if the command keyword
-                    # wants it
-                    if count_type == KeywordCount.MULTIPLE_WORDS:
-                        # Get the entire string after this point until the end
-                        # or delimiter '|'
-                        string_as_tuple_after = string_as_tuple[string_word_index:]
-                        string_words = Command.get_words_until_delimiter(
-                            ' '.join(string_as_tuple_after))
-                        match_result = match_function(string_words)
-
-                        # Then since we operated on multiple words, skip ahead to the point
-                        # Where the string_word lines up with the command
-                        # arguments/keywords
-                        total_words_to_skip = match_result.count(' ') + 1
-                        string_word_offset += total_words_to_skip
-
-                    elif count_type == KeywordCount.ALL_WORDS_AFTER:
-                        # Gets the entire string after this point
-                        string_as_tuple_after = string_as_tuple[string_word_index:]
-                        match_result = match_function(
-                            ' '.join(string_as_tuple_after))
-
-                        # make it so we are offset to the end of the string
-                        string_word_offset = len(command_name_as_tuple)
-                    else:
-                        match_result = match_function(string_word)
-                    """ If this word does not match the command keyword's criteria,
-                    then this whole command doesn't match the criteria
-                    """
-                    if match_result is None:
-                        return None
-                    # else append this to the results as it matched!
-                    results.append(match_result)
-                    keyword_match = True
-                    break
-
-            # If there was a keyword match, then move onto the next words
-            if keyword_match:
+            # Since there is no keyword at this part of the name, just check if
+            # the string word here matches the command's word here
+            if type(part) is str:
+                if words[word_index] != part:
+                    return None
+                word_index += 1
                 continue
-            # Since there was no CommandKeyword at this part of the command,
-            # just check if the string word here matches the command's word
-            # here
-            if command_word != string_word:
+
+            # Run the keyword function on the word(s) at this part of the name
+            keyword_function, count = part
+            if count is KeywordCount.MULTIPLE_WORDS:
+                # Get the entire string after this point until the end
+                # or delimiter '|'
+                string_words = Command.get_words_until_delimiter(
+                    ' '.join(words[word_index:]))
+                match_result = keyword_function(string_words)
+                # Then skip past the words used and the delimiter
+                word_index += string_words.count(' ') + 2
+            elif count is KeywordCount.ALL_WORDS_AFTER:
+                # Gets the entire string after this point
+                match_result = keyword_function(' '.join(words[word_index:]))
+                word_index = len(words)
+            else:
+                match_result = keyword_function(words[word_index])
+                word_index += 1
+            # If this word does not match the keyword's criteria,
+            # then this whole command doesn't match the criteria
+            if match_result is None:
                 return None
+            # else append this to the results as it matched!
+            results.append(match_result)
 
         # Lastly, verify that the permission_level is allowed to execute this
         # command
-        if self.has_permission_with(permission_level.value):
-            # The string and permission fully matches the command criteria,
-            # return the results!
-            return tuple(results)
+        if not self.has_permission_with(permission_level.value):
+            return PERMISSION_DENIED
+        # The string and permission fully matches the command criteria,
+        # return the results!
+        return tuple(results)
 
-    def has_permission_with(self, perm):
-        """ Checks if the given permission level (perm) can execute this command
-        Returns true if so
-        Raises PermissionDeniedError otherwise
-        """
-        if (perm >= self.minimum_permission.value):
-            return True
-        # Denied permission level, so it does not match the command
-        # requirements
-        raise PermissionDeniedError('Permission denied')
 
 class ImproperNameError (Exception):
     """An error when the naming of a string
@@ -363,7 +603,7 @@ class ImproperNameError (Exception):
         self.args = {arg}
 
 
-class CustomCommand (Command):
+class CustomCommand (BaseCommand):
     """A custom command is more restricted than the general Command
 
     This is the type of command a user can create using the
@@ -376,17 +616,34 @@ class CustomCommand (Command):
 
     New Variables:
         response (str) -- the string to send back if the command was matched
-    """
 
-    def __init__(self, name, response, function):
-        Command.__init__(self, name, 'A custom command',
-                         CommandType.CUSTOM, PermissionLevel.DEFAULT,
-                         function)
+    The type, description, minimum permission and usage are the same for every
+    custom command, so they are shared by the class rather than stored in
+    each custom command.
+    """
+    __slots__ = ('response',)
+    type = CommandType.CUSTOM
+    desc = 'A custom command'
+    minimum_permission = PermissionLevel.DEFAULT
+    # Sending the response is all a custom command does, there is nothing to save
+    cache_ttl = None
+
+    def __init__(self, name, response, function, aliases=()):
+        self.name = name.strip()
         if self.name.find(' ') != -1:
             raise ImproperNameError('Name must not contain spaces!')
+        self.function = function
+        self.aliases = ()
+        for alias in aliases:
+            self.add_alias(alias)
 
         self.response = response
 
+    @property
+    def usage(self):
+        """The usage of a custom command is its name"""
+        return self.name
+
     def matches(self, string, permission_level):
         """Checks if the string exactly matches the name of this Command
 
@@ -395,11 +652,143 @@ class CustomCommand (Command):
         """
         string = string.strip()
 
-        if (string == self.name):
+        if (string == self.name or string in self.aliases):
             return self.response
         return None
 
 
+def __index_command(command):
+    """Adds the command to the dispatch table under its first word and aliases"""
+    first_word = command.get_first_word()
+    if first_word is None:
+        __commands_unindexed.append(command)
+        return
+    for word in (first_word,) + command.aliases:
+        __index_command_word(command, word)
+
+
+def __index_command_word(command, word):
+    """Adds the command to the dispatch table under the given word"""
+    try:
+        __commands_index[word].append(command)
+    except KeyError:
+        __commands_index[word] = deque([command])
+
+
+def __unindex_command(command):
+    """Removes the command from the dispatch table"""
+    first_word = command.get_first_word()
+    if first_word is None:
+        __commands_unindexed.remove(command)
+        return
+    for word in (first_word,) + command.aliases:
+        indexed = __commands_index.get(word)
+        if indexed is None:
+            continue
+        for index, comm in enumerate(indexed):
+            if comm is command:
+                del indexed[index]
+                break
+        if not indexed:
+            del __commands_index[word]
+
+
+def set_command_table(table, function):
+    """Sets the compiled command table custom commands are looked up in
+
+    Args:
+        table (CommandTable) -- the table, None to stop using a table
+        function (function) -- the function run by the commands in the table
+    """
+    global __command_table, __command_table_function, __command_table_removed
+    __command_table = table
+    __command_table_function = function
+    # Removed commands only need to be hidden while they are still in the table
+    __command_table_removed = {name for name in __command_table_removed
+                               if table is not None and __get_table_command(name)}
+    response_cache.invalidate()
+
+
+def __get_table_command(name):
+    """Returns a CustomCommand for the name (or alias) from the command
+    table, or None if it isn't in the table
+    """
+    if __command_table is None or name.find(' ') != -1:
+        return None
+    found = __command_table.lookup(name)
+    if found is None or found[0] in __command_table_removed:
+        return None
+    return CustomCommand(found[0], found[1], __command_table_function, found[2])
+
+
+def is_in_command_list(command):
+    """Returns True if this command (and not only a command
+    with the same name) is in the command list
+    """
+    first_word = command.get_first_word()
+    if first_word is None:
+        return any(comm is command for comm in __commands_unindexed)
+    return any(comm is command for comm in __commands_index.get(first_word, ()))
+
+
+def materialize_command(command):
+    """Adds a command found in the command table to the command list so that it
+    can be changed, does nothing if the command is already in the command list
+    """
+    if is_in_command_list(command):
+        return
+    __commands.setdefault(command.type, deque()).append(command)
+    __index_command(command)
+
+
+def is_name_taken(command, ignore=None):
+    """Checks if the name or any alias of the command is already
+    used by a different command in the command list
+
+    Args:
+        command (Command) -- the command to check the names of
+        ignore (Command) -- a command in the command list to not count
+                            as a conflict, None by default
+    Returns the command using the name if so, None otherwise
+    """
+    names = set(command.get_names())
+    for word in (command.get_first_word(),) + command.aliases:
+        for comm in __commands_index.get(word, ()):
+            if comm is command or comm is ignore:
+                continue
+            if not names.isdisjoint(comm.get_names()):
+                return comm
+    if __command_table is not None:
+        for name in names:
+            table_command = __get_table_command(name)
+            if table_command is not None and \
+                    (ignore is None or table_command.name != ignore.name):
+                return table_command
+    return None
+
+
+def get_candidate_commands(string):
+    """ Returns the commands that could match the string, using the dispatch table
+
+    Only the commands whose name (or an alias) begins with the first word of the
+    string, and the commands that begin with a CommandKeyword, are returned.
+    """
+    words = string.split(None, 1)
+    if not words:
+        return tuple(__commands_unindexed)
+    candidates = __commands_index.get(words[0])
+    if __command_table is not None:
+        table_command = __get_table_command(string.strip())
+        if table_command is not None:
+            # Commands in the command list come first, as they may be newer
+            candidates = tuple(candidates or ()) + (table_command,)
+    if candidates is None:
+        return tuple(__commands_unindexed)
+    if not __commands_unindexed:
+        return tuple(candidates)
+    return tuple(candidates) + tuple(__commands_unindexed)
+
+
 def find_command(command):
     """ Looks for the command in the commands list
 
@@ -440,7 +829,12 @@ def add_command(command):
     Raises ImproperNameError if the command was given
         an improper name, this only applies to custom commands
     """
-    if find_command(command) is not None:
+    # Commands in the dispatch table are checked through it, which also
+    # finds commands with the same name
+    first_word = command.get_first_word()
+    if first_word is None and find_command(command) is not None:
+        return False
+    if is_in_command_list(command) or is_name_taken(command) is not None:
         return False
 
     if command.type not in __commands.keys():
@@ -448,10 +842,66 @@ def add_command(command):
     else:
         # Insert the command in the ordered location
         __commands[command.type].append(command)
+    __index_command(command)
+    response_cache.invalidate()
 
     return True
 
 
+def add_alias(command_name, alias):
+    """Adds an alias to the command with the name (command_name)
+
+    Returns True if successful
+    Returns False if the command doesn't exist or the alias is already in use
+    Raises ImproperNameError if the alias contains spaces
+    """
+    command = get_command_by_name(command_name)
+    if command is None:
+        return False
+    alias = alias.strip()
+    if alias in command.aliases or alias == command.get_first_word():
+        return False
+    if ' ' in alias or alias == '':
+        raise ImproperNameError('Alias must be a single word!')
+    if __is_alias_taken(command, alias):
+        return False
+    materialize_command(command)
+    command.add_alias(alias)
+    __index_command_word(command, alias)
+    response_cache.invalidate()
+    return True
+
+
+def __is_alias_taken(command, alias):
+    """Checks if the name the alias gives the command is already used by a
+    different command, the command is left unchanged
+    """
+    alias_name = '{} {}'.format(alias, command.name.partition(' ')[2]).strip()
+    # Only commands with the alias as their first word or an alias can have that name
+    for comm in __commands_index.get(alias, ()):
+        if comm is not command and alias_name in comm.get_names():
+            return True
+    if __command_table is not None:
+        table_command = __get_table_command(alias_name)
+        if table_command is not None and table_command.name != command.name:
+            return True
+    return False
+
+
+def get_command_by_name(command_name):
+    """Returns the command with the name (command_name), or None if not found"""
+    for comm in __commands_index.get(command_name.split(' ', 1)[0], ()):
+        if comm.name == command_name:
+            return comm
+    for comm in __commands_unindexed:
+        if comm.name == command_name:
+            return comm
+    table_command = __get_table_command(command_name)
+    if table_command is not None and table_command.name == command_name:
+        return table_command
+    return None
+
+
 def add_multiple_commands(commands):
     """Adds all the commands in the list to the command list"""
     for comm in commands:
@@ -464,25 +914,29 @@ def remove_command(command):
     Returns True if successful
     Returns False if the command does not exist in the list
     """
-    command_type, index = find_command(command)
-    if index is None:
-        return False
-    del __commands[command_type][index]
-    return True
+    return remove_command_by_name(command.name)
 
 
 def remove_command_by_name(command_name):
     """Removes the desired command from the command list
 
-    Returns None if successful
+    Returns True if successful
     Returns False if that command doesn't exist
     """
-    for c_type in __commands:
-        for index, command in enumerate(__commands[c_type]):
-            if command.name == command_name:
-                del __commands[c_type][index]
-                return True
-    return False
+    command = get_command_by_name(command_name)
+    if command is None:
+        return False
+    if __command_table is not None:
+        __command_table_removed.add(command_name)
+    if is_in_command_list(command):
+        __unindex_command(command)
+        commands_of_type = __commands[command.type]
+        for index, comm in enumerate(commands_of_type):
+            if comm is command:
+                del commands_of_type[index]
+                break
+    response_cache.invalidate()
+    return True
 
 
 def get_commands(type=None):
@@ -503,3 +957,17 @@ def get_commands_as_list():
     for type in __commands.keys():
         list_of_comm.extend(list(__commands[type]))
     return list_of_comm
+
+
+def get_registry_sizes():
+    """Returns the sizes of the command registry, for memory diagnostics
+    ex. {'commands': 40, 'index words': 35, 'unindexed': 1, 'table': 0, 'table removed': 0}
+    """
+    return {
+        'commands': sum(len(commands_of_type) for commands_of_type in __commands.values()),
+        'index words': len(__commands_index),
+        'index entries': sum(len(commands) for commands in __commands_index.values()),
+        'unindexed': len(__commands_unindexed),
+        'table': 0 if __command_table is None else len(__command_table),
+        'table removed': len(__command_table_removed)
+    }
@@ -1,6 +1,7 @@
 """This module contains classes for Permission levels
 and functions for checking its label or value
 """
+import time
 from enum import IntEnum
 
 
@@ -15,14 +16,49 @@ class PermissionLevel(IntEnum):
     USER = 1  # The middle permission, allows a user to use general commands like running a script
     SUPERUSER = 2  # The highest permission, allows a user to use any command
 
-class PermissionDeniedError(Exception):
-    """An error when the user attempts to do
-    something they don't have permission to do.
+class DenialLimiter:
+    """Decides which permission denials are replied to, so a user can't make the
+    bot spam 'Permission denied' (or spend its rate limit) by repeating a command
+
+    A user gets at most one denial reply every (interval) seconds, and
+    repeated denials of the same command are only replied to once every
+    (repeat_interval) seconds
+
+    Args:
+        interval (float) -- the least seconds between the denial replies to a user
+        repeat_interval (float) -- the least seconds between denial
+                                   replies to a user for the same command
     """
+    MAX_USERS = 10000  # The most users tracked before the oldest are forgotten
+
+    def __init__(self, interval=5.0, repeat_interval=60.0):
+        self.interval = interval
+        self.repeat_interval = repeat_interval
+        self.suppressed = 0  # The amount of denials not replied to
+        self.__last_replies = {}  # (time, command name) of the last reply by user id
+
+    def should_reply(self, user_id, command_name):
+        """Returns True if the denial of the command (name) to the user (id)
+        should be replied to, recording the reply if so
+        """
+        now = time.monotonic()
+        last_reply = self.__last_replies.get(user_id)
+        if last_reply is not None:
+            since_last = now - last_reply[0]
+            if since_last < self.interval or \
+                    (last_reply[1] == command_name and since_last < self.repeat_interval):
+                self.suppressed += 1
+                return False
+            # Move the user to the end, so the oldest replies are forgotten first
+            del self.__last_replies[user_id]
+        elif len(self.__last_replies) >= DenialLimiter.MAX_USERS:
+            del self.__last_replies[next(iter(self.__last_replies))]
+        self.__last_replies[user_id] = (now, command_name)
+        return True
+
 
-    def __init__(self, arg):
-        self.strerror = arg
-        self.args = {arg}
+# Limits the permission denied replies of every user
+denial_limiter = DenialLimiter()
 
 # Permission labels corresponding to their permission
 PERMISSION_LABELS = {
@@ -0,0 +1,108 @@
+"""Permissions granted by server role, for the whole server or for single channels
+
+A role rule gives every member with the role at least a permission level, the
+effective permission of a member is the highest of their own permission (in
+the users file) and the rules of their roles. Rules are stored in the roles file:
+    {
+        'roles': {'<role id>': 'user'},  # rules for the whole server
+        'channels': {'<channel id>': {'<role id>': 'superuser'}}  # rules for one channel
+    }
+Role ids are unique across servers, and the id of a server's @everyone role is
+the id of the server, so a rule for it applies to every member of the server.
+
+Resolving the rules of a member's roles is cached for each (server, member), so
+checking the permission of a message is a dictionary lookup. The cache must be
+invalidated when the roles of a member change (see scripty.py's events) or
+when the rules change.
+"""
+from src.user.permissions import PermissionLevel, get_permission_of_label
+
+
+def parse_role_reference(string):
+    """Checks if the string is a role mention or a role id
+
+    Returns None if not a match
+    Returns the role id found if a match
+    An example match would be:
+        <@&782311255082572245>
+        782311255082572245
+    """
+    if string.startswith('<@&') and string.endswith('>'):
+        string = string[3:-1]
+    if not string.isdigit():
+        return None
+    return string
+
+
+class PermissionResolver:
+    """Resolves the permission level members get from the role rules
+
+    Args:
+        get_rules (function) -- returns the data of the roles file
+    """
+
+    def __init__(self, get_rules):
+        self.__get_rules = get_rules
+        self.__server_rules = None  # The level of each role by role id, None until compiled
+        self.__channel_rules = {}  # {role id: {channel id: level}}
+        # (level for the server, {channel id: level}) of each (server id, member id)
+        self.__resolved = {}
+
+    def __compile_rules(self):
+        """Indexes the rules of the roles file by role"""
+        rules = self.__get_rules()
+        self.__server_rules = {}
+        self.__channel_rules = {}
+        for role_id, label in rules.get('roles', {}).items():
+            self.__server_rules[role_id] = get_permission_of_label(label)
+        for channel_id, channel_rules in rules.get('channels', {}).items():
+            for role_id, label in channel_rules.items():
+                self.__channel_rules.setdefault(role_id, {})[channel_id] = \
+                    get_permission_of_label(label)
+
+    def __resolve(self, role_ids):
+        """Returns the (level for the server, {channel id: level})
+        given by the rules of the roles (ids)
+        """
+        server_level = PermissionLevel.DEFAULT
+        for role_id in role_ids:
+            server_level = max(server_level, self.__server_rules.get(role_id, server_level))
+        channel_levels = {}
+        for role_id in role_ids:
+            for channel_id, level in self.__channel_rules.get(role_id, {}).items():
+                if level > channel_levels.get(channel_id, server_level):
+                    channel_levels[channel_id] = level
+        return server_level, channel_levels
+
+    def get_permission_level(self, member, channel_id):
+        """Returns the permission level the member gets from
+        the rules of their roles in the channel (id)
+        """
+        roles = getattr(member, 'roles', None)
+        if not roles:
+            # Not a member of a server, ex. a direct message
+            return PermissionLevel.DEFAULT
+        key = (member.server.id, member.id)
+        resolved = self.__resolved.get(key)
+        if resolved is None:
+            if self.__server_rules is None:
+                self.__compile_rules()
+            resolved = self.__resolve([role.id for role in roles])
+            self.__resolved[key] = resolved
+        return resolved[1].get(channel_id, resolved[0])
+
+    def invalidate_member(self, server_id, member_id):
+        """Forgets the resolved permissions of the member, after their roles change"""
+        self.__resolved.pop((server_id, member_id), None)
+
+    def invalidate_server(self, server_id):
+        """Forgets the resolved permissions of every member
+        of the server, after one of its roles changes
+        """
+        for key in [key for key in self.__resolved if key[0] == server_id]:
+            del self.__resolved[key]
+
+    def invalidate(self):
+        """Forgets everything resolved, after the rules change"""
+        self.__server_rules = None
+        self.__resolved.clear()
@@ -1,2 +1,2 @@
 cd src
-python3 scripty.py
+python3 scripty.py "$@"
@@ -0,0 +1,58 @@
+""" Tests of the command list (src/user/commands.py) """
+import pytest
+import src.user.commands as commands
+from src.user.commands import Command, CustomCommand
+from src.user.permissions import PermissionLevel
+
+
+async def respond(cmd_args):
+    pass
+
+
+@pytest.fixture
+def added():
+    """Commands added to the command list through added.append(), removed after the test"""
+    added = []
+    yield added
+    for command in added:
+        commands.remove_command(command)
+
+
+def add(added, command):
+    assert commands.add_command(command)
+    added.append(command)
+    return command
+
+
+def test_add_alias_to_a_custom_command(added):
+    command = add(added, CustomCommand('testhello', 'hi', respond))
+
+    assert commands.add_alias('testhello', 'testhi')
+    assert command.aliases == ('testhi',)
+    assert command in commands.get_candidate_commands('testhi')
+    assert command.matches('testhi', PermissionLevel.DEFAULT) == 'hi'
+
+
+def test_add_alias_already_in_use(added):
+    add(added, CustomCommand('testhello', 'hi', respond))
+    add(added, CustomCommand('testbye', 'bye', respond))
+
+    assert not commands.add_alias('testhello', 'testbye')
+    assert not commands.add_alias('testhello', 'testhello')
+    assert commands.get_command_by_name('testhello').aliases == ()
+
+
+def test_add_alias_to_a_command_with_keywords(added):
+    command = add(added, Command('testrandom <int:1-10>', function=respond))
+    add(added, Command('testroll <int:1-10>', function=respond))
+
+    assert not commands.add_alias('testrandom <int:1-10>', 'testroll')
+    assert commands.add_alias('testrandom <int:1-10>', 'testrng')
+    assert command.matches('testrng 5', PermissionLevel.DEFAULT) == (5,)
+
+
+def test_add_alias_with_spaces_is_rejected(added):
+    add(added, CustomCommand('testhello', 'hi', respond))
+
+    with pytest.raises(commands.ImproperNameError):
+        commands.add_alias('testhello', 'test hi')
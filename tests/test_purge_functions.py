@@ -0,0 +1,248 @@
+""" Tests of the purge pipeline (src/purge_functions.py) against a fake client
+that records the requests made to discord, with a fake clock so the pacing and
+progress throttling run without waiting
+"""
+import asyncio
+import datetime
+import types
+import discord.errors
+import pytest
+import src.purge_functions as purge_functions
+from src.soak.fake_client import FakeClient
+
+
+class FakeClock:
+    """Stands in for the asyncio module in purge_functions, sleeping only
+    advances the time and is recorded
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+    def get_event_loop(self):
+        return types.SimpleNamespace(time=lambda: self.now)
+
+
+class FakeResponse:
+    def __init__(self, status, headers=None):
+        self.status = status
+        self.reason = 'Too Many Requests' if status == 429 else 'Error'
+        self.headers = {} if headers is None else headers
+
+
+class RecordingClient(FakeClient):
+    """A fake client recording the requests of a purge as (name, detail) in calls
+
+    Args:
+        clock (FakeClock) -- advanced by (request_time) seconds on every delete
+        rate_limits (list) -- the Retry-After of each 429 the next bulk deletes fail with
+    """
+
+    def __init__(self, clock, request_time=0.0, rate_limits=()):
+        super().__init__()
+        self.calls = []
+        self.clock = clock
+        self.request_time = request_time
+        self.rate_limits = list(rate_limits)
+        self.on_bulk_delete = None  # Called after each bulk delete
+
+    def logs_from(self, channel, limit=100, before=None, after=None):
+        self.calls.append(('logs_from', limit))
+        return super().logs_from(channel, limit, before, after)
+
+    async def delete_messages(self, messages):
+        self.clock.now += self.request_time
+        if self.rate_limits:
+            retry_after = self.rate_limits.pop(0)
+            self.calls.append(('rate_limited', retry_after))
+            raise discord.errors.HTTPException(
+                FakeResponse(429, {'Retry-After': str(retry_after)}), 'You are being rate limited')
+        messages = list(messages)
+        self.calls.append(('delete_messages', len(messages)))
+        await super().delete_messages(messages)
+        if self.on_bulk_delete is not None:
+            self.on_bulk_delete()
+
+    async def delete_message(self, message):
+        self.clock.now += self.request_time
+        self.calls.append(('delete_message', message.id))
+        await super().delete_message(message)
+
+    async def edit_message(self, message, new_content):
+        self.calls.append(('edit_message', new_content))
+        return await super().edit_message(message, new_content)
+
+    def get_calls(self, name):
+        return [detail for call_name, detail in self.calls if call_name == name]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(purge_functions, 'asyncio', clock)
+    return clock
+
+
+def fill_channel(client, amount, age=None):
+    """Sends (amount) messages to the channel, then the $purge command message
+
+    Returns (channel, command message)
+    """
+    for i in range(amount):
+        message = client.create_message('1', '2', '3', 'spam {}'.format(i))
+        if age is not None:
+            message.timestamp -= age
+    command_message = client.create_message('1', '2', '4', '$purge')
+    return command_message.channel, command_message
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        # Closes the history of a purge that stopped before reading all of it
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+def test_pages_history_and_deletes_in_batches_of_100(clock):
+    client = RecordingClient(clock)
+    channel, command_message = fill_channel(client, 250)
+    job = purge_functions.PurgeJob(client, channel, 250, command_message=command_message)
+
+    assert run(job.run()) == 250
+    assert client.get_calls('logs_from') == [100, 100, 50]
+    # The command message is deleted along with the first batch
+    assert client.get_calls('delete_messages') == [100, 100, 51]
+    assert client.get_calls('delete_message') == []
+    assert [message.content for message in channel.history] == ['Removed 250 messages']
+
+
+def test_messages_older_than_14_days_are_deleted_one_at_a_time(clock):
+    client = RecordingClient(clock)
+    for i in range(3):
+        message = client.create_message('1', '2', '3', 'old {}'.format(i))
+        message.timestamp -= datetime.timedelta(days=20)
+    old_ids = [message.id for message in client.get_server('1').get_channel('2').history]
+    channel, command_message = fill_channel(client, 5)
+    job = purge_functions.PurgeJob(client, channel, 8, command_message=command_message)
+
+    assert run(job.run()) == 8
+    assert client.get_calls('delete_messages') == [6]
+    assert sorted(client.get_calls('delete_message')) == sorted(old_ids)
+
+
+def test_a_single_recent_message_is_not_bulk_deleted(clock):
+    client = RecordingClient(clock)
+    channel, _ = fill_channel(client, 1)
+    job = purge_functions.PurgeJob(client, channel, 1, purge_functions.PurgeFilter(author_id='3'))
+
+    assert run(job.run()) == 1
+    assert client.get_calls('delete_messages') == []
+    assert len(client.get_calls('delete_message')) == 1
+
+
+def test_filter_by_author_and_pattern(clock):
+    client = RecordingClient(clock)
+    channel, command_message = fill_channel(client, 10)
+    client.create_message('1', '2', '5', 'spam by someone else')
+    job = purge_functions.PurgeJob(client, channel, 100, purge_functions.PurgeFilter(
+        author_id='3', pattern=r'spam [0-4]$'), command_message=command_message)
+
+    assert run(job.run()) == 5
+    assert sorted(message.content for message in channel.history
+                  if message.content.startswith('spam')) == \
+        ['spam 5', 'spam 6', 'spam 7', 'spam 8', 'spam 9', 'spam by someone else']
+
+
+def test_rate_limited_requests_wait_for_retry_after_and_are_retried(clock):
+    client = RecordingClient(clock, rate_limits=[1.5, 3.0])
+    channel, command_message = fill_channel(client, 99)
+    job = purge_functions.PurgeJob(client, channel, 99, command_message=command_message)
+
+    assert run(job.run()) == 99
+    assert client.get_calls('rate_limited') == [1.5, 3.0]
+    assert client.get_calls('delete_messages') == [100]
+    assert 1.5 in clock.sleeps and 3.0 in clock.sleeps
+
+
+def test_pacer_backs_off_and_recovers(clock):
+    pacer = purge_functions.AdaptivePacer()
+    pacer.rate_limited(2.0)
+    assert pacer.delay == purge_functions.AdaptivePacer.BASE_DELAY
+    run(pacer.wait())
+    assert clock.sleeps == [2.0]
+    # The Retry-After only applies to the next request
+    run(pacer.wait())
+    assert clock.sleeps == [2.0, purge_functions.AdaptivePacer.BASE_DELAY]
+
+    pacer.rate_limited(60.0)
+    assert pacer.delay == purge_functions.AdaptivePacer.BASE_DELAY * 2
+    run(pacer.wait())
+    assert clock.sleeps[-1] == purge_functions.AdaptivePacer.MAX_DELAY
+
+    pacer.succeeded(purge_functions.AdaptivePacer.SLOW_REQUEST)
+    assert pacer.delay == purge_functions.AdaptivePacer.BASE_DELAY * 4
+    for _ in range(50):
+        pacer.succeeded(0.01)
+    assert pacer.delay < 0.001
+
+
+def test_get_retry_after_reads_the_rate_limit_headers():
+    assert purge_functions.get_retry_after(FakeResponse(429, {'Retry-After': '2.5'})) == 2.5
+    assert purge_functions.get_retry_after(FakeResponse(
+        429, {'Retry-After': '1', 'X-RateLimit-Reset-After': '4.25'})) == 4.25
+    assert purge_functions.get_retry_after(FakeResponse(429)) == \
+        purge_functions.AdaptivePacer.BASE_DELAY
+
+
+def test_cancel_stops_the_purge_after_the_current_batch(clock):
+    client = RecordingClient(clock)
+    channel, command_message = fill_channel(client, 500)
+    job = purge_functions.PurgeJob(client, channel, 500, command_message=command_message)
+    client.on_bulk_delete = lambda: purge_functions.cancel_purge(channel.id)
+
+    assert run(purge_functions.run_purge(job)) == 99
+    assert client.get_calls('delete_messages') == [100]
+    assert client.get_calls('edit_message')[-1] == 'Purge cancelled, removed 99 messages'
+    # The purge is no longer registered once it stopped
+    assert not purge_functions.cancel_purge(channel.id)
+
+
+def test_only_one_purge_runs_per_channel(clock):
+    client = RecordingClient(clock)
+    channel, command_message = fill_channel(client, 200)
+    job = purge_functions.PurgeJob(client, channel, 200, command_message=command_message)
+    other_results = []
+
+    def start_another_purge():
+        # Refused right away, without awaiting anything
+        try:
+            purge_functions.run_purge(purge_functions.PurgeJob(client, channel, 10)).send(None)
+        except StopIteration as ex:
+            other_results.append(ex.value)
+    client.on_bulk_delete = start_another_purge
+
+    assert run(purge_functions.run_purge(job)) == 200
+    assert other_results == [None, None]
+
+
+def test_progress_edits_are_throttled(clock):
+    client = RecordingClient(clock, request_time=0.5)
+    channel, command_message = fill_channel(client, 949)
+    job = purge_functions.PurgeJob(client, channel, 949, command_message=command_message)
+
+    assert run(job.run()) == 949
+    assert len(client.get_calls('delete_messages')) == 10
+    # 10 batches taking 0.5s each, edited after the first and then at most
+    # every PROGRESS_INTERVAL (2s), so after the 1st, 5th and 9th
+    assert client.get_calls('edit_message')[:-1] == [
+        'Purging messages ... removed {} of up to 949 ({} scanned)'.format(
+            deleted, deleted + 1) for deleted in (99, 499, 899)]
+    assert client.get_calls('edit_message')[-1] == 'Removed 949 messages'